@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname(
+    os.path.abspath( __file__ ) ) ) )
+
+import sixtracklib as st
+
+from helpers.config import build_config
+from converters.cache import package_versions
+from converters.cobjects import BUFFER_POOL
+from converters.pysixtrack_to_cobjects import pysix_line_to_new_cbuffer
+from converters import from_sixtrack
+from converters import from_pysixtrack
+from converters import from_synthetic
+
+from benchmarks.variants import DEFAULT_VARIANTS
+from benchmarks.variants import parse_variant
+from benchmarks.variants import source_line_and_particles
+from benchmarks.variants import scale_line
+from benchmarks.variants import scale_particles
+from benchmarks.variants import scale_until_num_turns
+
+BENCHMARK_FORMAT_VERSION = 1
+
+def git_commit( path ):
+    try:
+        return subprocess.check_output( [ "git", "rev-parse", "HEAD" ],
+            cwd=path, stderr=subprocess.DEVNULL ).decode().strip()
+    except ( OSError, subprocess.CalledProcessError ):
+        return None
+
+def run_stages( module, ctx, input_path, output_path, conf ):
+    # The lattice conversion is timed on its own as well as part of the
+    # lattice stage; all other timings are the stage timers of the converters
+    # and the timers of the lazily loaded inputs
+    if module is from_sixtrack:
+        line = ctx.line
+    else:
+        line = ctx.input_line
+    with ctx.timer( "pysix_line_to_cbuffer" ):
+        pysix_line_to_new_cbuffer( line,
+            slot_size=st.CBufferView.DEFAULT_SLOT_SIZE, conf=conf )
+    with ctx.stage( "lattice" ):
+        module.generate_lattice_data( input_path, output_path, conf=conf,
+                                      ctx=ctx )
+    module.generate_particle_data( input_path, output_path, conf=conf,
+                                   cache=None, ctx=ctx )
+    return ctx.timings
+
+def benchmark( name, make_run, repeat=1, verbose=False ):
+    runs = []
+    for _ in range( repeat ):
+        with tempfile.TemporaryDirectory( prefix="sixtracklib_bench_" ) as tmp:
+            if verbose:
+                timings, info = make_run( tmp )
+            else:
+                with open( os.devnull, "w" ) as devnull, \
+                    contextlib.redirect_stdout( devnull ):
+                    timings, info = make_run( tmp )
+        runs.append( dict( timings ) )
+        print( f"**** -> {name:<40s} : " +
+               f"{sum( timings.values() ):12.3f} s", flush=True )
+    stages = dict()
+    for stage in runs[ 0 ]:
+        times = [ run.get( stage, 0.0 ) for run in runs ]
+        stages[ stage ] = { "min": min( times ),
+                            "median": statistics.median( times ),
+                            "times": times }
+    result = { "name": name, "stages": stages }
+    result.update( info )
+    return result
+
+def run_shipped( source, input_path, conf ):
+    def make_run( output_path ):
+        if source == "sixtrack":
+            module = from_sixtrack
+            ctx = from_sixtrack.SixTrackScenario(
+                input_path, output_path, conf )
+            num_particles = ctx.sixdump.num_particles_per_sequence(
+                len( ctx.iconv ) )
+            num_elements = len( ctx.line )
+        elif source == "synthetic":
+            module = from_pysixtrack
+            ctx = from_synthetic.SyntheticScenario(
+                input_path, output_path, conf )
+            num_particles = ctx.num_input_particles
+            num_elements = len( ctx.input_line )
+        else:
+            module = from_pysixtrack
+            ctx = from_pysixtrack.PySixTrackScenario(
+                input_path, output_path, conf )
+            num_particles = len( ctx.input_particles )
+            num_elements = len( ctx.input_line )
+        timings = run_stages( module, ctx, input_path, output_path, conf )
+        return timings, { "num_particles": num_particles,
+                          "num_elements": num_elements }
+    return make_run
+
+def run_variant( elements, particles, variant, conf ):
+    conf = dict( conf )
+    conf[ "until_num_turns" ] = scale_until_num_turns(
+        conf.get( "until_num_turns", 1 ), variant.get( "num_turns", 1 ) )
+    def make_run( output_path ):
+        ctx = from_pysixtrack.PySixTrackScenario( None, output_path, conf )
+        with ctx.timer( "scale input" ):
+            line = scale_line( elements, variant.get( "num_lattice", 1 ) )
+            scaled = scale_particles(
+                particles, variant.get( "num_particles", 1 ) )
+        ctx.set( "input_line", line )
+        ctx.set( "input_particles", scaled )
+        timings = run_stages( from_pysixtrack, ctx, None, output_path, conf )
+        return timings, { "num_particles": len( scaled ),
+                          "num_elements": len( line ),
+                          "until_num_turns": conf[ "until_num_turns" ] }
+    return make_run
+
+if __name__ == '__main__':
+    path_to_testdata_dir = os.path.dirname( os.path.dirname(
+        os.path.abspath( __file__ ) ) )
+    parser = argparse.ArgumentParser(
+        description="Benchmark the stages of the testdata generation" )
+    parser.add_argument( "--config",
+        default=os.path.join( path_to_testdata_dir, "config.toml" ),
+        help="path to the config file (default: ./config.toml)" )
+    parser.add_argument( "-s", "--scenario", action="append", default=None,
+        help="only benchmark this scenario; can be given multiple times" )
+    parser.add_argument( "-V", "--variant", action="append", default=None,
+        help="scaled-up variant as comma separated factors, e.g. " +
+             "p8,l2,t10 for 8x particles, 2x lattice, 10x turns; " +
+             "can be given multiple times (default: particles_x8, " +
+             "lattice_x4, turns_x10)" )
+    parser.add_argument( "--no-variants", action="store_true",
+        help="only benchmark the shipped scenarios" )
+    parser.add_argument( "-r", "--repeat", type=int, default=1,
+        help="number of runs per benchmark (default: 1)" )
+    parser.add_argument( "-o", "--output", default=None,
+        help="path of the JSON results (default: benchmark_<commit>.json)" )
+    parser.add_argument( "-v", "--verbose", action="store_true",
+        help="show the output of the converters" )
+    args = parser.parse_args()
+
+    conf = build_config( args.config )
+    if args.scenario is not None:
+        unknown = [ name for name in args.scenario if name not in conf ]
+        if len( unknown ) > 0:
+            parser.error( f"unknown scenario(s): {', '.join( unknown )}" )
+    if args.no_variants:
+        variants = []
+    elif args.variant is not None:
+        try:
+            variants = [ parse_variant( spec ) for spec in args.variant ]
+        except ValueError as e:
+            parser.error( str( e ) )
+    else:
+        variants = DEFAULT_VARIANTS
+
+    commit = git_commit( path_to_testdata_dir )
+    results = []
+    for name, subconf in conf.items():
+        if args.scenario is not None and name not in args.scenario:
+            continue
+        if args.scenario is None and not subconf.get( 'enabled', True ):
+            continue
+        if subconf.get( 'source', None ) is None or \
+            subconf.get( 'input_dir', None ) is None:
+            continue
+        # Benchmarks always run all stages into a scratch directory
+        subconf = dict( subconf )
+        subconf[ 'use_regeneration_cache' ] = False
+        input_path = os.path.normpath( os.path.join(
+            path_to_testdata_dir, name, subconf[ 'input_dir' ] ) )
+
+        result = benchmark( name, run_shipped( subconf[ 'source' ],
+            input_path, subconf ), args.repeat, args.verbose )
+        result.update( { "scenario": name, "variant": None } )
+        results.append( result )
+
+        if len( variants ) > 0:
+            elements, particles = source_line_and_particles(
+                subconf[ 'source' ], input_path, subconf )
+        for variant in variants:
+            result = benchmark( f"{name}/{variant['name']}",
+                run_variant( elements, particles, variant, subconf ),
+                args.repeat, args.verbose )
+            result.update( { "scenario": name, "variant": variant } )
+            results.append( result )
+        BUFFER_POOL.clear()
+
+    report = { "format_version": BENCHMARK_FORMAT_VERSION,
+               "commit": commit,
+               "date": datetime.datetime.now().isoformat(),
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "packages": package_versions(),
+               "repeat": args.repeat,
+               "results": results }
+    path_output = args.output or os.path.join( path_to_testdata_dir,
+        f"benchmark_{( commit or 'unknown' )[ :12 ]}.json" )
+    with open( path_output, "w" ) as f_out:
+        json.dump( report, f_out, indent=2 )
+    print( f"**** -> Wrote benchmark results to:\r\n****    {path_output}" )
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pysixtrack as pysix
+
+from converters.from_sixtrack import SixTrackScenario
+from converters.from_sixtrack import sixdump_sequence_to_bunch
+from converters.from_pysixtrack import PySixTrackScenario
+from converters.from_synthetic import SyntheticScenario
+from converters.tracking import bunch_to_particle
+from converters.lattice import transform_line
+
+# Scaled-up variants of a scenario: the particles are replicated
+# num_particles times, the lattice num_lattice times and the number of turns
+# is multiplied by num_turns. They are all run through the pysixtrack source
+DEFAULT_VARIANTS = [
+    { "name": "particles_x8", "num_particles": 8 },
+    { "name": "lattice_x4", "num_lattice": 4 },
+    { "name": "turns_x10", "num_turns": 10 } ]
+
+def parse_variant( spec ):
+    # e.g. "p8,l2,t10" -> 8x particles, 2x lattice, 10x turns
+    factors = { "p": "num_particles", "l": "num_lattice", "t": "num_turns" }
+    variant = { "name": spec.replace( ",", "_" ) }
+    for item in spec.split( "," ):
+        item = item.strip()
+        if len( item ) < 2 or item[ 0 ] not in factors:
+            raise ValueError( f"invalid variant: {spec}" )
+        variant[ factors[ item[ 0 ] ] ] = int( item[ 1: ] )
+    return variant
+
+def source_line_and_particles( source, input_path, conf=dict() ):
+    # Line and initial particles of a shipped scenario, in the form the
+    # pysixtrack source expects them ( all particles start at element 0 )
+    if source == "sixtrack":
+        ctx = SixTrackScenario( input_path, None, conf )
+        num_particles = ctx.sixdump.num_particles_per_sequence(
+            len( ctx.iconv ) )
+        bunch = sixdump_sequence_to_bunch( ctx.sixdump, 0, num_particles, 0 )
+        particles = [ bunch_to_particle( bunch, ii )
+                      for ii in range( num_particles ) ]
+        return list( ctx.line.elements ), particles
+    elif source == "pysixtrack":
+        ctx = PySixTrackScenario( input_path, None, conf )
+        return list( ctx.input_line.elements ), ctx.input_particles
+    elif source == "synthetic":
+        ctx = SyntheticScenario( input_path, None, conf )
+        return list( ctx.input_line.elements ), ctx.input_particles
+    raise ValueError( f"unknown source: {source}" )
+
+def scale_line( elements, num_lattice=1 ):
+    assert num_lattice > 0
+    line, _, _ = transform_line( pysix.Line( elements=list( elements ) ),
+                                 { "tile": num_lattice } )
+    return line
+
+def scale_particles( particles, num_particles=1, offset=1e-9 ):
+    # Replicas are displaced by a small amount so that they don't track
+    # exactly alike
+    assert num_particles > 0
+    scaled = []
+    for kk in range( num_particles ):
+        for in_p in particles:
+            p = in_p.copy()
+            p.x += kk * offset
+            p.y += kk * offset
+            p.partid = len( scaled )
+            p.elemid = 0
+            p.turn = 0
+            p.state = 1
+            scaled.append( p )
+    return scaled
+
+def scale_until_num_turns( until_num_turns, num_turns=1 ):
+    if isinstance( until_num_turns, dict ):
+        return { "stride": until_num_turns[ "stride" ] * num_turns,
+                 "until": until_num_turns[ "until" ] * num_turns }
+    elif isinstance( until_num_turns, ( list, tuple ) ):
+        return [ turn * num_turns for turn in until_num_turns ]
+    return until_num_turns * num_turns
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+from importlib import metadata
+
+from .checkpoint import until_turn_milestones
+from .losses import LOSS_TABLE_FILE_NAMES
+from .lattice import LATTICE_INDEX_MAP_FILE_NAME
+
+MANIFEST_FILE_NAME = "cache_manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+# Config keys which only change how the data is generated, not the data
+NON_OUTPUT_CONF_KEYS = frozenset( [
+    "use_regeneration_cache", "num_workers", "batched_tracking",
+    "elem_by_elem_chunk_size", "until_turn_checkpoint_interval", "profile",
+    "progress_interval", "particle_block_size" ] )
+
+# Config keys which only select stages; they are not part of the key of the
+# stages they don't apply to
+STAGE_SELECTION_CONF_KEYS = {
+    "make_sixtrack_sequ_by_sequ": None,
+    "make_elem_by_elem_data": None,
+    "make_until_num_turn_data": None,
+    "until_num_turns": "until_turn" }
+
+VERSIONED_PACKAGES = ( "sixtracklib", "pysixtrack", "sixtracktools", "numpy" )
+
+def stage_output_files( stage, conf=dict() ):
+    if stage == "lattice":
+        output_files = [ "cobj_lattice.bin", "pysixtrack_lattice.npz",
+                         "demotrack_lattice.bin" ]
+        if conf.get( "write_legacy_pickles", True ):
+            output_files.append( "pysixtrack_lattice.pickle" )
+        if conf.get( "compact_lattice", False ):
+            output_files.append( LATTICE_INDEX_MAP_FILE_NAME )
+        return output_files
+    elif stage == "initial_particles":
+        output_files = [ "cobj_initial_particles.bin",
+                         "cobj_initial_single_particles.bin",
+                         "pysixtrack_initial_particles.npz",
+                         "demotrack_initial_particles.pickle" ]
+        if conf.get( "write_legacy_pickles", True ):
+            output_files.append( "pysixtrack_initial_particles.pickle" )
+        return output_files
+    elif stage == "sequ_by_sequ":
+        return [ "cobj_particles_sixtrack.bin" ]
+    elif stage == "elem_by_elem":
+        return [ "cobj_particles_elem_by_elem_pysixtrack.bin",
+                 "demotrack_elem_by_elem_pysixtrack.pickle",
+                 LOSS_TABLE_FILE_NAMES[ "elem_by_elem" ] ]
+    elif stage == "until_turn":
+        output_files = [ LOSS_TABLE_FILE_NAMES[ "until_turn" ] ]
+        for turn in until_turn_milestones( conf.get( "until_num_turns", 1 ) ):
+            output_files.append( f"cobj_particles_until_turn_{turn}.bin" )
+            output_files.append( f"demotrack_particles_until_turn_{turn}.bin" )
+        return output_files
+    raise ValueError( f"unknown stage: {stage}" )
+
+def hash_file( path, chunk_size=1 << 20 ):
+    h = hashlib.sha256()
+    with open( path, "rb" ) as f_in:
+        for chunk in iter( lambda: f_in.read( chunk_size ), b"" ):
+            h.update( chunk )
+    return h.hexdigest()
+
+def hash_directory( path ):
+    hashes = dict()
+    for name in sorted( os.listdir( path ) ):
+        file_path = os.path.join( path, name )
+        if os.path.isfile( file_path ):
+            hashes[ name ] = hash_file( file_path )
+    return hashes
+
+def package_versions():
+    versions = dict()
+    for name in VERSIONED_PACKAGES:
+        try:
+            versions[ name ] = metadata.version( name )
+        except metadata.PackageNotFoundError:
+            try:
+                versions[ name ] = str( __import__( name ).__version__ )
+            except ( ImportError, AttributeError ):
+                versions[ name ] = "unknown"
+    return versions
+
+def effective_config( conf=dict() ):
+    return { key: value for key, value in conf.items()
+             if key not in NON_OUTPUT_CONF_KEYS }
+
+class RegenerationCache( object ):
+    def __init__( self, input_path, output_path, conf=dict() ):
+        self.enabled = conf.get( "use_regeneration_cache", True )
+        self.output_path = output_path
+        self.path = os.path.join( output_path, MANIFEST_FILE_NAME )
+        self.conf = conf
+        self.inputs = hash_directory( input_path )
+        self.effective_conf = effective_config( conf )
+        self.versions = package_versions()
+        self.manifest = self._load()
+
+    def _load( self ):
+        try:
+            with open( self.path, "r" ) as f_in:
+                manifest = json.load( f_in )
+        except ( OSError, ValueError ):
+            manifest = None
+        if not isinstance( manifest, dict ) or \
+            manifest.get( "format_version" ) != MANIFEST_FORMAT_VERSION:
+            manifest = { "format_version": MANIFEST_FORMAT_VERSION,
+                         "stages": {} }
+        return manifest
+
+    def _save( self ):
+        self.manifest[ "inputs" ] = self.inputs
+        self.manifest[ "config" ] = self.effective_conf
+        self.manifest[ "versions" ] = self.versions
+        tmp_path = self.path + ".tmp"
+        with open( tmp_path, "w" ) as f_out:
+            json.dump( self.manifest, f_out, indent=4, sort_keys=True,
+                       default=str )
+        os.replace( tmp_path, self.path )
+
+    def stage_key( self, stage ):
+        stage_conf = { key: value for key, value in self.effective_conf.items()
+            if STAGE_SELECTION_CONF_KEYS.get( key, stage ) == stage }
+        key_data = json.dumps( {
+            "format_version": MANIFEST_FORMAT_VERSION,
+            "stage": stage,
+            "inputs": self.inputs,
+            "config": stage_conf,
+            "versions": self.versions }, sort_keys=True, default=str )
+        return hashlib.sha256( key_data.encode( "utf-8" ) ).hexdigest()
+
+    def is_up_to_date( self, stage ):
+        if not self.enabled:
+            return False
+        entry = self.manifest[ "stages" ].get( stage, None )
+        if entry is None or entry.get( "key" ) != self.stage_key( stage ):
+            return False
+        outputs = entry.get( "outputs", [] )
+        return len( outputs ) > 0 and all( os.path.isfile(
+            os.path.join( self.output_path, name ) ) for name in outputs )
+
+    def update( self, stage ):
+        outputs = [ name for name in stage_output_files( stage, self.conf )
+            if os.path.isfile( os.path.join( self.output_path, name ) ) ]
+        self.manifest[ "stages" ][ stage ] = {
+            "key": self.stage_key( stage ), "outputs": outputs }
+        self._save()
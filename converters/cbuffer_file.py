@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Layout of a cbuffer in 64bit words: the header holds the base address, the
+# size in bytes, the header size in bytes and the addresses of the slots,
+# objects, pointers and garbage sections. Every section starts with its size
+# in bytes and its number of entries, followed by the entries: the slots,
+# ( address, type id, size ) per object, the addresses of the pointer fields
+# in the slots and ( address, size ) per garbage range. A normalised cbuffer
+# has all addresses relative to the same ( normalised ) base address
+
+HEADER_BASE_ADDR = 0
+HEADER_SIZE = 1
+HEADER_HEADER_SIZE = 2
+HEADER_SLOTS_ADDR = 3
+HEADER_OBJECTS_ADDR = 4
+HEADER_POINTERS_ADDR = 5
+HEADER_GARBAGE_ADDR = 6
+
+SECTION_HEADER_LEN = 2
+OBJECT_ENTRY_LEN = 3
+WORD_SIZE = 8
+
+def _section( words, base_addr, header_index ):
+    begin = ( int( words[ header_index ] ) - base_addr ) // WORD_SIZE
+    return begin + SECTION_HEADER_LEN, int( words[ begin + 1 ] )
+
+class NormalisedCBufferWriter( object ):
+    # Writes one normalised cbuffer file from several normalised cbuffers
+    # ( chunks ) with the same base address, e.g. the particle sets of the
+    # elem-by-elem data chunk by chunk. The objects of the chunks are appended
+    # in order and the slots are written as they arrive; only the object and
+    # pointer lists are kept until close()
+    def __init__( self, path ):
+        self.path = path
+        self.num_slots = 0
+        self._header = None
+        self._garbage = None
+        self._objects = []
+        self._pointers = []
+        self._f_out = open( path, "wb" )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f_out.close()
+        return False
+
+    def append_file( self, path ):
+        self.append( np.fromfile( path, dtype=np.int64 ) )
+
+    def append( self, words ):
+        words = np.asarray( words, dtype=np.int64 )
+        base_addr = int( words[ HEADER_BASE_ADDR ] )
+        header_len = int( words[ HEADER_HEADER_SIZE ] ) // WORD_SIZE
+        if self._header is None:
+            self._header = words[ :header_len ].copy()
+            # Placeholders for the header and the slots section header, both
+            # are written by close()
+            self._f_out.write( bytes( ( header_len + SECTION_HEADER_LEN ) *
+                                      WORD_SIZE ) )
+        assert base_addr == int( self._header[ HEADER_BASE_ADDR ] )
+        assert header_len == len( self._header )
+
+        slots_begin, num_slots = _section(
+            words, base_addr, HEADER_SLOTS_ADDR )
+        objects_begin, num_objects = _section(
+            words, base_addr, HEADER_OBJECTS_ADDR )
+        pointers_begin, num_pointers = _section(
+            words, base_addr, HEADER_POINTERS_ADDR )
+        garbage_begin, num_garbage = _section(
+            words, base_addr, HEADER_GARBAGE_ADDR )
+        assert num_garbage == 0
+        if self._garbage is None:
+            self._garbage = words[
+                garbage_begin - SECTION_HEADER_LEN:garbage_begin ].copy()
+
+        # All addresses point into the slots of the chunk, which move behind
+        # the slots of the chunks written before
+        slots_addr = base_addr + slots_begin * WORD_SIZE
+        out_slots_addr = base_addr + ( header_len + SECTION_HEADER_LEN +
+                                       self.num_slots ) * WORD_SIZE
+        shift = out_slots_addr - slots_addr
+
+        slots = words[ slots_begin:slots_begin + num_slots ].copy()
+        pointers = words[ pointers_begin:pointers_begin + num_pointers ]
+        slots[ ( pointers - slots_addr ) // WORD_SIZE ] += shift
+        objects = words[ objects_begin:objects_begin +
+            OBJECT_ENTRY_LEN * num_objects ].reshape( -1, OBJECT_ENTRY_LEN )
+        objects = objects.copy()
+        objects[ :, 0 ] += shift
+        self._objects.append( objects.reshape( -1 ) )
+        self._pointers.append( pointers + shift )
+
+        self._f_out.write( slots.tobytes() )
+        self.num_slots += num_slots
+
+    def _write_words( self, *words ):
+        for values in words:
+            self._f_out.write( np.asarray( values, dtype=np.int64 ).tobytes() )
+
+    def close( self ):
+        if self._header is None:
+            self._f_out.close()
+            raise RuntimeError( f"cbuffer {self.path}: no chunk written" )
+        header = self._header
+        base_addr = int( header[ HEADER_BASE_ADDR ] )
+        objects = np.concatenate( self._objects )
+        pointers = np.concatenate( self._pointers )
+
+        slots_addr = base_addr + len( header ) * WORD_SIZE
+        slots_size = ( SECTION_HEADER_LEN + self.num_slots ) * WORD_SIZE
+        objects_addr = slots_addr + slots_size
+        objects_size = ( SECTION_HEADER_LEN + len( objects ) ) * WORD_SIZE
+        pointers_addr = objects_addr + objects_size
+        pointers_size = ( SECTION_HEADER_LEN + len( pointers ) ) * WORD_SIZE
+        garbage_addr = pointers_addr + pointers_size
+        header[ HEADER_SIZE ] = garbage_addr + \
+            len( self._garbage ) * WORD_SIZE - base_addr
+        header[ HEADER_SLOTS_ADDR ] = slots_addr
+        header[ HEADER_OBJECTS_ADDR ] = objects_addr
+        header[ HEADER_POINTERS_ADDR ] = pointers_addr
+        header[ HEADER_GARBAGE_ADDR ] = garbage_addr
+
+        self._write_words( [ objects_size, len( objects ) // OBJECT_ENTRY_LEN ],
+            objects, [ pointers_size, len( pointers ) ], pointers,
+            self._garbage )
+        self._f_out.seek( 0 )
+        self._write_words( header, [ slots_size, self.num_slots ] )
+        self._f_out.close()
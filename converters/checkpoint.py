@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+
+from .columnar import save_particles
+from .columnar import load_particles
+
+from .progress import ProgressReporter
+from .progress import DEFAULT_PROGRESS_INTERVAL
+
+CHECKPOINT_FILE_PREFIX = "until_turn_checkpoint_"
+CHECKPOINT_FORMAT_VERSION = 2
+
+def until_turn_milestones( until_num_turns ):
+    # until_num_turns is either a single turn, a list of turns or a stride
+    # given as a table { stride = S, until = N } -> S, 2 * S, ..., N
+    if isinstance( until_num_turns, dict ):
+        stride = int( until_num_turns[ "stride" ] )
+        until = int( until_num_turns[ "until" ] )
+        assert stride > 0
+        milestones = list( range( stride, until + 1, stride ) )
+        if until > 0 and ( len( milestones ) == 0 or milestones[ -1 ] != until ):
+            milestones.append( until )
+    elif isinstance( until_num_turns, ( list, tuple ) ):
+        milestones = [ int( turn ) for turn in until_num_turns ]
+    else:
+        milestones = [ int( until_num_turns ) ]
+    return sorted( set( turn for turn in milestones if turn > 0 ) )
+
+def checkpoint_key( particles, line, versions=dict() ):
+    # Identifies the tracking problem: a checkpoint is only resumed for the
+    # same initial particles, the same line and the same package versions
+    # ( see cache.package_versions ). particles may be any iterable, e.g. a
+    # generator over all blocks of a large distribution
+    h = hashlib.sha256()
+    for in_p in particles:
+        h.update( pickle.dumps( in_p, protocol=4 ) )
+    h.update( pickle.dumps( list( line ), protocol=4 ) )
+    h.update( json.dumps( versions, sort_keys=True ).encode( "utf-8" ) )
+    return h.hexdigest()
+
+class TrackingCheckpoint( object ):
+    # One checkpoint file per turn; the state at the final milestone of a run
+    # is kept so that a later run with more turns resumes from there.
+    # Intermediate checkpoints are removed once the run has moved past them.
+    # Either holds all particles or, for block-wise tracking, a directory of
+    # columnar files with one file per block
+    def __init__( self, output_path, key, interval=0, resume=True ):
+        self.output_path = output_path
+        self.key = key
+        self.interval = max( int( interval ), 0 )
+        self.resume = resume
+        # milestones which have been written by runs with this key
+        self.milestones = set()
+        self._saved_turns = []
+
+    def path( self, turn ):
+        return os.path.join( self.output_path,
+                             f"{CHECKPOINT_FILE_PREFIX}{turn}.pickle" )
+
+    def blocks_path( self, turn ):
+        return os.path.join( self.output_path,
+                             f"{CHECKPOINT_FILE_PREFIX}{turn}_blocks" )
+
+    def turns( self ):
+        turns = []
+        pattern = re.compile( CHECKPOINT_FILE_PREFIX + r"(\d+)\.pickle$" )
+        if os.path.isdir( self.output_path ):
+            for file_name in os.listdir( self.output_path ):
+                match = pattern.match( file_name )
+                if match is not None:
+                    turns.append( int( match.group( 1 ) ) )
+        return sorted( turns )
+
+    def _read( self, turn ):
+        try:
+            with open( self.path( turn ), "rb" ) as f_in:
+                data = pickle.load( f_in )
+        except ( OSError, pickle.UnpicklingError, EOFError ):
+            return None
+        if not isinstance( data, dict ) or \
+            data.get( "format_version" ) != CHECKPOINT_FORMAT_VERSION:
+            return None
+        return data
+
+    def _remove( self, turn ):
+        if os.path.isfile( self.path( turn ) ):
+            os.remove( self.path( turn ) )
+        if os.path.isdir( self.blocks_path( turn ) ):
+            shutil.rmtree( self.blocks_path( turn ) )
+
+    def is_written( self, milestone, milestone_written=None ):
+        return milestone in self.milestones and \
+            ( milestone_written is None or milestone_written( milestone ) )
+
+    def load( self, milestones, milestone_written=None, blocks=False ):
+        # Returns the checkpoint with the highest turn <= the last milestone
+        # for which all earlier milestones have already been written, i.e.
+        # are in the checkpoint and milestone_written( turn ) is True
+        if not self.resume:
+            return None
+        for turn in reversed( self.turns() ):
+            data = self._read( turn )
+            if data is None or data.get( "key" ) != self.key or \
+                turn > milestones[ -1 ] or ( "blocks" in data ) != blocks:
+                continue
+            self.milestones = set( data[ "milestones" ] )
+            missing = [ milestone for milestone in milestones
+                        if milestone < turn and
+                        not self.is_written( milestone, milestone_written ) ]
+            if len( missing ) > 0:
+                print( f"****    Info :: milestone {missing[ 0 ]} is " +
+                       f"missing, not resuming from checkpoint at turn {turn}" )
+                continue
+            return data
+        self.milestones = set()
+        return None
+
+    def mark_milestone( self, milestone ):
+        self.milestones.add( milestone )
+
+    def save( self, turn, particles=None, blocks=None ):
+        # blocks: list of ( begin, end, file name in blocks_path( turn ) )
+        assert ( particles is None ) != ( blocks is None )
+        data = { "format_version": CHECKPOINT_FORMAT_VERSION,
+                 "key": self.key, "turn": turn,
+                 "milestones": sorted( self.milestones ) }
+        if particles is not None:
+            data[ "particles" ] = list( particles )
+        else:
+            data[ "blocks" ] = list( blocks )
+        tmp_path = self.path( turn ) + ".tmp"
+        with open( tmp_path, "wb" ) as f_out:
+            pickle.dump( data, f_out )
+        os.replace( tmp_path, self.path( turn ) )
+        for saved_turn in self._saved_turns:
+            if saved_turn != turn:
+                self._remove( saved_turn )
+        self._saved_turns = [ turn ]
+
+    def next_turn( self, turn, until_turn ):
+        if self.interval > 0:
+            return min( until_turn, ( turn // self.interval + 1 ) * self.interval )
+        return until_turn
+
+def track_until_turn_checkpointed( particles, until_turn, track_fn,
+    checkpoint=None, milestone_fn=None, milestone_written=None,
+    progress_interval=DEFAULT_PROGRESS_INTERVAL ):
+    # track_fn( particles, until_turn ) tracks particles which are all active
+    # and at the same turn; lost particles are carried along unchanged.
+    # until_turn is a single turn or a list of milestones; milestone_fn( turn,
+    # particles ) is called once the particles have reached each of them.
+    # When resuming from a checkpoint, milestones up to its turn which have
+    # been written before ( see TrackingCheckpoint.is_written ) are skipped.
+    # track_fn is called for chunks of turns which take about progress_interval
+    # seconds each, so that the progress is reported in between checkpoints
+    milestones = until_turn_milestones( until_turn )
+    assert len( milestones ) > 0
+    particles = list( particles )
+    turn = min( in_p.turn for in_p in particles )
+    if checkpoint is not None:
+        restored = checkpoint.load( milestones, milestone_written )
+        if restored is not None:
+            turn = restored[ "turn" ]
+            particles = list( restored[ "particles" ] )
+            print( f"****    Info :: resuming from checkpoint at turn {turn}" )
+
+    progress = ProgressReporter( milestones[ -1 ], "turns", progress_interval,
+                                 num_done=min( turn, milestones[ -1 ] ) )
+    num_chunk_turns = 1
+    for milestone in milestones:
+        if checkpoint is not None and milestone <= turn and \
+            checkpoint.is_written( milestone, milestone_written ):
+            print( f"****    Info :: milestone {milestone} already written" )
+            continue
+        while turn < milestone:
+            if checkpoint is not None:
+                segment_end = min( checkpoint.next_turn( turn, milestone ),
+                                   milestone )
+            else:
+                segment_end = milestone
+            next_turn = min( turn + num_chunk_turns, segment_end )
+            active = [ ii for ii, in_p in enumerate( particles )
+                       if in_p.state == 1 ]
+            start = time.perf_counter()
+            if len( active ) > 0:
+                tracked = track_fn(
+                    [ particles[ ii ] for ii in active ], next_turn )
+                for ii, in_p in zip( active, tracked ):
+                    particles[ ii ] = in_p
+                # Size the chunks so that the progress is updated about once
+                # per progress interval, independent of the checkpoints
+                elapsed = time.perf_counter() - start
+                num_chunk_turns = max( 1, int( ( next_turn - turn ) *
+                    progress_interval / elapsed ) ) if elapsed > 0 \
+                    else 2 * num_chunk_turns
+            else:
+                next_turn = milestone
+            progress.update( next_turn - turn )
+            turn = next_turn
+            if checkpoint is not None and turn == segment_end and \
+                turn < milestone:
+                checkpoint.save( turn, particles=particles )
+        if milestone_fn is not None:
+            milestone_fn( milestone, particles )
+        if checkpoint is not None:
+            checkpoint.mark_milestone( milestone )
+            checkpoint.save( milestone, particles=particles )
+    progress.finish()
+    return particles
+
+def track_until_turn_in_blocks( blocks, until_turn, track_fn, block_fn,
+    milestone_fn=None, checkpoint=None, milestone_written=None,
+    scratch_path=None, progress_interval=DEFAULT_PROGRESS_INTERVAL ):
+    # Block-wise version of track_until_turn_checkpointed for distributions
+    # which should not be held in memory as a whole. blocks is an iterable
+    # over ( begin, end, particles ). The blocks are tracked one after the
+    # other from stop to stop, i.e. from milestone to milestone and to the
+    # checkpoint interval turns in between. At each milestone, every block is
+    # passed on to block_fn( turn, begin, end, particles ) and milestone_fn(
+    # turn ) is called once all blocks have reached it. In between stops the
+    # block states are kept in columnar files, which are part of the
+    # checkpoint if there is one. The final milestone is always passed on to
+    # block_fn, also when resuming from a checkpoint at that turn
+    milestones = until_turn_milestones( until_turn )
+    assert len( milestones ) > 0
+    turn = 0
+    block_files = None
+    if checkpoint is not None:
+        restored = checkpoint.load( milestones, milestone_written, blocks=True )
+        if restored is not None:
+            turn = restored[ "turn" ]
+            block_files = [ ( begin, end, os.path.join(
+                checkpoint.blocks_path( turn ), file_name ) )
+                for begin, end, file_name in restored[ "blocks" ] ]
+            print( f"****    Info :: resuming from checkpoint at turn {turn}" )
+
+    stops = set( milestones )
+    if checkpoint is not None and checkpoint.interval > 0:
+        stops.update( range( checkpoint.interval, milestones[ -1 ],
+                             checkpoint.interval ) )
+    stops = [ stop for stop in sorted( stops ) if stop > turn or (
+        stop == turn and ( stop == milestones[ -1 ] or stop in milestones and
+            not checkpoint.is_written( stop, milestone_written ) ) ) ]
+    for milestone in milestones:
+        if milestone <= turn and milestone not in stops:
+            print( f"****    Info :: milestone {milestone} already written" )
+
+    with tempfile.TemporaryDirectory( prefix="until_turn_blocks_",
+            dir=scratch_path ) as tmp_path:
+        for stop in stops:
+            if block_files is None:
+                source = blocks
+            else:
+                source = ( ( begin, end, load_particles( path ) )
+                           for begin, end, path in block_files )
+            if checkpoint is not None:
+                out_path = checkpoint.blocks_path( stop )
+            else:
+                out_path = os.path.join( tmp_path, f"turn_{stop}" )
+            os.makedirs( out_path, exist_ok=True )
+            keep_blocks = checkpoint is not None or stop < stops[ -1 ]
+            next_block_files = []
+            for begin, end, particles in source:
+                if stop > turn:
+                    print( f"****    Info :: particles {begin} - {end - 1} " +
+                           f"until turn {stop}" )
+                    particles = track_until_turn_checkpointed( particles,
+                        stop, track_fn, progress_interval=progress_interval )
+                if stop in milestones:
+                    block_fn( stop, begin, end, particles )
+                if keep_blocks and stop > turn:
+                    path = os.path.join( out_path, f"block_{begin}.npz" )
+                    save_particles( path, particles )
+                    next_block_files.append( ( begin, end, path ) )
+            if stop in milestones and milestone_fn is not None:
+                milestone_fn( stop )
+            if stop == turn:
+                # Replayed from the checkpoint, nothing has been tracked
+                if checkpoint is not None:
+                    checkpoint.mark_milestone( stop )
+                continue
+            if checkpoint is not None:
+                if stop in milestones:
+                    checkpoint.mark_milestone( stop )
+                checkpoint.save( stop, blocks=[ ( begin, end,
+                    os.path.basename( path ) )
+                    for begin, end, path in next_block_files ] )
+            elif turn > 0:
+                shutil.rmtree( os.path.join( tmp_path, f"turn_{turn}" ) )
+            block_files = next_block_files
+            turn = stop
@@ -52,3 +52,64 @@ def create_particle_set_cbuffer(
         pset = st.st_Particles( cbuffer, max_num_particles_per_set )
     assert n_objs == cbuffer.num_objects
     return cbuffer
+
+class CBufferPool( object ):
+    # Keeps buffers of already seen geometries around after they have been
+    # released so that later stages / scenarios don't have to size, allocate
+    # and populate them again. A released buffer is handed out as-is, i.e.
+    # only stages which overwrite every particle should acquire from the pool
+    def __init__( self, max_free_bytes=256 * 1024 * 1024 ):
+        self.max_free_bytes = max_free_bytes
+        self.free_bytes = 0
+        self.num_created = 0
+        self.num_reused = 0
+        self._free = dict()
+        self._acquired = dict()
+
+    def _acquire( self, key, num_bytes, create_fn ):
+        free_buffers = self._free.get( key, [] )
+        if len( free_buffers ) > 0:
+            cbuffer = free_buffers.pop()
+            self.free_bytes -= num_bytes
+            self.num_reused += 1
+        else:
+            cbuffer = create_fn()
+            self.num_created += 1
+        self._acquired[ id( cbuffer ) ] = ( key, num_bytes )
+        return cbuffer
+
+    def particle_set_buffer(
+        self, num_particle_sets, max_num_particles_per_set, conf=dict() ):
+        slot_size = st.CBufferView.DEFAULT_SLOT_SIZE
+        n_slots, _, _ = calc_cbuffer_params_for_particles_buffer(
+            num_particle_sets, max_num_particles_per_set, conf=conf )
+        key = ( "st_Particles", num_particle_sets, max_num_particles_per_set )
+        return self._acquire( key, n_slots * slot_size,
+            lambda: create_particle_set_cbuffer( num_particle_sets,
+                max_num_particles_per_set, conf=conf ) )
+
+    def single_particle_buffer(
+        self, num_particle_sets, max_num_particles_per_set, conf=dict() ):
+        slot_size = st.CBufferView.DEFAULT_SLOT_SIZE
+        n_slots, _, _ = calc_cbuffer_params_for_single_particle_buffer(
+            num_particle_sets, max_num_particles_per_set, conf=conf )
+        key = ( "st_SingleParticle",
+                num_particle_sets * max_num_particles_per_set )
+        return self._acquire( key, n_slots * slot_size,
+            lambda: create_single_particle_cbuffer( num_particle_sets,
+                max_num_particles_per_set, conf=conf ) )
+
+    def release( self, cbuffer ):
+        entry = self._acquired.pop( id( cbuffer ), None )
+        if entry is None:
+            return
+        key, num_bytes = entry
+        if self.free_bytes + num_bytes <= self.max_free_bytes:
+            self._free.setdefault( key, [] ).append( cbuffer )
+            self.free_bytes += num_bytes
+
+    def clear( self ):
+        self._free = dict()
+        self.free_bytes = 0
+
+BUFFER_POOL = CBufferPool()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import numbers
+import zipfile
+import numpy as np
+
+# Tracking is done using pysixtrack
+import pysixtrack as pysix
+
+from .tracking import bunch_to_particle
+from .tracking import particles_to_bunch
+
+DEFAULT_BLOCK_SIZE = 65536
+
+LINE_FORMAT = "pysixtrack_line_columnar"
+PARTICLES_FORMAT = "pysixtrack_particles_columnar"
+FORMAT_VERSION = 1
+
+# Lines are stored as one table per element type with one column per field.
+# List-valued fields ( e.g. knl, ksl ) are stored as a flat data array plus
+# offsets. element_types / element_rows locate each element in its table,
+# which allows constructing only a range of elements when loading
+
+def _type_name( elem_type ):
+    return f"{elem_type.__module__}:{elem_type.__qualname__}"
+
+def _resolve_type( type_name ):
+    module_name, qualname = type_name.split( ":" )
+    elem_type = importlib.import_module( module_name )
+    for name in qualname.split( "." ):
+        elem_type = getattr( elem_type, name )
+    return elem_type
+
+def _is_scalar( value ):
+    return isinstance( value, ( numbers.Number, np.number, np.bool_ ) )
+
+def _scalar_column( values ):
+    if all( isinstance( v, ( bool, np.bool_ ) ) for v in values ):
+        return np.array( values, dtype=np.bool_ )
+    if all( isinstance( v, ( int, np.integer ) ) and
+            not isinstance( v, ( bool, np.bool_ ) ) for v in values ):
+        return np.array( values, dtype=np.int64 )
+    return np.array( values, dtype=np.float64 )
+
+def save_line( path, elements, element_names=None ):
+    elements = list( elements )
+    type_names = []
+    type_index = dict()
+    element_types = np.empty( len( elements ), dtype=np.int64 )
+    element_rows = np.empty( len( elements ), dtype=np.int64 )
+    tables = []
+    for ii, elem in enumerate( elements ):
+        elem_type = type( elem )
+        if elem_type not in type_index:
+            type_index[ elem_type ] = len( type_names )
+            type_names.append( _type_name( elem_type ) )
+            tables.append( [] )
+        kk = type_index[ elem_type ]
+        element_types[ ii ] = kk
+        element_rows[ ii ] = len( tables[ kk ] )
+        tables[ kk ].append( elem )
+
+    arrays = { "format": np.array( LINE_FORMAT ),
+               "format_version": np.array( FORMAT_VERSION ),
+               "type_names": np.array( type_names ),
+               "element_types": element_types,
+               "element_rows": element_rows }
+    if element_names is not None:
+        assert len( element_names ) == len( elements )
+        arrays[ "element_names" ] = np.array(
+            [ name.encode( "utf-8" ) for name in element_names ] )
+
+    for kk, table in enumerate( tables ):
+        for field in type( table[ 0 ] )._fields:
+            values = [ getattr( elem, field ) for elem in table ]
+            key = f"{kk}/{field}"
+            is_none = np.array( [ v is None for v in values ], dtype=np.bool_ )
+            if np.any( is_none ):
+                arrays[ f"{key}/is_none" ] = is_none
+                values = [ v for v in values if v is not None ]
+            if all( isinstance( v, ( list, tuple, np.ndarray ) )
+                    for v in values ):
+                offsets = np.zeros( len( values ) + 1, dtype=np.int64 )
+                offsets[ 1: ] = np.cumsum( [ len( v ) for v in values ] )
+                data = [ x for v in values for x in v ]
+                arrays[ f"{key}/data" ] = _scalar_column( data ) \
+                    if len( data ) > 0 else np.zeros( 0, dtype=np.float64 )
+                arrays[ f"{key}/offsets" ] = offsets
+            elif all( _is_scalar( v ) for v in values ):
+                arrays[ key ] = _scalar_column( values )
+            else:
+                raise ValueError( f"unable to store field {field} of " +
+                                  f"{type_names[ kk ]} in columnar format" )
+    with open( path, "wb" ) as f_out:
+        np.savez( f_out, **arrays )
+
+class ColumnarLine( object ):
+    def __init__( self, path ):
+        self.path = path
+        self._npz = np.load( path, allow_pickle=False )
+        assert str( self._npz[ "format" ] ) == LINE_FORMAT
+        assert int( self._npz[ "format_version" ] ) == FORMAT_VERSION
+        self.type_names = [ str( name ) for name in self._npz[ "type_names" ] ]
+        self.element_types = self._npz[ "element_types" ]
+        self.element_rows = self._npz[ "element_rows" ]
+        self._columns = dict()
+
+    def __len__( self ):
+        return len( self.element_types )
+
+    @property
+    def element_names( self ):
+        if "element_names" not in self._npz.files:
+            return None
+        return [ name.decode( "utf-8" ) for name in
+                 self._npz[ "element_names" ].tolist() ]
+
+    def _table( self, kk ):
+        # Columns are only read from disk on first use and converted back to
+        # python scalars / lists once
+        if kk not in self._columns:
+            elem_type = _resolve_type( self.type_names[ kk ] )
+            columns = dict()
+            for field in elem_type._fields:
+                key = f"{kk}/{field}"
+                if key in self._npz.files:
+                    column = self._npz[ key ].tolist()
+                else:
+                    data = self._npz[ f"{key}/data" ].tolist()
+                    offsets = self._npz[ f"{key}/offsets" ].tolist()
+                    column = [ data[ offsets[ ii ]:offsets[ ii + 1 ] ]
+                        for ii in range( len( offsets ) - 1 ) ]
+                if f"{key}/is_none" in self._npz.files:
+                    values = iter( column )
+                    column = [ None if is_none else next( values )
+                        for is_none in self._npz[ f"{key}/is_none" ].tolist() ]
+                columns[ field ] = column
+            self._columns[ kk ] = ( elem_type, columns )
+        return self._columns[ kk ]
+
+    def elements( self, begin=0, end=None ):
+        if end is None:
+            end = len( self )
+        assert 0 <= begin <= end <= len( self )
+        elements = []
+        for kk, row in zip( self.element_types[ begin:end ].tolist(),
+                            self.element_rows[ begin:end ].tolist() ):
+            elem_type, columns = self._table( kk )
+            elements.append( elem_type( **{ field: column[ row ]
+                for field, column in columns.items() } ) )
+        return elements
+
+    def close( self ):
+        self._npz.close()
+
+def load_elements( path, begin=0, end=None ):
+    line = ColumnarLine( path )
+    try:
+        return line.elements( begin, end )
+    finally:
+        line.close()
+
+def load_line( path, begin=0, end=None ):
+    line = ColumnarLine( path )
+    try:
+        return pysix.Line( elements=line.elements( begin, end ),
+            element_names=None if line.element_names is None else
+                line.element_names[ begin:end ] )
+    finally:
+        line.close()
+
+def save_particles( path, particles ):
+    # particles is either a list of pysix.Particles or an array-valued bunch
+    if isinstance( particles, pysix.Particles ):
+        bunch = particles
+    else:
+        bunch = particles_to_bunch( list( particles ) )
+    arrays = { "format": np.array( PARTICLES_FORMAT ),
+               "format_version": np.array( FORMAT_VERSION ) }
+    for key, value in bunch.__dict__.items():
+        if isinstance( value, np.ndarray ):
+            arrays[ f"p/{key}" ] = value
+    with open( path, "wb" ) as f_out:
+        np.savez( f_out, **arrays )
+
+def load_particles( path, begin=0, end=None ):
+    with np.load( path, allow_pickle=False ) as npz:
+        assert str( npz[ "format" ] ) == PARTICLES_FORMAT
+        assert int( npz[ "format_version" ] ) == FORMAT_VERSION
+        bunch = pysix.Particles()
+        for key in npz.files:
+            if key.startswith( "p/" ):
+                bunch.__dict__[ key[ 2: ] ] = npz[ key ][ begin:end ]
+    bunch.lost_particles = []
+    return [ bunch_to_particle( bunch, ii ) for ii in range( len( bunch.x ) ) ]
+
+def _npz_member_memmap( path, f_in, info ):
+    # np.savez stores the members uncompressed -> the .npy data of a member
+    # can be mapped directly from the archive
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    f_in.seek( info.header_offset )
+    local_header = f_in.read( 30 )
+    if local_header[ :4 ] != b"PK\x03\x04":
+        return None
+    name_length = int.from_bytes( local_header[ 26:28 ], "little" )
+    extra_length = int.from_bytes( local_header[ 28:30 ], "little" )
+    f_in.seek( info.header_offset + 30 + name_length + extra_length )
+    version = np.lib.format.read_magic( f_in )
+    if version == ( 1, 0 ):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0( f_in )
+    elif version == ( 2, 0 ):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0( f_in )
+    else:
+        return None
+    if fortran_order or dtype.hasobject:
+        return None
+    if int( np.prod( shape ) ) == 0:
+        return np.zeros( shape, dtype=dtype )
+    return np.memmap( path, dtype=dtype, mode="r", offset=f_in.tell(),
+                      shape=shape )
+
+class ParticleBlockReader( object ):
+    # Reads a columnar particle distribution block by block. The columns are
+    # memory mapped where possible, so only the current block is ever
+    # converted to pysix.Particles instances
+    def __init__( self, path, block_size=DEFAULT_BLOCK_SIZE ):
+        assert block_size > 0
+        self.path = path
+        self.block_size = block_size
+        self._columns = dict()
+        with zipfile.ZipFile( path ) as archive, open( path, "rb" ) as f_in:
+            for info in archive.infolist():
+                name = info.filename[ :-len( ".npy" ) ]
+                if name.startswith( "p/" ):
+                    column = _npz_member_memmap( path, f_in, info )
+                    if column is None:
+                        with archive.open( info ) as f_member:
+                            column = np.lib.format.read_array( f_member )
+                    self._columns[ name[ 2: ] ] = column
+            with archive.open( "format.npy" ) as f_member:
+                assert str( np.lib.format.read_array( f_member ) ) == \
+                    PARTICLES_FORMAT
+            with archive.open( "format_version.npy" ) as f_member:
+                assert int( np.lib.format.read_array( f_member ) ) == \
+                    FORMAT_VERSION
+        assert "x" in self._columns
+        self.num_particles = len( self._columns[ "x" ] )
+
+    def __len__( self ):
+        return self.num_particles
+
+    def bunch( self, begin, end ):
+        assert 0 <= begin <= end <= self.num_particles
+        bunch = pysix.Particles()
+        for key, column in self._columns.items():
+            bunch.__dict__[ key ] = np.array( column[ begin:end ] )
+        bunch.lost_particles = []
+        return bunch
+
+    def particles( self, begin, end ):
+        bunch = self.bunch( begin, end )
+        return [ bunch_to_particle( bunch, ii ) for ii in range( end - begin ) ]
+
+    def __iter__( self ):
+        # ( begin, end, particles ) per block
+        for begin in range( 0, self.num_particles, self.block_size ):
+            end = min( begin + self.block_size, self.num_particles )
+            yield begin, end, self.particles( begin, end )
@@ -4,5 +4,115 @@
 import struct
 import numpy as np
 
+import sixtracklib as st
+
+DEFAULT_CHUNK_SIZE = 65536
+
+DEMOTRACK_HEADER_SIZE = 8
+
 def float_to_bytes( value, format_str="<d", dtype=np.float64 ):
     return bytes( struct.pack( format_str, dtype( value ) ) )
+
+def array_to_bytes_view( array ):
+    # Byte view on the array's memory -> writing it doesn't create the
+    # temporary copy tobytes() does ( unless array is not contiguous )
+    return memoryview( np.ascontiguousarray( array ).reshape( -1 ).view(
+        np.uint8 ) )
+
+def write_demotrack_array( f_out, array, num_items=None ):
+    # demotrack files store the number of items as a double followed by the
+    # raw array data
+    if num_items is None:
+        num_items = len( array )
+    f_out.write( float_to_bytes( num_items ) )
+    f_out.write( array_to_bytes_view( array ) )
+
+def create_demotrack_memmap( path, num_particles ):
+    # Particle array backed by the output file itself: particles converted
+    # into it are written to disk without a copy being kept in memory.
+    # Entries not written to keep the content of a freshly created array
+    assert num_particles >= 0
+    blank = st.st_DemotrackParticle.CREATE_ARRAY( 1, True )
+    assert isinstance( blank, np.ndarray )
+    with open( path, "wb" ) as f_out:
+        f_out.write( float_to_bytes( num_particles ) )
+        f_out.truncate( DEMOTRACK_HEADER_SIZE +
+                        num_particles * blank[ :1 ].nbytes )
+    if num_particles == 0:
+        return blank[ :0 ].copy()
+    dt_particles = np.memmap( path, dtype=blank.dtype, mode="r+",
+        offset=DEMOTRACK_HEADER_SIZE,
+        shape=( num_particles, ) + blank.shape[ 1: ] )
+    dt_particles[ : ] = blank[ 0 ]
+    return dt_particles
+
+def pset_to_demotrack( pset, dt_array=None, begin=0, end=None, offset=0 ):
+    # Converts the particles [ begin, end ) of pset to the demotrack entries
+    # [ offset, offset + end - begin ) of dt_array
+    if end is None:
+        end = pset.num_particles
+    assert 0 <= begin <= end <= pset.num_particles
+    if dt_array is None:
+        dt_array = st.st_DemotrackParticle.CREATE_ARRAY( end - begin, True )
+    assert offset + end - begin <= len( dt_array )
+    dt_p = st.st_DemotrackParticle()
+    for ii in range( begin, end ):
+        dt_p.clear()
+        dt_p.from_cobjects( pset, ii )
+        dt_p.to_array( dt_array, offset + ii - begin )
+    return dt_array
+
+class DemotrackStreamWriter( object ):
+    # Writes the same file as dumping all converted particles as one array
+    # with a leading particle count, but takes them array by array
+    def __init__( self, path, num_particles ):
+        assert num_particles >= 0
+        self.path = path
+        self.num_particles = num_particles
+        self.num_written = 0
+        self._f_out = open( path, "wb" )
+        self._f_out.write( float_to_bytes( num_particles ) )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f_out.close()
+        return False
+
+    def append_array( self, dt_array ):
+        self._f_out.write( array_to_bytes_view( dt_array ) )
+        self.num_written += len( dt_array )
+
+    def close( self ):
+        self._f_out.close()
+        if self.num_written != self.num_particles:
+            raise RuntimeError( f"demotrack stream {self.path}: expected " +
+                f"{self.num_particles} particles, wrote {self.num_written}" )
+
+def append_elem_by_elem_demotrack_data( writer, pset_buffer, first_set,
+    num_snapshots=None, chunk_size=DEFAULT_CHUNK_SIZE ):
+    # Appends the particle sets of pset_buffer, i.e. the sets first_set,
+    # first_set + 1, ... of the elem-by-elem data, to writer. Particle ii has
+    # been written to the sets [ 0, num_snapshots[ ii ] ); its entries in the
+    # later sets are left blank. num_snapshots is None for the final set
+    if pset_buffer.num_objects == 0:
+        return
+    num_particles = st.st_Particles.GET( pset_buffer, 0 ).num_particles
+    blank = st.st_DemotrackParticle.CREATE_ARRAY( 1, True )
+    chunk_size = max( min( chunk_size, num_particles ), 1 )
+    dt_chunk = st.st_DemotrackParticle.CREATE_ARRAY( chunk_size, True )
+    for kk in range( pset_buffer.num_objects ):
+        jj = first_set + kk
+        pset = st.st_Particles.GET( pset_buffer, kk )
+        assert pset.num_particles == num_particles
+        for begin in range( 0, num_particles, chunk_size ):
+            end = min( begin + chunk_size, num_particles )
+            pset_to_demotrack( pset, dt_chunk, begin, end )
+            if num_snapshots is not None:
+                dt_chunk[ :end - begin ][
+                    num_snapshots[ begin:end ] <= jj ] = blank[ 0 ]
+            writer.append_array( dt_chunk[ :end - begin ] )
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import os
+import tempfile
+import numpy as np
+
+# sixtracklib provides the CObject based beam elements and particle types
+import sixtracklib as st
+
+from .cbuffer_file import NormalisedCBufferWriter
+from .cobjects import create_particle_set_cbuffer
+from .columnar import save_particles
+from .columnar import load_particles
+from .demotrack import DemotrackStreamWriter
+from .demotrack import DEFAULT_CHUNK_SIZE
+from .demotrack import append_elem_by_elem_demotrack_data
+from .losses import loss_table
+from .losses import concatenate_loss_tables
+from .losses import write_loss_table
+from .losses import LOSS_TABLE_FILE_NAMES
+from .parallel import get_num_workers
+from .parallel import track_elem_by_elem_parallel
+from .progress import ProgressReporter
+from .progress import DEFAULT_PROGRESS_INTERVAL
+from .pysixtrack_to_cobjects import pysix_particles_to_pset
+from .tracking import particles_to_bunch
+from .tracking import track_bunch_elem_by_elem
+
+def generate_elem_by_elem_data( output_path, line, particle_blocks,
+    num_particles, start_at_element=0, conf=dict() ):
+    # Tracks the particles from particle_blocks, an iterable over ( begin,
+    # end, particles ), through the line and writes the particle sets before
+    # every element plus the final set. The sets are generated and written
+    # for a chunk of elements at a time, so that only about
+    # elem_by_elem_chunk_size particles are held in particle sets. In between
+    # the chunks, the particles of more than one block are kept in columnar
+    # scratch files
+    num_belem = len( line )
+    assert num_belem > 0
+    assert num_particles > 0
+
+    NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
+    MAKE_DEMOTRACK = conf.get( "make_demotrack_data", False )
+    MAKE_DEMOTRACK &= st.Demotrack_enabled()
+    CHUNK_SIZE = conf.get( "elem_by_elem_chunk_size", DEFAULT_CHUNK_SIZE )
+    NUM_WORKERS = get_num_workers( conf )
+    PROGRESS_INTERVAL = conf.get( "progress_interval",
+                                  DEFAULT_PROGRESS_INTERVAL )
+    NUM_CHUNK_ELEMENTS = max( min( CHUNK_SIZE // num_particles, num_belem ), 1 )
+    num_snapshots = np.zeros( num_particles, dtype=np.int64 )
+
+    def track_block( block_begin, particles, begin_element, end_element,
+                     pset_buffer ):
+        active = [ ii for ii, in_p in enumerate( particles )
+                   if in_p.state == 1 ]
+        if len( active ) == 0:
+            return particles
+        active_p = [ particles[ ii ] for ii in active ]
+        active = np.array( active, dtype=np.int64 )
+        indices = block_begin + active
+
+        def write_snapshot( jj, bunch, bunch_index ):
+            pset = st.st_Particles.GET( pset_buffer, jj - begin_element )
+            assert pset.num_particles == num_particles
+            pysix_particles_to_pset( bunch, pset,
+                indices=indices[ bunch_index ], conf=conf )
+
+        if NUM_WORKERS > 1 and len( active_p ) > 1:
+            tracked = [ None ] * len( active_p )
+            for begin, end, ( snapshots, out_particles,
+                slice_num_snapshots ) in track_elem_by_elem_parallel(
+                    active_p, line, start_at_element=start_at_element,
+                    num_workers=NUM_WORKERS, max_slice_size=max(
+                        CHUNK_SIZE // ( end_element - begin_element ), 1 ),
+                    begin_element=begin_element, end_element=end_element ):
+                for jj, bunch, bunch_index in snapshots:
+                    write_snapshot( jj, bunch, begin + bunch_index )
+                tracked[ begin:end ] = out_particles
+                num_snapshots[ indices[ begin:end ] ] += slice_num_snapshots
+        else:
+            tracked, chunk_num_snapshots = track_bunch_elem_by_elem(
+                active_p, line, start_at_element=start_at_element,
+                snapshot_fn=write_snapshot, begin_element=begin_element,
+                end_element=end_element )
+            num_snapshots[ indices ] += chunk_num_snapshots
+        for ii, in_p in zip( active, tracked ):
+            particles[ ii ] = in_p
+        return particles
+
+    def load_blocks( blocks ):
+        for begin, end, particles in blocks:
+            if isinstance( particles, str ):
+                path = particles
+                particles = load_particles( path )
+                os.remove( path )
+            yield begin, end, particles
+
+    path_cobj = os.path.join(
+        output_path, "cobj_particles_elem_by_elem_pysixtrack.bin" )
+    path_demotrack = os.path.join(
+        output_path, "demotrack_elem_by_elem_pysixtrack.pickle" )
+    with contextlib.ExitStack() as stack:
+        tmp_path = stack.enter_context( tempfile.TemporaryDirectory(
+            prefix="elem_by_elem_", dir=output_path ) )
+        cobj_writer = stack.enter_context(
+            NormalisedCBufferWriter( path_cobj ) )
+        dt_writer = None
+        if MAKE_DEMOTRACK:
+            dt_writer = stack.enter_context( DemotrackStreamWriter(
+                path_demotrack, ( num_belem + 1 ) * num_particles ) )
+
+        def write_particle_sets( pset_buffer, first_set, is_final=False ):
+            path_chunk = os.path.join( tmp_path, "particle_sets.bin" )
+            if 0 != pset_buffer.tofile_normalised( path_chunk, NORM_ADDR ):
+                raise RuntimeError(
+                    "Unable to generate cobjects elem-by-elem data" )
+            cobj_writer.append_file( path_chunk )
+            if dt_writer is not None:
+                append_elem_by_elem_demotrack_data( dt_writer, pset_buffer,
+                    first_set, None if is_final else num_snapshots,
+                    chunk_size=CHUNK_SIZE )
+
+        print( f"****    Info :: tracking {num_particles} particles element " +
+               f"by element, {NUM_CHUNK_ELEMENTS} elements at a time" )
+        progress = ProgressReporter( num_belem, "elements", PROGRESS_INTERVAL )
+        blocks = particle_blocks
+        for begin_element in range( 0, num_belem, NUM_CHUNK_ELEMENTS ):
+            end_element = min( begin_element + NUM_CHUNK_ELEMENTS, num_belem )
+            pset_buffer = create_particle_set_cbuffer(
+                end_element - begin_element, num_particles, conf )
+            next_blocks = []
+            for begin, end, particles in blocks:
+                particles = track_block( begin, list( particles ),
+                    begin_element, end_element, pset_buffer )
+                if end - begin == num_particles:
+                    next_blocks.append( ( begin, end, particles ) )
+                else:
+                    path = os.path.join( tmp_path,
+                        f"block_{end_element}_{begin}.npz" )
+                    save_particles( path, particles )
+                    next_blocks.append( ( begin, end, path ) )
+            write_particle_sets( pset_buffer, begin_element )
+            del pset_buffer
+            blocks = load_blocks( next_blocks )
+            progress.update( end_element - begin_element )
+        progress.finish()
+
+        final_buffer = create_particle_set_cbuffer( 1, num_particles, conf )
+        final_pset = st.st_Particles.GET( final_buffer, 0 )
+        loss_tables = []
+        for begin, end, particles in blocks:
+            pysix_particles_to_pset( particles_to_bunch( particles ),
+                final_pset, begin=begin, conf=conf )
+            loss_tables.append( loss_table( particles ) )
+        write_particle_sets( final_buffer, num_belem, is_final=True )
+
+    write_loss_table( os.path.join( output_path,
+        LOSS_TABLE_FILE_NAMES[ "elem_by_elem" ] ),
+        concatenate_loss_tables( loss_tables ) )
+    print( "**** -> Generated cbuffer of particle elem-by-elem data:\r\n" +
+          f"****    {path_cobj}" )
+    if MAKE_DEMOTRACK:
+        print( "**** -> Generated demotrack particle elem-by-elem data:\r\n" +
+              f"****    {path_demotrack}" )
@@ -3,6 +3,7 @@
 
 import pickle
 import os
+import shutil
 import numpy as np
 
 # Tracking is done using pysixtrack
@@ -11,28 +12,130 @@ import pysixtrack as pysix
 # sixtracklib provides the CObject based beam elements and particle types
 import sixtracklib as st
 
-from .pysixtrack_to_cobjects import pysix_line_to_cbuffer
-from .pysixtrack_to_cobjects import calc_cbuffer_params_for_pysix_line
-from .demotrack import float_to_bytes
-from .cobjects import create_particle_set_cbuffer
-from .cobjects import create_single_particle_cbuffer
-
-from .pysixtrack_to_cobjects import pysix_particle_to_pset
-from .pysixtrack_to_cobjects import pysix_particle_to_single_particle
-
-def generate_lattice_data( input_path, output_path, conf=dict() ):
+from .pysixtrack_to_cobjects import pysix_line_to_new_cbuffer
+from .lattice import transform_line
+from .lattice import write_lattice_index_map
+from .demotrack import create_demotrack_memmap
+from .demotrack import write_demotrack_array
+from .demotrack import pset_to_demotrack
+from .cobjects import BUFFER_POOL
+
+from .elem_by_elem import generate_elem_by_elem_data
+from .pysixtrack_to_cobjects import pysix_particles_to_pset
+from .pysixtrack_to_cobjects import pysix_particles_to_columns
+
+from .tracking import DEFAULT_BATCHED_TRACKING
+from .tracking import particles_to_bunch
+from .tracking import track_bunch_until_turn
+from .tracking import track_particle_until_turn
+
+from .parallel import get_num_workers
+from .parallel import track_until_turn_parallel
+
+from .checkpoint import TrackingCheckpoint
+from .checkpoint import checkpoint_key
+from .checkpoint import track_until_turn_checkpointed
+from .checkpoint import track_until_turn_in_blocks
+from .checkpoint import until_turn_milestones
+
+from .columnar import save_line
+from .columnar import save_particles
+from .columnar import load_line
+from .columnar import load_elements
+from .columnar import load_particles
+from .columnar import ParticleBlockReader
+
+from .losses import loss_table
+from .losses import concatenate_loss_tables
+from .losses import write_loss_table
+from .losses import write_loss_map
+from .losses import LOSS_TABLE_FILE_NAMES
+from .progress import ProgressReporter
+from .progress import DEFAULT_PROGRESS_INTERVAL
+
+from .cache import RegenerationCache
+from .cache import package_versions
+from .scenario import ScenarioContext
+
+class PySixTrackScenario( ScenarioContext ):
+    @property
+    def input_line( self ):
+        return self.compacted_line( self.get( "input_line",
+            lambda: self._load_data( os.path.join( self.input_path,
+                "pysixtrack_line.pickle" ), load_line ),
+            "read pysixtrack line" ) )
+
+    @property
+    def input_particles_path( self ):
+        # None if there is no input directory, e.g. for injected particles
+        if self.input_path is None:
+            return None
+        return self.data_path( os.path.join( self.input_path,
+            "pysixtrack_initial_particles.pickle" ) )
+
+    def _input_particles_reader( self ):
+        # Columnar input which has not been read yet
+        if self.has( "input_particles" ):
+            return None
+        path = self.input_particles_path
+        if path is None or not path.endswith( ".npz" ):
+            return None
+        return ParticleBlockReader( path )
+
+    @property
+    def raw_input_particles( self ):
+        # Not copied -> must not be modified
+        return self.get( "input_particles", lambda: self._load_data(
+            os.path.join( self.input_path,
+                          "pysixtrack_initial_particles.pickle" ),
+            load_particles ), "read pysixtrack particles" )
+
+    @property
+    def input_particles( self ):
+        return [ in_p.copy() for in_p in self.raw_input_particles ]
+
+    @property
+    def num_input_particles( self ):
+        reader = self._input_particles_reader()
+        if reader is not None:
+            return reader.num_particles
+        return len( self.raw_input_particles )
+
+    @property
+    def input_bunch( self ):
+        # Fresh array-valued copy of the input particles. A columnar input is
+        # read without creating a pysix.Particles instance per particle
+        reader = self._input_particles_reader()
+        if reader is not None:
+            with self.timer( "read pysixtrack particles" ):
+                return reader.bunch( 0, reader.num_particles )
+        return particles_to_bunch( self.raw_input_particles )
+
+    @property
+    def tracking_line( self ):
+        return self.get( "tracking_line", lambda: self._load_data(
+            os.path.join( self.output_path, "pysixtrack_lattice.pickle" ),
+            load_elements ), "read pysixtrack lattice" )
+
+    @tracking_line.setter
+    def tracking_line( self, elements ):
+        self.set( "tracking_line", elements )
+
+def generate_lattice_data( input_path, output_path, conf=dict(), ctx=None ):
     print( "**** Generating Lattice Data From pysixtrack Input:" )
     print( "**** -> Reading sixtrack input data from:\r\n" +
           f"****    {input_path}" )
     slot_size = st.CBufferView.DEFAULT_SLOT_SIZE
-    path_in_line = os.path.join( input_path, "pysixtrack_line.pickle" )
-    with open( path_in_line, "rb" ) as f_in:
-        line = pickle.load( f_in )
-
-    n_slots, n_objs, n_ptrs = calc_cbuffer_params_for_pysix_line(
-            line, slot_size=slot_size, conf=conf )
-    cbuffer = st.CBuffer( n_slots, n_objs, n_ptrs, 0, slot_size )
-    pysix_line_to_cbuffer( line, cbuffer )
+    if ctx is None:
+        ctx = PySixTrackScenario( input_path, output_path, conf )
+    line = ctx.input_line
+    plan = params = None
+    if conf.get( "lattice_transform", None ):
+        line, plan, params = transform_line( line,
+            conf[ "lattice_transform" ], slot_size=slot_size, conf=conf )
+
+    cbuffer = pysix_line_to_new_cbuffer( line, slot_size=slot_size, conf=conf,
+                                         plan=plan, params=params )
     path_to_lattice = os.path.join( output_path, "cobj_lattice.bin" )
 
     if  0 == cbuffer.tofile_normalised( path_to_lattice,
@@ -42,6 +145,9 @@ def generate_lattice_data( input_path, output_path, conf=dict() ):
     else:
         raise RuntimeError( "Problem during creation of lattice data" )
 
+    if ctx.lattice_index_map is not None:
+        write_lattice_index_map( output_path, ctx.lattice_index_map )
+
     if conf.get( 'always_use_drift_exact', False ):
         for ii in range( 0, len( line.elements ) ):
             if isinstance( line.elements[ ii ], pysix.elements.Drift ) and \
@@ -55,15 +161,23 @@ def generate_lattice_data( input_path, output_path, conf=dict() ):
             assert not isinstance( elem, pysix.elements.Drift ) or \
                    isinstance( elem, pysix.elements.DriftExact )
 
-    path_to_pysix_lattice = os.path.join( output_path, "pysixtrack_lattice.pickle" )
+    path_to_pysix_lattice = os.path.join( output_path, "pysixtrack_lattice.npz" )
 
     try:
-        pickle.dump( line.elements, open( path_to_pysix_lattice, "wb" ) )
-        print( "**** -> Generated pysixtrack lattice as python pickle:\r\n" +
+        save_line( path_to_pysix_lattice, line.elements )
+        print( "**** -> Generated pysixtrack lattice in columnar format:\r\n" +
               f"****    {path_to_pysix_lattice}" )
+        if conf.get( "write_legacy_pickles", True ):
+            path_to_pysix_lattice = os.path.join(
+                output_path, "pysixtrack_lattice.pickle" )
+            with open( path_to_pysix_lattice, "wb" ) as f_out:
+                pickle.dump( line.elements, f_out )
+            print( "**** -> Generated pysixtrack lattice as python pickle:\r\n" +
+                  f"****    {path_to_pysix_lattice}" )
     except:
         raise RuntimeError(
             "Unable to generate pysixtrack lattice data" )
+    ctx.tracking_line = line.elements
 
     if conf.get( 'make_demotrack_data', False ) and \
         st.Demotrack_enabled() and st.Demotrack_belems_can_convert( cbuffer ):
@@ -73,44 +187,60 @@ def generate_lattice_data( input_path, output_path, conf=dict() ):
             cbuffer.num_objects:
             path_dt_lattice = os.path.join( output_path, "demotrack_lattice.bin" )
             with open( path_dt_lattice, "wb" ) as fp_out:
-                fp_out.write( float_to_bytes( len( dt_lattice ) ) )
-                fp_out.write( dt_lattice.tobytes() )
+                write_demotrack_array( fp_out, dt_lattice )
                 print( "**** -> Generated demotrack lattice as flat array:\r\n" +
                       f"****    {path_dt_lattice}" )
     return
 
-def generate_particle_data_initial( input_path, output_path, conf=dict() ):
-    path_in_particles = os.path.join(
-        input_path, "pysixtrack_initial_particles.pickle" )
-    with open( path_in_particles, "rb" ) as f_in:
-        initial_p_pysix = pickle.load( f_in )
-        print( "**** -> Read input data from:\r\n" +
-               f"****    {path_in_particles}" )
+def generate_particle_data_initial( input_path, output_path, conf=dict(),
+    ctx=None ):
+    if ctx is None:
+        ctx = PySixTrackScenario( input_path, output_path, conf )
+    start_at_element  = 0
+
+    # The particles are converted from their columns in a single pass. If the
+    # input particles already start at start_at_element, turn 0, with state
+    # 1 and consecutive ids, the pysixtrack output is the input file itself
+    bunch = ctx.input_bunch
+    num_part = len( bunch.x )
+    is_unchanged = bool( np.all( bunch.elemid == start_at_element ) and
+        np.all( bunch.turn == 0 ) and np.all( bunch.state == 1 ) and
+        np.array_equal( bunch.partid, np.arange( num_part ) ) )
+    if not is_unchanged:
+        bunch.elemid[:] = start_at_element
+        bunch.turn[:] = 0
+        bunch.state[:] = 1
+        bunch.partid[:] = np.arange( num_part )
+
+    def initial_particle_list():
+        # Only needed for the pickle and for distributions small enough to
+        # be kept in memory
+        if is_unchanged:
+            return ctx.raw_input_particles
+        initial_p_pysix = ctx.input_particles
+        for jj, in_p in enumerate( initial_p_pysix ):
+            assert isinstance( in_p, pysix.Particles )
+            in_p.elemid = start_at_element
+            in_p.turn = 0
+            in_p.state = 1
+            in_p.partid = jj
+        return initial_p_pysix
 
-    num_part = len( initial_p_pysix )
     NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
     MAKE_DEMOTRACK = conf.get( "make_demotrack_data", False )
     MAKE_DEMOTRACK &= st.Demotrack_enabled()
-    init_particle_idx = 0
-    start_at_element  = 0
-
-    initial_p_buffer = create_single_particle_cbuffer( 1, num_part, conf )
-    initial_pset_buffer = create_particle_set_cbuffer( 1, num_part, conf )
-    path_initial_pset = os.path.join( output_path, "cobj_initial_particles.bin" )
 
-    for jj, in_p in enumerate( initial_p_pysix ):
-        assert jj < num_part
-        assert isinstance( in_p, pysix.Particles )
-        in_p.elemid = start_at_element
-        in_p.turn = 0
-        in_p.state = 1
-        in_p.partid = jj
+    initial_p_buffer = BUFFER_POOL.single_particle_buffer( 1, num_part, conf )
+    initial_pset_buffer = BUFFER_POOL.particle_set_buffer( 1, num_part, conf )
 
-        p = st.st_SingleParticle.GET( initial_p_buffer, jj )
-        pysix_particle_to_single_particle( in_p, p )
-
-        pset = st.st_Particles.GET( initial_pset_buffer, 0 )
-        pysix_particle_to_pset( in_p, pset, jj )
+    pset = st.st_Particles.GET( initial_pset_buffer, 0 )
+    columns = pysix_particles_to_columns( bunch, num_part )
+    BLOCK_SIZE = ctx.particle_block_size
+    for begin in range( 0, num_part, BLOCK_SIZE ):
+        end = min( begin + BLOCK_SIZE, num_part )
+        pysix_particles_to_pset(
+            { key: column[ begin:end ] for key, column in columns.items() },
+            pset, begin=begin, single_particle_buffer=initial_p_buffer )
 
     path_init_pset = os.path.join( output_path, "cobj_initial_particles.bin" )
     if  0 == initial_pset_buffer.tofile_normalised( path_init_pset, NORM_ADDR ):
@@ -126,247 +256,227 @@ def generate_particle_data_initial( input_path, output_path, conf=dict() ):
     else:
         raise RuntimeError( "Unable to generate initial single particle set data" )
 
+    path_input_pysix = ctx.input_particles_path
     path_init_pysix = os.path.join(
-        output_path, "pysixtrack_initial_particles.pickle" )
-
-    with open( path_init_pysix, "wb" ) as f_out:
-        pickle.dump( initial_p_pysix, f_out )
+        output_path, "pysixtrack_initial_particles.npz" )
+    # Injected or generated inputs ( see from_synthetic ) have no input file
+    # to copy
+    copy_input = is_unchanged and path_input_pysix is not None
+    if copy_input and path_input_pysix.endswith( ".npz" ):
+        shutil.copyfile( path_input_pysix, path_init_pysix )
+    else:
+        save_particles( path_init_pysix, bunch )
+    print( "**** -> Generated initial pysixtrack particle data at:\r\n" +
+           f"****    {path_init_pysix}" )
+
+    if conf.get( "write_legacy_pickles", True ):
+        path_init_pysix = os.path.join(
+            output_path, "pysixtrack_initial_particles.pickle" )
+        if copy_input and path_input_pysix.endswith( ".pickle" ):
+            shutil.copyfile( path_input_pysix, path_init_pysix )
+        else:
+            with open( path_init_pysix, "wb" ) as f_out:
+                pickle.dump( initial_particle_list(), f_out )
         print( "**** -> Generated initial pysixtrack particle data at:\r\n" +
                f"****    {path_init_pysix}" )
+    if num_part <= ctx.particle_block_size:
+        ctx.initial_particles = initial_particle_list()
 
     if MAKE_DEMOTRACK:
-        dt_particles_buffer = st.st_DemotrackParticle.CREATE_ARRAY( num_part, True )
-        assert isinstance( dt_particles_buffer, np.ndarray )
+        path_init_dt = os.path.join(
+            output_path, "demotrack_initial_particles.pickle" )
+        dt_particles_buffer = create_demotrack_memmap( path_init_dt, num_part )
         assert len( dt_particles_buffer ) == num_part
         pset = st.st_Particles.GET( initial_pset_buffer, 0 )
         assert pset.num_particles == num_part
-        dt_p = st.st_DemotrackParticle()
-        for ii in range( 0, num_part ):
-            dt_p.from_cobjects( pset, ii )
-            dt_p.to_array( dt_particles_buffer, ii )
-            dt_p.clear()
-        path_init_dt = os.path.join(
-            output_path, "demotrack_initial_particles.pickle" )
-        with open( path_init_dt, "wb" ) as f_out:
-            f_out.write( float_to_bytes( num_part ) )
-            f_out.write( dt_particles_buffer.tobytes() )
-            print( "**** -> Generated initial demotrack particle data at:\r\n" +
-                  f"****    {path_init_dt}" )
+        pset_to_demotrack( pset, dt_particles_buffer )
+        if isinstance( dt_particles_buffer, np.memmap ):
+            dt_particles_buffer.flush()
+        del dt_particles_buffer
+        print( "**** -> Generated initial demotrack particle data at:\r\n" +
+              f"****    {path_init_dt}" )
+    BUFFER_POOL.release( initial_pset_buffer )
+    BUFFER_POOL.release( initial_p_buffer )
     return
 
-def generate_particle_data_elem_by_elem( input_path, output_path, conf=dict() ):
-    path_in_particles = os.path.join(
-        output_path, "pysixtrack_initial_particles.pickle" )
-    with open( path_in_particles, "rb" ) as f_in:
-        initial_p_pysix = pickle.load( f_in )
-        print( "**** -> Read input data from:\r\n" +
-               f"****    {path_in_particles}" )
-
-    path_in_line = os.path.join( output_path, "pysixtrack_lattice.pickle" )
-    with open( path_in_line, "rb" ) as f_in:
-        line = pickle.load( f_in )
-
-    num_belem = len( line )
-    num_part = len( initial_p_pysix )
+def generate_particle_data_elem_by_elem( input_path, output_path, conf=dict(),
+    ctx=None ):
+    if ctx is None:
+        ctx = PySixTrackScenario( input_path, output_path, conf )
+    line = ctx.tracking_line
     start_at_element = 0
 
-    NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
-    MAKE_DEMOTRACK = conf.get( "make_demotrack_data", False )
-    MAKE_DEMOTRACK &= st.Demotrack_enabled()
-
-    pset_buffer = create_particle_set_cbuffer(
-        num_belem + 1, num_part, conf )
-    assert pset_buffer.num_objects == num_belem + 1
-
-    if MAKE_DEMOTRACK:
-        dt_p = st.st_DemotrackParticle()
-        dt_pset_buffer = st.st_DemotrackParticle.CREATE_ARRAY(
-            ( num_belem + 1 ) * num_part, True )
-        assert isinstance( dt_pset_buffer, np.ndarray )
-        assert len( dt_pset_buffer ) <= ( num_belem + 1 ) * num_part
-
-    for ii, in_p in enumerate( initial_p_pysix ):
-        assert isinstance( in_p, pysix.Particles )
-        assert in_p.elemid == start_at_element
-        assert in_p.partid == ii
-        assert in_p.turn == 0
-        assert in_p.state == 1
-
-        print( f"****    Info :: particle {ii:6d}/{num_part - 1:6d}" )
-        for jj, elem in enumerate( line ):
-            pset = st.st_Particles.GET( pset_buffer, jj )
-            assert pset.num_particles == num_part
-            assert in_p.elemid == jj
-            assert in_p.partid == ii
-            assert in_p.turn == 0
-            assert in_p.state == 1
-            if conf.get( 'always_use_drift_exact', False ):
-                assert not isinstance( elem, pysix.elements.Drift ) or \
-                       isinstance( elem, pysix.elements.DriftExact )
-            pysix_particle_to_pset( in_p, pset, ii, conf=conf )
-            if MAKE_DEMOTRACK:
-                dt_p.clear()
-                dt_p.from_cobjects( pset, ii )
-                kk = jj * num_part + ii
-                assert kk < len( dt_pset_buffer )
-                dt_p.to_array( dt_pset_buffer, kk )
-            if in_p.state == 1:
-                elem.track( in_p )
-
-            if isinstance( elem, pysix.elements.Drift ) and \
-                in_p.state == 1 and \
-                ( in_p.x > 1.0 or in_p.x < -1.0 or
-                  in_p.y > 1.0 or in_p.y < -1.0 ):
-                in_p.state = 0
-
-            if in_p.state == 1:
-                in_p.elemid += 1
-            else:
-                print( f"lost particle {in_p.partid} at pos {in_p.elemid} : {in_p}" )
-                print( f"lost particle {in_p.partid} at elem: {elem}" )
-                break
-        if in_p.state == 1:
-            in_p.turn += 1
-            in_p.elemid = start_at_element
-        else:
-            print( f"lost particle {ii} at pos {in_p.elemid}: {in_p}" )
-        pset = st.st_Particles.GET( pset_buffer, num_belem )
-        assert pset.num_particles == num_part
-        pysix_particle_to_pset( in_p, pset, ii, conf=conf )
-        if MAKE_DEMOTRACK:
-            dt_p.clear()
-            dt_p.from_cobjects( pset, ii )
-            kk = num_belem * num_part + ii
-            assert len( dt_pset_buffer ) > kk
-            dt_p.to_array( dt_pset_buffer, kk )
-
-    path_elem_by_elem = os.path.join(
-        output_path, "cobj_particles_elem_by_elem_pysixtrack.bin" )
-    if 0 == pset_buffer.tofile_normalised( path_elem_by_elem, NORM_ADDR ):
-        print( "**** -> Generated cbuffer of particle elem-by-elem data:\r\n" +
-              f"****    {path_elem_by_elem}" )
-    else:
-        raise RuntimeError(
-            "Unable to generate cobjects elem-by-elem data" )
+    if conf.get( 'always_use_drift_exact', False ):
+        for elem in line:
+            assert not isinstance( elem, pysix.elements.Drift ) or \
+                   isinstance( elem, pysix.elements.DriftExact )
 
-    if MAKE_DEMOTRACK:
-        path_elem_by_elem = os.path.join(
-            output_path, "demotrack_elem_by_elem_pysixtrack.pickle" )
-        with open( path_elem_by_elem, "wb" ) as f_out:
-            f_out.write( float_to_bytes( len( dt_pset_buffer ) ) )
-            f_out.write( dt_pset_buffer.tobytes() )
-            print( "**** -> Generated demotrack particle elem-by-elem data:\r\n" +
-                  f"****    {path_elem_by_elem}" )
+    def initial_particle_blocks():
+        for begin, end, initial_p_pysix in ctx.initial_particle_blocks():
+            for ii, in_p in enumerate( initial_p_pysix ):
+                assert isinstance( in_p, pysix.Particles )
+                assert in_p.elemid == start_at_element
+                assert in_p.partid == begin + ii
+                assert in_p.turn == 0
+                assert in_p.state == 1
+            yield begin, end, initial_p_pysix
+
+    generate_elem_by_elem_data( output_path, line, initial_particle_blocks(),
+        ctx.num_initial_particles, start_at_element=start_at_element,
+        conf=conf )
     return
 
-def generate_particle_data_until_turn( input_path, output_path, until_turn, conf=dict() ):
-    path_in_particles = os.path.join(
-        output_path, "pysixtrack_initial_particles.pickle" )
-    with open( path_in_particles, "rb" ) as f_in:
-        initial_p_pysix = pickle.load( f_in )
-        print( "**** -> Read input data from:\r\n" +
-               f"****    {path_in_particles}" )
-
-    path_in_line = os.path.join( output_path, "pysixtrack_lattice.pickle" )
-    with open( path_in_line, "rb" ) as f_in:
-        line = pickle.load( f_in )
+def generate_particle_data_until_turn( input_path, output_path, until_turn,
+    conf=dict(), ctx=None ):
+    if ctx is None:
+        ctx = PySixTrackScenario( input_path, output_path, conf )
+    line = ctx.tracking_line
 
-    num_belem = len( line )
-    num_part = len( initial_p_pysix )
+    num_part = ctx.num_initial_particles
     start_at_element = 0
 
     NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
     MAKE_DEMOTRACK = conf.get( "make_demotrack_data", False )
     MAKE_DEMOTRACK &= st.Demotrack_enabled()
 
-    pset_buffer = create_particle_set_cbuffer( 1, num_part, conf )
+    pset_buffer = BUFFER_POOL.particle_set_buffer( 1, num_part, conf )
     assert pset_buffer.num_objects == 1
     pset = st.st_Particles.GET( pset_buffer, 0 )
     assert pset.num_particles == num_part
 
-    if MAKE_DEMOTRACK:
-        dt_p = st.st_DemotrackParticle()
-        dt_pset_buffer = st.st_DemotrackParticle.CREATE_ARRAY( num_part, True )
-        assert isinstance( dt_pset_buffer, np.ndarray )
-        assert len( dt_pset_buffer ) <= num_part
-
-    for ii, in_p in enumerate( initial_p_pysix ):
-        assert isinstance( in_p, pysix.Particles )
-        assert in_p.elemid == start_at_element
-        assert in_p.partid == ii
-        assert in_p.state == 1
-        assert in_p.turn == 0
-        print( f"****    Info :: particle {ii:6d}/{num_part - 1:6d}" )
-        start_at_turn = in_p.turn
-        if start_at_turn < until_turn:
-            for jj in range( start_at_turn, until_turn ):
-                for kk, elem in enumerate( line ):
-                    if conf.get( 'always_use_drift_exact', False ):
-                        assert not isinstance( elem, pysix.elements.Drift ) or \
-                            isinstance( elem, pysix.elements.DriftExact )
-                    if in_p.state == 1:
-                        elem.track( in_p )
-                    if isinstance( elem, pysix.elements.Drift ) and \
-                        in_p.state == 1 and \
-                        ( in_p.x > 1.0 or in_p.x < -1.0 or
-                          in_p.y > 1.0 or in_p.y < -1.0 ):
-                        in_p.state = 0
-
-                    if in_p.state == 1:
-                        in_p.elemid += 1
-                    else:
-                        print( f"lost particle {ii} at pos {jj} : {in_p}" )
-                        print( f"lost particle at elem: {elem}" )
-                        break
-                if in_p.state == 1:
-                    in_p.turn += 1
-                    in_p.elemid = start_at_element
-                else:
-                    break
-        if in_p.state != 1:
-            print( f"lost particle {in_p.partid} at pos {in_p.elem} / turn  {in_p.turn}: {in_p}" )
-        pysix_particle_to_pset( in_p, pset, ii, )
-        if MAKE_DEMOTRACK:
-            dt_p.clear()
-            dt_p.from_cobjects( pset, ii )
-            dt_p.to_array( dt_pset_buffer, ii )
+    def initial_particle_blocks():
+        for begin, end, initial_p_pysix in ctx.initial_particle_blocks():
+            for ii, in_p in enumerate( initial_p_pysix ):
+                assert isinstance( in_p, pysix.Particles )
+                assert in_p.elemid == start_at_element
+                assert in_p.partid == begin + ii
+                assert in_p.state == 1
+                assert in_p.turn == 0
+            yield begin, end, initial_p_pysix
 
-    path_pset_out = os.path.join(
-        output_path, f"cobj_particles_until_turn_{until_turn}.bin" )
+    if conf.get( 'always_use_drift_exact', False ):
+        for elem in line:
+            assert not isinstance( elem, pysix.elements.Drift ) or \
+                isinstance( elem, pysix.elements.DriftExact )
+
+    NUM_WORKERS = get_num_workers( conf )
+    BATCHED = conf.get( 'batched_tracking', DEFAULT_BATCHED_TRACKING )
+    PROGRESS_INTERVAL = conf.get( "progress_interval",
+                                  DEFAULT_PROGRESS_INTERVAL )
+    def track_fn( particles, until_turn ):
+        if NUM_WORKERS > 1 and len( particles ) > 1:
+            return track_until_turn_parallel( particles, line, until_turn,
+                start_at_element=start_at_element, num_workers=NUM_WORKERS,
+                batched=BATCHED )
+        elif BATCHED:
+            print( f"****    Info :: tracking {len( particles )} particles " +
+                    "as bunch" )
+            return track_bunch_until_turn( particles, line, until_turn,
+                start_at_element=start_at_element )
+        progress = ProgressReporter( len( particles ), "particles",
+                                     PROGRESS_INTERVAL )
+        for ii, in_p in enumerate( particles ):
+            assert isinstance( in_p, pysix.Particles )
+            track_particle_until_turn( in_p, line, until_turn,
+                start_at_element=start_at_element )
+            progress.update()
+        progress.finish()
+        return particles
+
+    def write_milestone_files( turn ):
+        path_pset_out = os.path.join(
+            output_path, f"cobj_particles_until_turn_{turn}.bin" )
 
-    if 0 == pset_buffer.tofile_normalised( path_pset_out, NORM_ADDR ):
-        print( "**** -> Generated cbuffer of tracked particle data:\r\n" +
-              f"****    {path_pset_out}" )
-    else:
-        raise ValueError(
-            f"Error during tracking particles until turn {until_turn}" )
+        if 0 == pset_buffer.tofile_normalised( path_pset_out, NORM_ADDR ):
+            print( "**** -> Generated cbuffer of tracked particle data:\r\n" +
+                  f"****    {path_pset_out}" )
+        else:
+            raise ValueError(
+                f"Error during tracking particles until turn {turn}" )
 
-    if MAKE_DEMOTRACK:
-        path_pset_out = os.path.join(
-            output_path, f"demotrack_particles_until_turn_{until_turn}.bin" )
-        with open( path_pset_out, "wb" ) as f_out:
-            f_out.write( float_to_bytes( len( dt_pset_buffer ) ) )
-            f_out.write( dt_pset_buffer.tobytes() )
+        if MAKE_DEMOTRACK:
+            path_pset_out = os.path.join(
+                output_path, f"demotrack_particles_until_turn_{turn}.bin" )
+            dt_pset_buffer = create_demotrack_memmap( path_pset_out, num_part )
+            pset_to_demotrack( pset, dt_pset_buffer )
+            if isinstance( dt_pset_buffer, np.memmap ):
+                dt_pset_buffer.flush()
+            del dt_pset_buffer
             print( "**** -> Generated demotrack data of tracked particles:\r\n" +
                    f"****    {path_pset_out}" )
+
+    def milestone_written( turn ):
+        paths = [ os.path.join( output_path,
+                                f"cobj_particles_until_turn_{turn}.bin" ) ]
+        if MAKE_DEMOTRACK:
+            paths.append( os.path.join( output_path,
+                f"demotrack_particles_until_turn_{turn}.bin" ) )
+        return all( os.path.isfile( path ) for path in paths )
+
+    CHECKPOINT_INTERVAL = conf.get( "until_turn_checkpoint_interval", 0 )
+    RESUME = conf.get( "use_regeneration_cache", True )
+    if num_part <= ctx.particle_block_size:
+        initial_p_pysix = [ in_p for _, _, block in initial_particle_blocks()
+                            for in_p in block ]
+        checkpoint = TrackingCheckpoint( output_path,
+            checkpoint_key( initial_p_pysix, line, package_versions() ),
+            interval=CHECKPOINT_INTERVAL, resume=RESUME )
+        def write_milestone( turn, particles ):
+            pysix_particles_to_pset(
+                particles_to_bunch( list( particles ) ), pset )
+            write_milestone_files( turn )
+        tracked_p_pysix = track_until_turn_checkpointed( initial_p_pysix,
+            until_turn, track_fn, checkpoint=checkpoint,
+            milestone_fn=write_milestone, milestone_written=milestone_written,
+            progress_interval=PROGRESS_INTERVAL )
+        losses = loss_table( tracked_p_pysix )
+    else:
+        # Larger distributions are tracked block by block from milestone to
+        # milestone; the checkpoint keeps the state of each block
+        checkpoint = TrackingCheckpoint( output_path, checkpoint_key(
+            ( in_p for _, _, block in initial_particle_blocks()
+              for in_p in block ), line, package_versions() ),
+            interval=CHECKPOINT_INTERVAL, resume=RESUME )
+        final_turn = until_turn_milestones( until_turn )[ -1 ]
+        loss_tables = []
+        def write_block( turn, begin, end, particles ):
+            pysix_particles_to_pset(
+                particles_to_bunch( list( particles ) ), pset, begin=begin )
+            if turn == final_turn:
+                loss_tables.append( loss_table( particles ) )
+        track_until_turn_in_blocks( initial_particle_blocks(), until_turn,
+            track_fn, write_block, milestone_fn=write_milestone_files,
+            checkpoint=checkpoint, milestone_written=milestone_written,
+            scratch_path=output_path, progress_interval=PROGRESS_INTERVAL )
+        losses = concatenate_loss_tables( loss_tables )
+    write_loss_table( os.path.join( output_path,
+        LOSS_TABLE_FILE_NAMES[ "until_turn" ] ), losses )
+    BUFFER_POOL.release( pset_buffer )
     return
 
-def generate_particle_data( input_path, output_path, conf=dict() ):
+def generate_particle_data( input_path, output_path, conf=dict(), cache=None,
+    ctx=None ):
     print( "**** Generating Particles Data From SixTrack Input:" )
-    path_in_particles = os.path.join(
-        input_path, "pysixtrack_initial_particles.pickle" )
-    with open( path_in_particles, "rb" ) as f_in:
-        initial_p_pysix = pickle.load( f_in )
-        print( "**** -> Read input data from:\r\n" +
-               f"****    {path_in_particles}" )
-
-    path_in_line = os.path.join( input_path, "pysixtrack_line.pickle" )
-    with open( path_in_line, "rb" ) as f_in:
-        line = pickle.load( f_in )
-
-    num_belem = len( line )
-    num_part = len( initial_p_pysix )
-    start_at_element = 0
+    stages = [ "initial_particles" ]
+    if conf.get( "make_elem_by_elem_data", False ):
+        stages.append( "elem_by_elem" )
+    if conf.get( "make_until_num_turn_data", False ) and \
+        len( until_turn_milestones( conf.get( "until_num_turns", 1 ) ) ) > 0:
+        stages.append( "until_turn" )
+
+    pending = [ stage for stage in stages
+                if cache is None or not cache.is_up_to_date( stage ) ]
+    for stage in stages:
+        if not stage in pending:
+            print( f"**** -> Skipping {stage} stage, outputs are up to date" )
+    if len( pending ) == 0:
+        return
+
+    if ctx is None:
+        ctx = PySixTrackScenario( input_path, output_path, conf )
+    # The tracked lattice, i.e. after a lattice transform
+    num_belem = len( ctx.tracking_line )
+    num_part = ctx.num_input_particles
 
     print( f"****    Info :: num beam elements      : {num_belem}" )
     print( f"****    Info :: num particles          : {num_part}" )
@@ -377,28 +487,46 @@ def generate_particle_data( input_path, output_path, conf=dict() ):
     # Get initial particle distribution:
 
     # Generate the initial particle disitribution buffers
-    print( "**** -> Generating initial particle distributions ..." )
-    generate_particle_data_initial( input_path, output_path, conf=conf )
+    if "initial_particles" in pending:
+        print( "**** -> Generating initial particle distributions ..." )
+        with ctx.stage( "initial_particles", num_particles=num_part ):
+            generate_particle_data_initial(
+                input_path, output_path, conf=conf, ctx=ctx )
+        if cache is not None:
+            cache.update( "initial_particles" )
 
     # =========================================================================
     # Make elem-by-elem data using pysixtrack:
 
-    if conf.get( "make_elem_by_elem_data", False ):
+    if "elem_by_elem" in pending:
         print( "**** -> Generating elem-by-elem particle data using pysixtrack ..." )
-        generate_particle_data_elem_by_elem( input_path, output_path, conf=conf )
+        with ctx.stage( "elem_by_elem", num_particles=num_part,
+                        num_elements=num_belem, num_turns=1 ):
+            generate_particle_data_elem_by_elem(
+                input_path, output_path, conf=conf, ctx=ctx )
+        if cache is not None:
+            cache.update( "elem_by_elem" )
 
     # =========================================================================
     # Make until turn data using pysixtrack:
 
-    if conf.get( "make_until_num_turn_data", False ) and \
-        conf.get( "until_num_turns", 1 ) > 0:
+    if "until_turn" in pending:
         print( "**** -> Generating until_turn tracked data using pysixtrack ..." )
         until_turn = conf.get( "until_num_turns", 1 )
-        generate_particle_data_until_turn(
-            input_path, output_path, until_turn, conf=conf )
+        with ctx.stage( "until_turn", num_particles=num_part,
+                        num_elements=num_belem,
+                        num_turns=max( until_turn_milestones( until_turn ) ) ):
+            generate_particle_data_until_turn(
+                input_path, output_path, until_turn, conf=conf, ctx=ctx )
+        if cache is not None:
+            cache.update( "until_turn" )
 
+    if "elem_by_elem" in pending or "until_turn" in pending:
+        write_loss_map( output_path, num_belem, stages )
 
-def generate_data( scenario_name, input_path, output_path, conf=dict() ):
+
+def generate_data( scenario_name, input_path, output_path, conf=dict(),
+    ctx=None ):
     assert scenario_name and len( scenario_name ) > 0
     print( "============================================================" +
            "============================================================" +
@@ -406,7 +534,7 @@ def generate_data( scenario_name, input_path, output_path, conf=dict() ):
     print(  "****" )
     print( f"****       Scenario : {scenario_name}" )
     print(  "****" )
-    print( f"****         Source : pysixtrack" )
+    print( f"****         Source : {conf.get( 'source', 'pysixtrack' )}" )
     print( f"****      Input Dir : {input_path}" )
     print( f"****     Output Dir : {output_path}" )
     print(  "****" )
@@ -414,13 +542,25 @@ def generate_data( scenario_name, input_path, output_path, conf=dict() ):
             "------------------------------------------------------------" +
             "------------------------------" )
     print(  "**** " )
-    generate_lattice_data( input_path, output_path, conf=conf )
+    if ctx is None:
+        ctx = PySixTrackScenario( input_path, output_path, conf )
+    cache = RegenerationCache( input_path, output_path, conf=conf )
+    if cache.is_up_to_date( "lattice" ):
+        print( "**** -> Skipping lattice stage, outputs are up to date" )
+    else:
+        with ctx.stage( "lattice" ):
+            generate_lattice_data( input_path, output_path, conf=conf, ctx=ctx )
+        cache.update( "lattice" )
     print(  "**** " )
     print(  "------------------------------------------------------------" +
             "------------------------------------------------------------" +
             "------------------------------" )
     print(  "**** " )
-    generate_particle_data( input_path, output_path, conf=conf )
+    generate_particle_data(
+        input_path, output_path, conf=conf, cache=cache, ctx=ctx )
+    print(  "**** " )
+    ctx.print_timings()
+    ctx.write_report( scenario_name )
     print(  "**** " )
     print(  "**** " )
 
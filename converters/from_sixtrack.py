@@ -14,27 +14,103 @@ import pysixtrack as pysix
 # sixtracklib provides the CObject based beam elements and particle types
 import sixtracklib as st
 
-from .pysixtrack_to_cobjects import pysix_line_to_cbuffer
-from .pysixtrack_to_cobjects import calc_cbuffer_params_for_pysix_line
-from .demotrack import float_to_bytes
-from .cobjects import create_particle_set_cbuffer
-from .cobjects import create_single_particle_cbuffer
-
-from .pysixtrack_to_cobjects import pysix_particle_to_pset
-from .pysixtrack_to_cobjects import pysix_particle_to_single_particle
-
-def generate_lattice_data( input_path, output_path, conf=dict() ):
+from .pysixtrack_to_cobjects import pysix_line_to_new_cbuffer
+from .lattice import transform_line
+from .lattice import write_lattice_index_map
+from .demotrack import create_demotrack_memmap
+from .demotrack import write_demotrack_array
+from .demotrack import pset_to_demotrack
+from .cobjects import BUFFER_POOL
+
+from .elem_by_elem import generate_elem_by_elem_data
+from .pysixtrack_to_cobjects import pysix_particles_to_pset
+
+from .sixdump import SixDump101Reader
+
+from .tracking import DEFAULT_BATCHED_TRACKING
+from .tracking import bunch_to_particle
+from .tracking import particles_to_bunch
+from .tracking import track_bunch_until_turn
+from .tracking import track_particle_until_turn
+
+from .parallel import get_num_workers
+from .parallel import track_until_turn_parallel
+
+from .checkpoint import TrackingCheckpoint
+from .checkpoint import checkpoint_key
+from .checkpoint import track_until_turn_checkpointed
+from .checkpoint import until_turn_milestones
+from .checkpoint import track_until_turn_in_blocks
+
+from .columnar import save_line
+from .columnar import save_particles
+
+from .losses import loss_table
+from .losses import concatenate_loss_tables
+from .losses import write_loss_table
+from .losses import write_loss_map
+from .losses import LOSS_TABLE_FILE_NAMES
+from .progress import ProgressReporter
+from .progress import DEFAULT_PROGRESS_INTERVAL
+
+from .cache import RegenerationCache
+from .cache import package_versions
+from .scenario import ScenarioContext
+
+class SixTrackScenario( ScenarioContext ):
+    @property
+    def six( self ):
+        return self.get( "six",
+            lambda: sixtracktools.SixInput( self.input_path ),
+            "parse sixtrack input (fort.2, fort.3)" )
+
+    @property
+    def line( self ):
+        # The sixtrack dump positions ( iconv ) survive the compaction
+        line = self.get( "line", lambda: pysix.Line.from_sixinput( self.six ),
+            "build pysixtrack line" )
+        return self.compacted_line(
+            line, barriers=line.other_info[ "iconv" ] )
+
+    @property
+    def iconv( self ):
+        return self.line.other_info[ "iconv" ]
+
+    @property
+    def path_to_dump_file( self ):
+        return os.path.join( self.input_path, "dump3.dat" )
+
+    @property
+    def sixdump( self ):
+        return self.get( "sixdump",
+            lambda: SixDump101Reader( self.path_to_dump_file ),
+            "read sixtrack dump (dump3.dat)" )
+
+def sixdump_sequence_to_bunch( sixdump, sequ_idx, num_particles, elemid ):
+    bunch = pysix.Particles( **sixdump.sequence_beam( sequ_idx, num_particles ) )
+    bunch.state  = np.ones( num_particles, dtype=np.int64 )
+    bunch.turn   = np.zeros( num_particles, dtype=np.int64 )
+    bunch.partid = np.arange( num_particles, dtype=np.int64 )
+    bunch.elemid = np.full( num_particles, elemid, dtype=np.int64 )
+    bunch.lost_particles = []
+    return bunch
+
+def generate_lattice_data( input_path, output_path, conf=dict(), ctx=None ):
     print( "**** Generating Lattice Data From SixTrack Input:" )
     print( "**** -> Reading sixtrack input data from:\r\n" +
           f"****    {input_path}" )
-    six = sixtracktools.SixInput( input_path )
+    if ctx is None:
+        ctx = SixTrackScenario( input_path, output_path, conf )
     slot_size = st.CBufferView.DEFAULT_SLOT_SIZE
 
-    line = pysix.Line.from_sixinput( six )
-    n_slots, n_objs, n_ptrs = calc_cbuffer_params_for_pysix_line(
-            line, slot_size=slot_size, conf=conf )
-    cbuffer = st.CBuffer( n_slots, n_objs, n_ptrs, 0, slot_size )
-    pysix_line_to_cbuffer( line, cbuffer )
+    line = ctx.line
+    plan = params = None
+    if conf.get( "lattice_transform", None ):
+        line, plan, params = transform_line( line,
+            conf[ "lattice_transform" ], slot_size=slot_size, conf=conf )
+
+    cbuffer = pysix_line_to_new_cbuffer( line, slot_size=slot_size, conf=conf,
+                                         plan=plan, params=params )
     path_to_lattice = os.path.join( output_path, "cobj_lattice.bin" )
 
     if  0 == cbuffer.tofile_normalised( path_to_lattice,
@@ -44,12 +120,22 @@ def generate_lattice_data( input_path, output_path, conf=dict() ):
     else:
         raise RuntimeError( "Problem during creation of lattice data" )
 
-    path_to_pysix_lattice = os.path.join( output_path, "pysixtrack_lattice.pickle" )
+    if ctx.lattice_index_map is not None:
+        write_lattice_index_map( output_path, ctx.lattice_index_map )
+
+    path_to_pysix_lattice = os.path.join( output_path, "pysixtrack_lattice.npz" )
 
     try:
-        pickle.dump( line.elements, open( path_to_pysix_lattice, "wb" ) )
-        print( "**** -> Generated pysixtrack lattice as python pickle:\r\n" +
+        save_line( path_to_pysix_lattice, line.elements )
+        print( "**** -> Generated pysixtrack lattice in columnar format:\r\n" +
               f"****    {path_to_pysix_lattice}" )
+        if conf.get( "write_legacy_pickles", True ):
+            path_to_pysix_lattice = os.path.join(
+                output_path, "pysixtrack_lattice.pickle" )
+            with open( path_to_pysix_lattice, "wb" ) as f_out:
+                pickle.dump( line.elements, f_out )
+            print( "**** -> Generated pysixtrack lattice as python pickle:\r\n" +
+                  f"****    {path_to_pysix_lattice}" )
     except:
         raise RuntimeError(
             "Unable to generate pysixtrack lattice data" )
@@ -62,13 +148,13 @@ def generate_lattice_data( input_path, output_path, conf=dict() ):
             cbuffer.num_objects:
             path_dt_lattice = os.path.join( output_path, "demotrack_lattice.bin" )
             with open( path_dt_lattice, "wb" ) as fp_out:
-                fp_out.write( float_to_bytes( len( dt_lattice ) ) )
-                fp_out.write( dt_lattice.tobytes() )
+                write_demotrack_array( fp_out, dt_lattice )
                 print( "**** -> Generated demotrack lattice as flat array:\r\n" +
                       f"****    {path_dt_lattice}" )
     return
 
-def generate_particle_data_initial( output_path, iconv, sixdump, conf=dict() ):
+def generate_particle_data_initial( output_path, iconv, sixdump, conf=dict(),
+    ctx=None ):
     num_iconv = int( len( iconv ) )
     num_dumps = int( len( sixdump.particles ) )
 
@@ -85,26 +171,19 @@ def generate_particle_data_initial( output_path, iconv, sixdump, conf=dict() ):
     MAKE_DEMOTRACK &= st.Demotrack_enabled()
     init_particle_idx = 0
 
-    initial_p_buffer = create_single_particle_cbuffer( 1, num_part, conf )
-    initial_pset_buffer = create_particle_set_cbuffer( 1, num_part, conf )
+    initial_p_buffer = BUFFER_POOL.single_particle_buffer( 1, num_part, conf )
+    initial_pset_buffer = BUFFER_POOL.particle_set_buffer( 1, num_part, conf )
     initial_p_pysix = []
-    path_initial_pset = os.path.join( output_path, "cobj_initial_particles.bin" )
 
-    for jj in range( num_part ):
-        kk = num_part * init_particle_idx + jj
-        assert kk < len( sixdump.particles )
-        in_p = pysix.Particles( **sixdump[ kk ].get_minimal_beam() )
-        in_p.state  = 1
-        in_p.turn   = 0
-        in_p.partid = jj
-        in_p.elemid = iconv[ init_particle_idx ]
+    bunch = sixdump_sequence_to_bunch(
+        sixdump, init_particle_idx, num_part, iconv[ init_particle_idx ] )
 
-        p = st.st_SingleParticle.GET( initial_p_buffer, kk )
-        pysix_particle_to_single_particle( in_p, p, conf=conf )
+    for jj in range( num_part ):
+        initial_p_pysix.append( bunch_to_particle( bunch, jj ) )
 
-        pset = st.st_Particles.GET( initial_pset_buffer, 0 )
-        pysix_particle_to_pset( in_p, pset, jj, conf=conf )
-        initial_p_pysix.append( in_p )
+    pset = st.st_Particles.GET( initial_pset_buffer, 0 )
+    pysix_particles_to_pset( bunch, pset,
+        single_particle_buffer=initial_p_buffer, conf=conf )
 
     assert len( initial_p_pysix ) == num_part
     for ii, in_p in enumerate( initial_p_pysix ):
@@ -128,31 +207,37 @@ def generate_particle_data_initial( output_path, iconv, sixdump, conf=dict() ):
         raise RuntimeError( "Unable to generate initial single particle set data" )
 
     path_init_pysix = os.path.join(
-        output_path, "pysixtrack_initial_particles.pickle" )
-
-    with open( path_init_pysix, "wb" ) as f_out:
-        pickle.dump( initial_p_pysix, f_out )
-        print( "**** -> Generated initial pysixtrack particle data at:\r\n" +
-               f"****    {path_init_pysix}" )
+        output_path, "pysixtrack_initial_particles.npz" )
+    save_particles( path_init_pysix, initial_p_pysix )
+    print( "**** -> Generated initial pysixtrack particle data at:\r\n" +
+           f"****    {path_init_pysix}" )
+
+    if conf.get( "write_legacy_pickles", True ):
+        path_init_pysix = os.path.join(
+            output_path, "pysixtrack_initial_particles.pickle" )
+        with open( path_init_pysix, "wb" ) as f_out:
+            pickle.dump( initial_p_pysix, f_out )
+            print( "**** -> Generated initial pysixtrack particle data at:\r\n" +
+                   f"****    {path_init_pysix}" )
+
+    if ctx is not None:
+        ctx.initial_particles = initial_p_pysix
 
     if MAKE_DEMOTRACK:
-        dt_particles_buffer = st.st_DemotrackParticle.CREATE_ARRAY( num_part, True )
-        assert isinstance( dt_particles_buffer, np.ndarray )
+        path_init_dt = os.path.join(
+            output_path, "demotrack_initial_particles.pickle" )
+        dt_particles_buffer = create_demotrack_memmap( path_init_dt, num_part )
         assert len( dt_particles_buffer ) == num_part
         pset = st.st_Particles.GET( initial_pset_buffer, 0 )
         assert pset.num_particles == num_part
-        dt_p = st.st_DemotrackParticle()
-        for ii in range( 0, num_part ):
-            dt_p.from_cobjects( pset, ii )
-            dt_p.to_array( dt_particles_buffer, ii )
-            dt_p.clear()
-        path_init_dt = os.path.join(
-            output_path, "demotrack_initial_particles.pickle" )
-        with open( path_init_dt, "wb" ) as f_out:
-            f_out.write( float_to_bytes( num_part ) )
-            f_out.write( dt_particles_buffer.tobytes() )
-            print( "**** -> Generated initial demotrack particle data at:\r\n" +
-                  f"****    {path_init_dt}" )
+        pset_to_demotrack( pset, dt_particles_buffer )
+        if isinstance( dt_particles_buffer, np.memmap ):
+            dt_particles_buffer.flush()
+        del dt_particles_buffer
+        print( "**** -> Generated initial demotrack particle data at:\r\n" +
+              f"****    {path_init_dt}" )
+    BUFFER_POOL.release( initial_pset_buffer )
+    BUFFER_POOL.release( initial_p_buffer )
     return
 
 
@@ -172,7 +257,7 @@ def generate_particle_data_sequ_by_sequ( output_path, line, iconv, sixdump, conf
     assert num_iconv > 0
 
     NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
-    pset_buffer = create_particle_set_cbuffer(
+    pset_buffer = BUFFER_POOL.particle_set_buffer(
         num_iconv, num_particles, conf )
 
     for ii in range( num_iconv ):
@@ -180,16 +265,9 @@ def generate_particle_data_sequ_by_sequ( output_path, line, iconv, sixdump, conf
         assert ii < pset_buffer.num_objects
         pset = st.st_Particles.GET( pset_buffer, ii )
         assert pset.num_particles == num_particles
-        for jj in range( 0, num_particles ):
-            kk = num_particles * ii + jj
-            assert kk < num_dumps
-            in_p = pysix.Particles( **sixdump[ kk ].get_minimal_beam() )
-            in_p.state = 1
-            in_p.turn = 0
-            in_p.partid = jj
-            in_p.elemid = iconv[ ii ]
-            assert pset.num_particles == num_particles
-            pysix_particle_to_pset( in_p, pset, jj, conf=conf )
+        bunch = sixdump_sequence_to_bunch(
+            sixdump, ii, num_particles, iconv[ ii ] )
+        pysix_particles_to_pset( bunch, pset, conf=conf )
     path_cobj_pset = os.path.join( output_path, "cobj_particles_sixtrack.bin" )
     if 0 == pset_buffer.tofile_normalised( path_cobj_pset, NORM_ADDR ):
         print( "**** -> Generated cbuffer of sixtrack particle sequ-by-sequ "
@@ -197,9 +275,11 @@ def generate_particle_data_sequ_by_sequ( output_path, line, iconv, sixdump, conf
     else:
         raise RuntimeError(
             "Unable to generate cobjects sixtrack sequency-by-sequence data" )
+    BUFFER_POOL.release( pset_buffer )
     return
 
-def generate_particle_data_elem_by_elem( output_path, line, iconv, sixdump, conf=dict() ):
+def generate_particle_data_elem_by_elem( output_path, line, iconv, sixdump,
+    conf=dict(), ctx=None ):
     num_iconv = int( len( iconv ) )
     num_belem = int( len( line ) )
     num_dumps = int( len( sixdump.particles ) )
@@ -213,101 +293,27 @@ def generate_particle_data_elem_by_elem( output_path, line, iconv, sixdump, conf
     assert num_belem > 0
     assert num_iconv > 0
 
-    NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
-    MAKE_DEMOTRACK = conf.get( "make_demotrack_data", False )
-    MAKE_DEMOTRACK &= st.Demotrack_enabled()
-
-    pset_buffer = create_particle_set_cbuffer(
-        num_belem + 1, num_particles, conf )
-    assert pset_buffer.num_objects == num_belem + 1
-
-    path_initial_pysix_particles = os.path.join(
-        output_path, "pysixtrack_initial_particles.pickle" )
-    initial_p_pysix = None
-    with open( path_initial_pysix_particles, "rb" ) as f_in:
-        initial_p_pysix = pickle.load( f_in )
-    assert initial_p_pysix is not None
-    assert len( initial_p_pysix ) == num_particles
-
-    if MAKE_DEMOTRACK:
-        dt_p = st.st_DemotrackParticle()
-        dt_pset_buffer = st.st_DemotrackParticle.CREATE_ARRAY(
-            ( num_belem + 1 ) * num_particles, True )
-        assert isinstance( dt_pset_buffer, np.ndarray )
-        assert len( dt_pset_buffer ) <= ( num_belem + 1 ) * num_particles
-
-    for ii, in_p in enumerate( initial_p_pysix ):
-        assert isinstance( in_p, pysix.Particles )
-        assert isinstance( in_p, pysix.Particles )
-        assert in_p.elemid == iconv[ 0 ]
-        assert in_p.partid == ii
-        assert in_p.turn == 0
-        assert in_p.state == 1
-        print( f"****    Info :: particle {ii:6d}/{num_particles - 1:6d}" )
-
-        for jj, elem in enumerate( line.elements ):
-            assert in_p.elemid == jj
-            assert in_p.partid == ii
-            assert in_p.turn == 0
-            assert in_p.state == 1
-
-            pset = st.st_Particles.GET( pset_buffer, jj )
-            assert pset.num_particles == num_particles
-            pysix_particle_to_pset( in_p, pset, ii, conf=conf )
-
-            if MAKE_DEMOTRACK:
-                dt_p.clear()
-                dt_p.from_cobjects( pset, ii )
-                kk = jj * num_particles + ii
-                dt_p.to_array( dt_pset_buffer, kk )
-            if in_p.state == 1:
-                elem.track( in_p )
-
-            if isinstance( elem, pysix.elements.Drift ) and in_p.state == 1 and \
-                ( in_p.x > 1.0 or in_p.x < -1.0 or
-                  in_p.y > 1.0 or in_p.y < -1.0 ):
-                in_p.state = 0
-
-            if in_p.state == 1:
-                in_p.elemid += 1
-            else:
-                print( f"lost particle {in_p.partid} at pos {in_p.elemid} : {in_p}" )
-                print( f"lost particle {in_p.partid} at elem: {elem}" )
-                break
-
-        if in_p.state == 1:
-            in_p.turn += 1
-            in_p.elemid = iconv[ 0 ]
-        else:
-            print( f"lost particle {in_p.partid}" )
-        pset = st.st_Particles.GET( pset_buffer, num_belem )
-        assert pset.num_particles == num_particles
-        pysix_particle_to_pset( in_p, pset, ii, conf=conf )
-        if MAKE_DEMOTRACK:
-            dt_p.clear()
-            dt_p.from_cobjects( pset, ii )
-            dt_p.to_array( dt_pset_buffer, num_particles * num_belem + ii )
-
-    path_elem_by_elem = os.path.join(
-        output_path, "cobj_particles_elem_by_elem_pysixtrack.bin" )
-    if 0 == pset_buffer.tofile_normalised( path_elem_by_elem, NORM_ADDR ):
-        print( "**** -> Generated cbuffer of particle elem-by-elem data:\r\n" +
-              f"****    {path_elem_by_elem}" )
-    else:
-        raise RuntimeError(
-            "Unable to generate cobjects elem-by-elem data" )
+    if ctx is None:
+        ctx = ScenarioContext( None, output_path, conf )
+    assert ctx.num_initial_particles == num_particles
+
+    def initial_particle_blocks():
+        for begin, end, initial_p_pysix in ctx.initial_particle_blocks():
+            for ii, in_p in enumerate( initial_p_pysix ):
+                assert isinstance( in_p, pysix.Particles )
+                assert in_p.elemid == iconv[ 0 ]
+                assert in_p.partid == begin + ii
+                assert in_p.turn == 0
+                assert in_p.state == 1
+            yield begin, end, initial_p_pysix
 
-    if MAKE_DEMOTRACK:
-        path_elem_by_elem = os.path.join(
-            output_path, "demotrack_elem_by_elem_pysixtrack.pickle" )
-        with open( path_elem_by_elem, "wb" ) as f_out:
-            f_out.write( float_to_bytes( len( dt_pset_buffer ) ) )
-            f_out.write( dt_pset_buffer.tobytes() )
-            print( "**** -> Generated demotrack particle elem-by-elem data:\r\n" +
-                  f"****    {path_elem_by_elem}" )
+    generate_elem_by_elem_data( output_path, line.elements,
+        initial_particle_blocks(), num_particles, start_at_element=iconv[ 0 ],
+        conf=conf )
     return
 
-def generate_particle_data_until_turn( output_path, line, iconv, sixdump, until_turn, conf=dict() ):
+def generate_particle_data_until_turn( output_path, line, iconv, sixdump,
+    until_turn, conf=dict(), ctx=None ):
     num_iconv = int( len( iconv ) )
     num_belem = int( len( line ) )
     num_dumps = int( len( sixdump.particles ) )
@@ -319,107 +325,159 @@ def generate_particle_data_until_turn( output_path, line, iconv, sixdump, until_
     assert num_particles > 0
     assert num_belem > 0
     assert num_iconv > 0
-    assert until_turn > 0
+    assert len( until_turn_milestones( until_turn ) ) > 0
     start_at_element = iconv[ 0 ]
 
     NORM_ADDR = conf.get( "cbuffer_norm_base_addr", 4096 )
     MAKE_DEMOTRACK = conf.get( "make_demotrack_data", False )
     MAKE_DEMOTRACK &= st.Demotrack_enabled()
 
-    pset_buffer = create_particle_set_cbuffer( 1, num_particles, conf )
+    pset_buffer = BUFFER_POOL.particle_set_buffer( 1, num_particles, conf )
     assert pset_buffer.num_objects == 1
     pset = st.st_Particles.GET( pset_buffer, 0 )
     assert pset.num_particles == num_particles
 
-    path_initial_pysix_particles = os.path.join(
-        output_path, "pysixtrack_initial_particles.pickle" )
-    initial_p_pysix = None
-    with open( path_initial_pysix_particles, "rb" ) as f_in:
-        initial_p_pysix = pickle.load( f_in )
-    assert initial_p_pysix is not None
-    assert len( initial_p_pysix ) == num_particles
-    for ii, in_p in enumerate( initial_p_pysix ):
-        assert ii == in_p.partid
-        assert 0  == in_p.turn
-        assert iconv[ 0 ] == in_p.elemid
-        assert 1 == in_p.state
-
-    if MAKE_DEMOTRACK:
-        dt_p = st.st_DemotrackParticle()
-        dt_pset_buffer = st.st_DemotrackParticle.CREATE_ARRAY( num_particles, True )
-        assert isinstance( dt_pset_buffer, np.ndarray )
-        assert len( dt_pset_buffer ) <= num_particles
+    if ctx is None:
+        ctx = ScenarioContext( None, output_path, conf )
+    assert ctx.num_initial_particles == num_particles
+
+    def initial_particle_blocks():
+        for begin, end, initial_p_pysix in ctx.initial_particle_blocks():
+            for ii, in_p in enumerate( initial_p_pysix ):
+                assert begin + ii == in_p.partid
+                assert 0  == in_p.turn
+                assert iconv[ 0 ] == in_p.elemid
+                assert 1 == in_p.state
+            yield begin, end, initial_p_pysix
+
+    NUM_WORKERS = get_num_workers( conf )
+    BATCHED = conf.get( 'batched_tracking', DEFAULT_BATCHED_TRACKING )
+    PROGRESS_INTERVAL = conf.get( "progress_interval",
+                                  DEFAULT_PROGRESS_INTERVAL )
+    def track_fn( particles, until_turn ):
+        if NUM_WORKERS > 1 and len( particles ) > 1:
+            return track_until_turn_parallel( particles, line.elements, until_turn,
+                start_at_element=start_at_element, num_workers=NUM_WORKERS,
+                batched=BATCHED )
+        elif BATCHED:
+            print( f"****    Info :: tracking {len( particles )} particles " +
+                    "as bunch" )
+            return track_bunch_until_turn( particles, line.elements, until_turn,
+                start_at_element=start_at_element )
+        progress = ProgressReporter( len( particles ), "particles",
+                                     PROGRESS_INTERVAL )
+        for ii, in_p in enumerate( particles ):
+            assert isinstance( in_p, pysix.Particles )
+            track_particle_until_turn( in_p, line.elements, until_turn,
+                start_at_element=start_at_element )
+            progress.update()
+        progress.finish()
+        return particles
+
+    def write_milestone_files( turn ):
+        path_pset_out = os.path.join(
+            output_path, f"cobj_particles_until_turn_{turn}.bin" )
 
-    for ii, in_p in enumerate( initial_p_pysix ):
-        assert isinstance( in_p, pysix.Particles )
-        print( f"****    Info :: particle {ii:6d}/{num_particles - 1:6d}" )
-        for jj in range( in_p.turn, until_turn ):
-            for kk, elem in enumerate( line.elements ):
-                assert in_p.elemid == kk
-                assert in_p.partid == ii
-                assert in_p.turn == jj
-                assert in_p.state == 1
+        if 0 == pset_buffer.tofile_normalised( path_pset_out, NORM_ADDR ):
+            print( "**** -> Generated cbuffer of tracked particle data:\r\n" +
+                  f"****    {path_pset_out}" )
+        else:
+            raise ValueError(
+                f"Error during tracking particles until turn {turn}" )
 
-                if in_p.state == 1:
-                    elem.track( in_p )
-
-                if isinstance( elem, pysix.elements.Drift ) and \
-                    in_p.state == 1 and (
-                    in_p.x > 1.0 or in_p.x < -1.0 or
-                    in_p.y > 1.0 or in_p.y < -1.0 ):
-                    in_p.state = 0
-
-                if in_p.state == 1:
-                    in_p.elemid += 1
-                else:
-                    print( f"lost particle {in_p.partid} at pos {in_p.elemid} : {in_p}" )
-                    print( f"lost particle {in_p.partid} at elem: {elem}" )
-                    break
-
-            if in_p.state == 1:
-                in_p.turn += 1
-                in_p.elemid = start_at_element
-            else:
-                break
-        if in_p.state != 1:
-            print( f"lost particle {in_p.partid} at pos {in_p.elem} / turn  {in_p.turn}: {in_p}" )
-        pysix_particle_to_pset( in_p, pset, ii, conf=conf )
         if MAKE_DEMOTRACK:
-            dt_p.clear()
-            dt_p.from_cobjects( pset, ii )
-            dt_p.to_array( dt_pset_buffer, ii )
-
-    path_pset_out = os.path.join(
-        output_path, f"cobj_particles_until_turn_{until_turn}.bin" )
-
-    if 0 == pset_buffer.tofile_normalised( path_pset_out, NORM_ADDR ):
-        print( "**** -> Generated cbuffer of tracked particle data:\r\n" +
-              f"****    {path_pset_out}" )
-    else:
-        raise ValueError(
-            f"Error during tracking particles until turn {until_turn}" )
-
-    if MAKE_DEMOTRACK:
-        path_pset_out = os.path.join(
-            output_path, f"demotrack_particles_until_turn_{until_turn}.bin" )
-        with open( path_pset_out, "wb" ) as f_out:
-            f_out.write( float_to_bytes( len( dt_pset_buffer ) ) )
-            f_out.write( dt_pset_buffer.tobytes() )
+            path_pset_out = os.path.join(
+                output_path, f"demotrack_particles_until_turn_{turn}.bin" )
+            dt_pset_buffer = create_demotrack_memmap( path_pset_out, num_particles )
+            pset_to_demotrack( pset, dt_pset_buffer )
+            if isinstance( dt_pset_buffer, np.memmap ):
+                dt_pset_buffer.flush()
+            del dt_pset_buffer
             print( "**** -> Generated demotrack data of tracked particles:\r\n" +
                    f"****    {path_pset_out}" )
+
+    def milestone_written( turn ):
+        paths = [ os.path.join( output_path,
+                                f"cobj_particles_until_turn_{turn}.bin" ) ]
+        if MAKE_DEMOTRACK:
+            paths.append( os.path.join( output_path,
+                f"demotrack_particles_until_turn_{turn}.bin" ) )
+        return all( os.path.isfile( path ) for path in paths )
+
+    CHECKPOINT_INTERVAL = conf.get( "until_turn_checkpoint_interval", 0 )
+    RESUME = conf.get( "use_regeneration_cache", True )
+    if num_particles <= ctx.particle_block_size:
+        initial_p_pysix = [ in_p for _, _, block in initial_particle_blocks()
+                            for in_p in block ]
+        checkpoint = TrackingCheckpoint( output_path,
+            checkpoint_key( initial_p_pysix, line.elements, package_versions() ),
+            interval=CHECKPOINT_INTERVAL, resume=RESUME )
+        def write_milestone( turn, particles ):
+            pysix_particles_to_pset(
+                particles_to_bunch( list( particles ) ), pset, conf=conf )
+            write_milestone_files( turn )
+        tracked_p_pysix = track_until_turn_checkpointed( initial_p_pysix,
+            until_turn, track_fn, checkpoint=checkpoint,
+            milestone_fn=write_milestone, milestone_written=milestone_written,
+            progress_interval=PROGRESS_INTERVAL )
+        losses = loss_table( tracked_p_pysix )
+    else:
+        # Larger distributions are tracked block by block from milestone to
+        # milestone; the checkpoint keeps the state of each block
+        checkpoint = TrackingCheckpoint( output_path, checkpoint_key(
+            ( in_p for _, _, block in initial_particle_blocks()
+              for in_p in block ), line.elements, package_versions() ),
+            interval=CHECKPOINT_INTERVAL, resume=RESUME )
+        final_turn = until_turn_milestones( until_turn )[ -1 ]
+        loss_tables = []
+        def write_block( turn, begin, end, particles ):
+            pysix_particles_to_pset( particles_to_bunch( list( particles ) ),
+                pset, begin=begin, conf=conf )
+            if turn == final_turn:
+                loss_tables.append( loss_table( particles ) )
+        track_until_turn_in_blocks( initial_particle_blocks(), until_turn,
+            track_fn, write_block, milestone_fn=write_milestone_files,
+            checkpoint=checkpoint, milestone_written=milestone_written,
+            scratch_path=output_path, progress_interval=PROGRESS_INTERVAL )
+        losses = concatenate_loss_tables( loss_tables )
+    write_loss_table( os.path.join( output_path,
+        LOSS_TABLE_FILE_NAMES[ "until_turn" ] ), losses )
+    BUFFER_POOL.release( pset_buffer )
     return
 
-def generate_particle_data( input_path, output_path, conf=dict() ):
+def generate_particle_data( input_path, output_path, conf=dict(), cache=None,
+    ctx=None ):
     print( "**** Generating Particles Data From SixTrack Input:" )
-    path_to_dump_file = os.path.join( input_path, "dump3.dat" )
+    stages = [ "initial_particles" ]
+    if conf.get( "make_sixtrack_sequ_by_sequ", False ):
+        stages.append( "sequ_by_sequ" )
+    if conf.get( "make_elem_by_elem_data", False ):
+        stages.append( "elem_by_elem" )
+    if conf.get( "make_until_num_turn_data", False ) and \
+        len( until_turn_milestones( conf.get( "until_num_turns", 1 ) ) ) > 0:
+        stages.append( "until_turn" )
+    if conf.get( "lattice_transform", None ) and len( stages ) > 1:
+        # The tracked data is tied to the element numbering of the sixtrack
+        # input ( iconv, dump3.dat )
+        raise ValueError( "lattice_transform is only supported for the " +
+            "lattice and the initial particles of sixtrack scenarios" )
+
+    pending = [ stage for stage in stages
+                if cache is None or not cache.is_up_to_date( stage ) ]
+    for stage in stages:
+        if not stage in pending:
+            print( f"**** -> Skipping {stage} stage, outputs are up to date" )
+    if len( pending ) == 0:
+        return
+
+    if ctx is None:
+        ctx = SixTrackScenario( input_path, output_path, conf )
 
     print( "**** -> Reading sixtrack input data from:\r\n" +
-          f"****    {path_to_dump_file}" )
-    six = sixtracktools.SixInput( input_path )
-    #line, rest, iconv = six.expand_struct( convert=pysixtrack.elements )
-    line = pysix.Line.from_sixinput(six)
-    iconv = line.other_info["iconv"]
-    sixdump = sixtracktools.SixDump101( path_to_dump_file )
+          f"****    {ctx.path_to_dump_file}" )
+    line = ctx.line
+    iconv = ctx.iconv
+    sixdump = ctx.sixdump
 
     num_iconv = int( len( iconv ) )
     num_belem = int( len( line ) )
@@ -442,34 +500,54 @@ def generate_particle_data( input_path, output_path, conf=dict() ):
     # Get initial particle distribution:
 
     # Generate the initial particle disitribution buffers
-    print( "**** -> Generating initial particle distributions ..." )
-    generate_particle_data_initial( output_path, iconv, sixdump, conf=conf )
+    if "initial_particles" in pending:
+        print( "**** -> Generating initial particle distributions ..." )
+        with ctx.stage( "initial_particles", num_particles=num_particles ):
+            generate_particle_data_initial(
+                output_path, iconv, sixdump, conf=conf, ctx=ctx )
+        if cache is not None:
+            cache.update( "initial_particles" )
 
     # =========================================================================
     # Make sixtrack sequency-by-sequence data:
 
-    if conf.get( "make_sixtrack_sequ_by_sequ", False ):
+    if "sequ_by_sequ" in pending:
         print( "**** -> Generating SixTrack sequ-by-sequ particle data ..." )
-        generate_particle_data_sequ_by_sequ(
-            output_path, line, iconv, sixdump, conf=conf )
+        with ctx.stage( "sequ_by_sequ",
+                        num_particles=num_particles * num_iconv ):
+            generate_particle_data_sequ_by_sequ(
+                output_path, line, iconv, sixdump, conf=conf )
+        if cache is not None:
+            cache.update( "sequ_by_sequ" )
 
     # =========================================================================
     # Make elem-by-elem data using pysixtrack:
 
-    if conf.get( "make_elem_by_elem_data", False ):
+    if "elem_by_elem" in pending:
         print( "**** -> Generating elem-by-elem particle data using pysixtrack ..." )
-        generate_particle_data_elem_by_elem(
-            output_path, line, iconv, sixdump, conf=conf )
+        with ctx.stage( "elem_by_elem", num_particles=num_particles,
+                        num_elements=num_belem, num_turns=1 ):
+            generate_particle_data_elem_by_elem(
+                output_path, line, iconv, sixdump, conf=conf, ctx=ctx )
+        if cache is not None:
+            cache.update( "elem_by_elem" )
 
     # =========================================================================
     # Make until turn data using pysixtrack:
 
-    if conf.get( "make_until_num_turn_data", False ) and \
-        conf.get( "until_num_turns", 1 ) > 0:
+    if "until_turn" in pending:
         print( "**** -> Generating until_turn tracked data using pysixtrack ..." )
         until_turn = conf.get( "until_num_turns", 1 )
-        generate_particle_data_until_turn(
-            output_path, line, iconv, sixdump, until_turn, conf=conf )
+        with ctx.stage( "until_turn", num_particles=num_particles,
+                        num_elements=num_belem,
+                        num_turns=max( until_turn_milestones( until_turn ) ) ):
+            generate_particle_data_until_turn( output_path, line, iconv,
+                sixdump, until_turn, conf=conf, ctx=ctx )
+        if cache is not None:
+            cache.update( "until_turn" )
+
+    if "elem_by_elem" in pending or "until_turn" in pending:
+        write_loss_map( output_path, num_belem, stages )
 
 
 def generate_data( scenario_name, input_path, output_path, conf=dict() ):
@@ -480,7 +558,7 @@ def generate_data( scenario_name, input_path, output_path, conf=dict() ):
     print(  "****" )
     print( f"****       Scenario : {scenario_name}" )
     print(  "****" )
-    print( f"****         Source : sixtrack" )
+    print( "****         Source : sixtrack" )
     print( f"****      Input Dir : {input_path}" )
     print( f"****     Output Dir : {output_path}" )
     print(  "****" )
@@ -488,12 +566,23 @@ def generate_data( scenario_name, input_path, output_path, conf=dict() ):
             "------------------------------------------------------------" +
             "------------------------------" )
     print(  "**** " )
-    generate_lattice_data( input_path, output_path, conf=conf )
+    ctx = SixTrackScenario( input_path, output_path, conf )
+    cache = RegenerationCache( input_path, output_path, conf=conf )
+    if cache.is_up_to_date( "lattice" ):
+        print( "**** -> Skipping lattice stage, outputs are up to date" )
+    else:
+        with ctx.stage( "lattice" ):
+            generate_lattice_data( input_path, output_path, conf=conf, ctx=ctx )
+        cache.update( "lattice" )
     print(  "**** " )
     print(  "------------------------------------------------------------" +
             "------------------------------------------------------------" +
             "------------------------------" )
     print(  "**** " )
-    generate_particle_data( input_path, output_path, conf=conf )
+    generate_particle_data(
+        input_path, output_path, conf=conf, cache=cache, ctx=ctx )
+    print(  "**** " )
+    ctx.print_timings()
+    ctx.write_report( scenario_name )
     print(  "**** " )
     print(  "**** " )
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numbers
+import os
+import numpy as np
+
+# Tracking is done using pysixtrack
+import pysixtrack as pysix
+
+from .columnar import load_particles
+from .tracking import APERTURE_ELEMENTS
+from .tracking import bunch_to_particle
+
+from .from_pysixtrack import PySixTrackScenario
+from .from_pysixtrack import generate_data as generate_from_pysixtrack
+
+# A synthetic scenario uses the lattice of a pysixtrack input directory
+# ( e.g. that of another scenario ) together with num_particles generated
+# particles. The distribution is either
+#   - "gaussian": independent gaussians with sigma_x, sigma_px, sigma_y,
+#                 sigma_py, sigma_zeta and sigma_delta
+#   - "matched":  transverse gaussians matched to the linear, uncoupled
+#                 one-turn map of the lattice for the geometric emittances
+#                 emit_x and emit_y; zeta and delta as for "gaussian"
+# The reference particle is given by p0c, mass0 and q0 or, if p0c is not
+# set, taken from the particles of the input directory
+SYNTHETIC_DISTRIBUTIONS = ( "gaussian", "matched" )
+SYNTHETIC_COORDINATES = ( "x", "px", "y", "py", "zeta", "delta" )
+
+DEFAULT_SIGMAS = {
+    "sigma_x": 1e-3, "sigma_px": 1e-5, "sigma_y": 1e-3, "sigma_py": 1e-5,
+    "sigma_zeta": 0.0, "sigma_delta": 0.0 }
+
+DEFAULT_EMITTANCES = { "emit_x": 1e-8, "emit_y": 1e-8 }
+
+def reference_particle( conf=dict(), input_path=None ):
+    if "p0c" in conf:
+        return pysix.Particles( p0c=conf[ "p0c" ],
+            mass0=conf.get( "mass0", pysix.Particles().mass0 ),
+            q0=conf.get( "q0", 1.0 ) )
+    if input_path is None:
+        raise ValueError( "synthetic scenarios without input particles " +
+                          "require p0c" )
+    path = PySixTrackScenario.data_path( os.path.join( input_path,
+        "pysixtrack_initial_particles.pickle" ) )
+    if path.endswith( ".npz" ):
+        in_p = load_particles( path, 0, 1 )[ 0 ]
+    else:
+        in_p = PySixTrackScenario( input_path, None ).raw_input_particles[ 0 ]
+    return pysix.Particles( p0c=in_p.p0c, mass0=in_p.mass0, q0=in_p.q0 )
+
+def create_bunch( reference, columns ):
+    # Array-valued bunch with the layout produced by particles_to_bunch: all
+    # numeric attributes are columns, so it can be stored as is
+    num_particles = len( columns[ "x" ] )
+    bunch = reference.copy()
+    for key, value in reference.__dict__.items():
+        if isinstance( value, ( numbers.Number, np.number ) ) and \
+            not isinstance( value, ( bool, np.bool_ ) ):
+            bunch.__dict__[ key ] = np.full( num_particles, value,
+                                             dtype=np.float64 )
+    for key in ( "x", "px", "y", "py", "zeta" ):
+        bunch.__dict__[ key ] = np.array( columns[ key ], dtype=np.float64 )
+    # delta goes through the setter -> rpp, rvv are derived from it
+    bunch.delta = np.array( columns[ "delta" ], dtype=np.float64 )
+    bunch.partid = np.arange( num_particles, dtype=np.int64 )
+    bunch.state = np.ones( num_particles, dtype=np.int64 )
+    bunch.elemid = np.zeros( num_particles, dtype=np.int64 )
+    bunch.turn = np.zeros( num_particles, dtype=np.int64 )
+    bunch.lost_particles = []
+    return bunch
+
+def transverse_one_turn_matrix( line, reference, d=1e-9 ):
+    # Central differences around the reference orbit, tracked as a single
+    # bunch of 8 probes. Apertures are skipped, the probes are all close to
+    # the reference orbit
+    offsets = np.zeros( ( 8, 4 ) )
+    for ii in range( 4 ):
+        offsets[ 2 * ii, ii ] = d
+        offsets[ 2 * ii + 1, ii ] = -d
+    columns = { key: np.zeros( 8 ) for key in SYNTHETIC_COORDINATES }
+    for ii, key in enumerate( SYNTHETIC_COORDINATES[ :4 ] ):
+        columns[ key ] = offsets[ :, ii ]
+    probe = create_bunch( reference, columns )
+    for elem in line:
+        if not isinstance( elem, APERTURE_ELEMENTS ):
+            elem.track( probe )
+    out = np.array( [ probe.x, probe.px, probe.y, probe.py ] ).T
+    return ( ( out[ 0::2 ] - out[ 1::2 ] ) / ( 2 * d ) ).T
+
+def twiss_from_matrix( m ):
+    # beta, alpha of a 2x2 one-turn matrix
+    cos_mu = 0.5 * ( m[ 0, 0 ] + m[ 1, 1 ] )
+    if not abs( cos_mu ) < 1.0:
+        raise ValueError( f"linear motion is not stable, cos(mu) = {cos_mu}" )
+    sin_mu = np.sign( m[ 0, 1 ] ) * np.sqrt( 1.0 - cos_mu * cos_mu )
+    beta = m[ 0, 1 ] / sin_mu
+    alpha = ( m[ 0, 0 ] - m[ 1, 1 ] ) / ( 2.0 * sin_mu )
+    return beta, alpha
+
+def synthetic_bunch( line, reference, conf=dict() ):
+    num_particles = int( conf[ "num_particles" ] )
+    assert num_particles > 0
+    distribution = conf.get( "distribution", "gaussian" )
+    if distribution not in SYNTHETIC_DISTRIBUTIONS:
+        raise ValueError( f"unknown distribution: {distribution}" )
+    sigmas = dict( DEFAULT_SIGMAS )
+    sigmas.update( { key: conf[ key ] for key in DEFAULT_SIGMAS
+                     if key in conf } )
+
+    # All distributions draw the same standard normal deviates for a seed
+    rng = np.random.default_rng( conf.get( "seed", 0 ) )
+    u = rng.standard_normal( ( len( SYNTHETIC_COORDINATES ), num_particles ) )
+    columns = { key: sigmas[ f"sigma_{key}" ] * u[ ii ]
+                for ii, key in enumerate( SYNTHETIC_COORDINATES ) }
+
+    if distribution == "matched":
+        m = transverse_one_turn_matrix( line, reference )
+        for ii, plane in enumerate( ( "x", "y" ) ):
+            beta, alpha = twiss_from_matrix(
+                m[ 2 * ii:2 * ii + 2, 2 * ii:2 * ii + 2 ] )
+            emit = conf.get( f"emit_{plane}",
+                             DEFAULT_EMITTANCES[ f"emit_{plane}" ] )
+            print( f"****    Info :: matched {plane} : beta = {beta:.6g} m, " +
+                   f"alpha = {alpha:.6g}, emittance = {emit:.6g} m rad" )
+            columns[ plane ] = np.sqrt( emit * beta ) * u[ 2 * ii ]
+            columns[ f"p{plane}" ] = np.sqrt( emit / beta ) * (
+                u[ 2 * ii + 1 ] - alpha * u[ 2 * ii ] )
+    return create_bunch( reference, columns )
+
+class SyntheticScenario( PySixTrackScenario ):
+    # The generated particles replace the input particles; everything else
+    # is handled by the pysixtrack source
+    @property
+    def input_particles_path( self ):
+        return None
+
+    @property
+    def num_input_particles( self ):
+        return int( self.conf[ "num_particles" ] )
+
+    @property
+    def reference_particle( self ):
+        return self.get( "reference_particle", lambda: reference_particle(
+            self.conf, self.input_path ), "read reference particle" )
+
+    @property
+    def input_bunch( self ):
+        # The distribution is generated once; callers get a fresh copy as
+        # for the pysixtrack source
+        return self.get( "input_bunch", lambda: synthetic_bunch(
+            self.input_line.elements, self.reference_particle, self.conf ),
+            "generate synthetic particles" ).copy()
+
+    @property
+    def raw_input_particles( self ):
+        def create_particles():
+            bunch = self.input_bunch
+            return [ bunch_to_particle( bunch, ii )
+                     for ii in range( len( bunch.x ) ) ]
+        return self.get( "input_particles", create_particles )
+
+def generate_data( scenario_name, input_path, output_path, conf=dict() ):
+    assert conf.get( "num_particles", 0 ) > 0
+    # Synthetic scenarios only ship their config, not their output directory
+    os.makedirs( output_path, exist_ok=True )
+    ctx = SyntheticScenario( input_path, output_path, conf )
+    generate_from_pysixtrack( scenario_name, input_path, output_path,
+                              conf=conf, ctx=ctx )
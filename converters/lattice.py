@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+
+# Tracking is done using pysixtrack
+import pysixtrack as pysix
+
+from .pysixtrack_to_cobjects import plan_pysix_elements
+from .pysixtrack_to_cobjects import lattice_conversion_conf
+
+# A lattice transform is given as a table, e.g.
+#   lattice_transform = { begin = 0, end = 1000, thin_drifts = 2, tile = 10 }
+# The element range [ begin, end ) is taken from the line, only every
+# thin_drifts-th drift of it is kept and the result is repeated tile times.
+# Dropping drifts changes the optics; such lattices are only meant for
+# scaling tests
+LATTICE_TRANSFORM_KEYS = ( "begin", "end", "thin_drifts", "tile" )
+
+LATTICE_INDEX_MAP_FILE_NAME = "lattice_index_map.npy"
+
+def lattice_transform_indices( elements, transform ):
+    # Indices of the elements of a single tile
+    for key in transform:
+        if key not in LATTICE_TRANSFORM_KEYS:
+            raise ValueError( f"unknown lattice transform key: {key}" )
+    num_elements = len( elements )
+    begin = int( transform.get( "begin", 0 ) )
+    end = int( transform.get( "end", num_elements ) )
+    if not 0 <= begin < end <= num_elements:
+        raise ValueError( f"invalid element range [ {begin}, {end} ) for " +
+                          f"a line with {num_elements} elements" )
+    indices = np.arange( begin, end )
+    stride = int( transform.get( "thin_drifts", 1 ) )
+    assert stride > 0
+    if stride > 1:
+        is_drift = np.array( [ isinstance( elements[ ii ],
+            pysix.elements.Drift ) for ii in indices.tolist() ], dtype=bool )
+        drift_rank = np.cumsum( is_drift ) - 1
+        indices = indices[ ~is_drift | ( drift_rank % stride == 0 ) ]
+    return indices
+
+def transform_line( line, transform, slot_size=None, conf=dict() ):
+    # Returns the transformed line together with the cbuffer plan and the
+    # cbuffer params ( n_slots, n_objects, n_pointers ) for it. Only the
+    # elements of a single tile are planned, the sizes of the tiled line
+    # follow from them
+    tile = int( transform.get( "tile", 1 ) )
+    assert tile > 0
+    indices = lattice_transform_indices( line.elements, transform ).tolist()
+    elements = [ line.elements[ ii ] for ii in indices ]
+    entries, sizes = plan_pysix_elements( elements, slot_size=slot_size,
+        conf=lattice_conversion_conf( conf ) )
+    plan = [ entry for entry in entries if entry is not None ] * tile
+    params = tuple( tile * int( n ) for n in sizes.sum( axis=0 ) )
+
+    # The tiles share the element instances; names get a ..<tile> suffix
+    if line.element_names is not None and \
+        len( line.element_names ) == len( line.elements ):
+        names = [ line.element_names[ ii ] for ii in indices ]
+        element_names = names + [ f"{name}..{kk}"
+            for kk in range( 1, tile ) for name in names ]
+    else:
+        element_names = [ f"e{ii}" for ii in range( tile * len( elements ) ) ]
+    print( f"****    Info :: transformed lattice: {len( line.elements )} -> " +
+           f"{tile * len( elements )} elements" )
+    return pysix.Line( elements=elements * tile,
+                       element_names=element_names ), plan, params
+
+def is_identity_element( elem ):
+    if isinstance( elem, pysix.elements.SRotation ):
+        return elem.angle == 0
+    elif isinstance( elem, pysix.elements.XYShift ):
+        return elem.dx == 0 and elem.dy == 0
+    elif type( elem ) is pysix.elements.Multipole:
+        return elem.hxl == 0 and elem.hyl == 0 and \
+            not np.any( np.asarray( elem.knl, dtype=np.float64 ) ) and \
+            not np.any( np.asarray( elem.ksl, dtype=np.float64 ) )
+    return False
+
+def compact_elements( elements, barriers=() ):
+    # Drops identity elements and merges runs of drifts of the same type.
+    # Returns the compacted elements and the old -> new index map: an element
+    # maps to the element it ended up in; dropped elements map like the next
+    # element which is not dropped ( len( compacted ) at the end ).
+    # The positions in barriers ( e.g. sixtrack's iconv ) stay observable,
+    # i.e. no drift starting there is merged into a preceding one
+    barriers = set( int( ii ) for ii in barriers )
+    compacted = []
+    index_map = np.empty( len( elements ), dtype=np.int64 )
+    can_merge = False
+    num_dropped = 0
+    for ii, elem in enumerate( elements ):
+        if ii in barriers:
+            can_merge = False
+        if is_identity_element( elem ):
+            num_dropped += 1
+            continue
+        if can_merge and type( elem ) in ( pysix.elements.Drift,
+            pysix.elements.DriftExact ) and type( compacted[ -1 ] ) is \
+                type( elem ):
+            compacted[ -1 ] = type( elem )(
+                length=compacted[ -1 ].length + elem.length )
+        else:
+            compacted.append( elem )
+        index_map[ ii - num_dropped:ii + 1 ] = len( compacted ) - 1
+        num_dropped = 0
+        can_merge = True
+    index_map[ len( elements ) - num_dropped: ] = len( compacted )
+    return compacted, index_map
+
+def compact_line( line, barriers=() ):
+    # Compacted copy of a pysix.Line; iconv in other_info is remapped
+    elements, index_map = compact_elements( line.elements, barriers )
+    if line.element_names is not None and \
+        len( line.element_names ) == len( line.elements ):
+        # Merged drifts keep the name of the first drift
+        element_names = [ None ] * len( elements )
+        for ii, elem in enumerate( line.elements ):
+            if not is_identity_element( elem ) and \
+                element_names[ index_map[ ii ] ] is None:
+                element_names[ index_map[ ii ] ] = line.element_names[ ii ]
+    else:
+        element_names = [ f"e{ii}" for ii in range( len( elements ) ) ]
+    compacted = pysix.Line( elements=elements, element_names=element_names )
+    other_info = getattr( line, "other_info", None )
+    if other_info is not None:
+        compacted.other_info = dict( other_info )
+        if "iconv" in other_info:
+            compacted.other_info[ "iconv" ] = [ int( index_map[ ii ] )
+                for ii in other_info[ "iconv" ] ]
+    print( f"****    Info :: compacted lattice: {len( line.elements )} -> " +
+           f"{len( elements )} elements" )
+    return compacted, index_map
+
+def write_lattice_index_map( output_path, index_map ):
+    path = os.path.join( output_path, LATTICE_INDEX_MAP_FILE_NAME )
+    np.save( path, np.asarray( index_map, dtype=np.int64 ) )
+    print( "**** -> Generated old -> new lattice element index map at:\r\n" +
+          f"****    {path}" )
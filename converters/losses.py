@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+
+LOSS_MAP_FILE_NAME = "loss_map.npz"
+LOSS_TABLE_FILE_NAMES = {
+    "elem_by_elem": "losses_elem_by_elem.npy",
+    "until_turn": "losses_until_turn.npy" }
+
+LOSS_TABLE_DTYPE = np.dtype( [
+    ( "partid", np.int64 ), ( "turn", np.int64 ), ( "elemid", np.int64 ),
+    ( "s", np.float64 ), ( "x", np.float64 ), ( "y", np.float64 ),
+    ( "px", np.float64 ), ( "py", np.float64 ), ( "delta", np.float64 ) ] )
+
+def loss_table( particles ):
+    # Lost particles keep the turn, element and coordinates at which they
+    # were lost -> the table is built from the tracked particles after the
+    # fact instead of being collected ( and printed ) while tracking
+    lost = [ in_p for in_p in particles if in_p.state != 1 ]
+    table = np.zeros( len( lost ), dtype=LOSS_TABLE_DTYPE )
+    for field in LOSS_TABLE_DTYPE.names:
+        table[ field ] = [ getattr( in_p, field ) for in_p in lost ]
+    return np.sort( table, order="partid" )
+
+def concatenate_loss_tables( tables ):
+    if len( tables ) == 0:
+        return np.zeros( 0, dtype=LOSS_TABLE_DTYPE )
+    return np.sort( np.concatenate( tables ), order="partid" )
+
+def write_loss_table( path, table ):
+    with open( path, "wb" ) as f_out:
+        np.save( f_out, table, allow_pickle=False )
+    print( f"**** -> Lost {len( table )} particles, wrote loss table to:\r\n" +
+           f"****    {path}" )
+    return table
+
+def loss_histogram( table, num_elements=0 ):
+    # Number of lost particles per element ( elemid ) resp. per turn
+    elem_histogram = np.bincount( table[ "elemid" ], minlength=num_elements )
+    turn_histogram = np.bincount( table[ "turn" ] )
+    return elem_histogram, turn_histogram
+
+def write_loss_map( output_path, num_elements, stages ):
+    # Collects the loss tables of the given stages into one artefact per
+    # scenario. Tables of stages which are no longer configured may still be
+    # around in output_path and are ignored. "losses" / "histogram" refer to
+    # the most complete stage ( until_turn if available )
+    arrays = dict()
+    for stage, file_name in LOSS_TABLE_FILE_NAMES.items():
+        if stage not in stages:
+            continue
+        path = os.path.join( output_path, file_name )
+        if not os.path.isfile( path ):
+            continue
+        table = np.load( path, allow_pickle=False )
+        assert table.dtype == LOSS_TABLE_DTYPE
+        elem_histogram, turn_histogram = loss_histogram( table, num_elements )
+        arrays[ f"{stage}/losses" ] = table
+        arrays[ f"{stage}/histogram" ] = elem_histogram
+        arrays[ f"{stage}/turn_histogram" ] = turn_histogram
+        arrays[ "losses" ] = table
+        arrays[ "histogram" ] = elem_histogram
+        arrays[ "turn_histogram" ] = turn_histogram
+    if len( arrays ) == 0:
+        return None
+    path_loss_map = os.path.join( output_path, LOSS_MAP_FILE_NAME )
+    with open( path_loss_map, "wb" ) as f_out:
+        np.savez( f_out, **arrays )
+    print( "**** -> Generated loss map at:\r\n" +
+          f"****    {path_loss_map}" )
+    return path_loss_map
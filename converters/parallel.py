@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import collections
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from .tracking import DEFAULT_BATCHED_TRACKING
+from .tracking import track_bunch_until_turn
+from .tracking import track_particle_until_turn
+from .tracking import track_bunch_elem_by_elem
+
+# The line is shipped once per worker process via the pool initializer
+# instead of once per submitted slice. The pool is kept for later calls with
+# the same line, e.g. the checkpoint segments of until_turn and the element
+# chunks of elem-by-elem, and only replaced if the line changes or more
+# workers are needed. ScenarioContext.stage() shuts it down after every stage
+_worker_line = None
+_pool = None
+_pool_num_workers = 0
+_pool_line = None
+_pool_line_digest = None
+
+def _init_worker( line ):
+    global _worker_line
+    _worker_line = line
+
+def _run_in_worker( fn, *args ):
+    return fn( _worker_line, *args )
+
+def _line_digest( line ):
+    return hashlib.sha256( pickle.dumps( list( line ), protocol=4 ) ).digest()
+
+def _get_pool( line, num_workers ):
+    global _pool, _pool_num_workers, _pool_line, _pool_line_digest
+    if _pool is not None and _pool_line is not line:
+        digest = _line_digest( line )
+        if digest != _pool_line_digest:
+            shutdown_pool()
+        else:
+            _pool_line = line
+    if _pool is not None and _pool_num_workers < num_workers:
+        shutdown_pool()
+    if _pool is None:
+        _pool = ProcessPoolExecutor( max_workers=num_workers,
+            initializer=_init_worker, initargs=( list( line ), ) )
+        _pool_num_workers = num_workers
+        _pool_line = line
+        _pool_line_digest = _line_digest( line )
+    return _pool
+
+def shutdown_pool():
+    global _pool, _pool_num_workers, _pool_line, _pool_line_digest
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_num_workers = 0
+    _pool_line = None
+    _pool_line_digest = None
+
+atexit.register( shutdown_pool )
+
+def get_num_workers( conf=dict() ):
+    num_workers = conf.get( 'num_workers', None )
+    if num_workers is None or num_workers <= 0:
+        num_workers = os.cpu_count() or 1
+    return int( num_workers )
+
+def split_into_slices( num_particles, num_slices, max_slice_size=None ):
+    assert num_particles >= 0
+    if max_slice_size is not None and max_slice_size > 0:
+        num_slices = max( num_slices,
+            ( num_particles + max_slice_size - 1 ) // max_slice_size )
+    num_slices = max( min( num_slices, num_particles ), 1 )
+    chunk_size, remainder = divmod( num_particles, num_slices )
+    slices = []
+    begin = 0
+    for ii in range( num_slices ):
+        end = begin + chunk_size + ( 1 if ii < remainder else 0 )
+        slices.append( ( begin, end ) )
+        begin = end
+    assert begin == num_particles
+    return slices
+
+def _track_slice_until_turn( line, particles, until_turn, start_at_element,
+    batched ):
+    if batched:
+        return track_bunch_until_turn( particles, line, until_turn,
+            start_at_element=start_at_element )
+    for in_p in particles:
+        track_particle_until_turn( in_p, line, until_turn,
+            start_at_element=start_at_element )
+    return particles
+
+def _track_slice_elem_by_elem( line, particles, start_at_element,
+    begin_element, end_element ):
+    snapshots = []
+    def store_snapshot( jj, bunch, bunch_index ):
+        snapshots.append( ( jj, bunch.copy(), bunch_index.copy() ) )
+    out_particles, num_snapshots = track_bunch_elem_by_elem( particles,
+        line, start_at_element=start_at_element,
+        snapshot_fn=store_snapshot, begin_element=begin_element,
+        end_element=end_element )
+    return snapshots, out_particles, num_snapshots
+
+def _iter_slices( line, particles, num_workers, fn, *args,
+    max_slice_size=None ):
+    slices = split_into_slices( len( particles ), num_workers, max_slice_size )
+    num_workers = min( num_workers, len( slices ) )
+    if num_workers <= 1:
+        # A single worker gains nothing from a pool -> track in this process
+        for begin, end in slices:
+            yield begin, end, fn( list( line ), particles[ begin:end ], *args )
+        return
+    print( f"****    Info :: tracking {len( particles )} particles " +
+           f"in {len( slices )} slices using {num_workers} workers" )
+    # Only a bounded number of slices is in flight at any time so that the
+    # results of finished slices don't pile up while earlier ones are pending
+    max_in_flight = 2 * num_workers
+    pool = _get_pool( line, num_workers )
+    pending = collections.deque()
+    next_slice = 0
+    while next_slice < len( slices ) or len( pending ) > 0:
+        while next_slice < len( slices ) and len( pending ) < max_in_flight:
+            begin, end = slices[ next_slice ]
+            pending.append( ( begin, end, pool.submit( _run_in_worker,
+                fn, particles[ begin:end ], *args ) ) )
+            next_slice += 1
+        # Yield the slices in submission order -> deterministic result
+        # regardless of which worker finished first
+        begin, end, future = pending.popleft()
+        yield begin, end, future.result()
+
+def _run_sliced( line, particles, num_workers, fn, *args ):
+    results = []
+    for begin, end, slice_result in _iter_slices(
+            line, particles, num_workers, fn, *args ):
+        assert len( slice_result ) == end - begin
+        results.extend( slice_result )
+    assert len( results ) == len( particles )
+    return results
+
+def track_until_turn_parallel( particles, line, until_turn,
+    start_at_element=0, num_workers=None, batched=DEFAULT_BATCHED_TRACKING ):
+    if num_workers is None:
+        num_workers = get_num_workers()
+    return _run_sliced( line, particles, num_workers,
+        _track_slice_until_turn, until_turn, start_at_element, batched )
+
+def track_elem_by_elem_parallel( particles, line, start_at_element=0,
+    num_workers=None, max_slice_size=None, begin_element=0, end_element=None ):
+    # Returns an iterator over ( begin, end, ( snapshots, out_particles,
+    # num_snapshots ) ) per slice of particles; snapshots holds the
+    # ( jj, bunch, bunch_index ) tuples of track_bunch_elem_by_elem for the
+    # elements [ begin_element, end_element ). The snapshots of a slice can
+    # be written out and dropped before the snapshots of later slices arrive
+    if num_workers is None:
+        num_workers = get_num_workers()
+    return _iter_slices( line, particles, num_workers,
+        _track_slice_elem_by_elem, start_at_element, begin_element,
+        end_element, max_slice_size=max_slice_size )
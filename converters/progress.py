@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+DEFAULT_PROGRESS_INTERVAL = 5.0
+
+def format_duration( seconds ):
+    seconds = int( round( seconds ) )
+    hours, seconds = divmod( seconds, 3600 )
+    minutes, seconds = divmod( seconds, 60 )
+    if hours > 0:
+        return f"{hours:d}h{minutes:02d}m{seconds:02d}s"
+    return f"{minutes:d}m{seconds:02d}s"
+
+class ProgressReporter( object ):
+    # Prints the progress at most once every min_interval seconds (and once
+    # at the end) instead of once per unit of work
+    def __init__( self, total, label="particles",
+                  min_interval=DEFAULT_PROGRESS_INTERVAL, num_done=0 ):
+        assert total >= 0
+        self.total = total
+        self.label = label
+        self.min_interval = min_interval
+        self.num_done = num_done
+        self._num_initial = num_done
+        self._start = time.perf_counter()
+        self._last_report = self._start
+        self._num_reported = num_done
+
+    def update( self, num_done=1 ):
+        self.num_done += num_done
+        now = time.perf_counter()
+        if now - self._last_report >= self.min_interval or \
+            self.num_done >= self.total:
+            self._report( now )
+
+    def finish( self ):
+        if self._num_reported != self.num_done:
+            self._report( time.perf_counter() )
+
+    def _report( self, now ):
+        elapsed = now - self._start
+        rate = ( self.num_done - self._num_initial ) / elapsed \
+            if elapsed > 0 else 0.0
+        percent = 100.0 * self.num_done / self.total if self.total > 0 \
+            else 100.0
+        if self.num_done >= self.total:
+            eta = f"done in {format_duration( elapsed )}"
+        elif rate > 0:
+            eta = "ETA " + format_duration(
+                ( self.total - self.num_done ) / rate )
+        else:
+            eta = "ETA unknown"
+        print( f"****    Info :: {self.label} {self.num_done:d}/" +
+               f"{self.total:d} ({percent:5.1f}%) {rate:12.1f}/s {eta}",
+               flush=True )
+        self._last_report = now
+        self._num_reported = self.num_done
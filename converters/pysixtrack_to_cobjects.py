@@ -3,263 +3,330 @@ import pysixtrack  as pysix
 import numpy as np
 from scipy.special import factorial
 
-def calc_cbuffer_params_for_pysix_line( line, slot_size=None, conf=dict() ):
-    assert isinstance( line, pysix.Line )
+# Precomputed 1/n! factors for the multipole coefficients; grown on demand
+FACTORIAL_TABLE = factorial( np.arange( 32 ) )
+
+def get_factorial_table( length ):
+    global FACTORIAL_TABLE
+    if length > len( FACTORIAL_TABLE ):
+        FACTORIAL_TABLE = factorial( np.arange( max(
+            length, 2 * len( FACTORIAL_TABLE ) ) ) )
+    return FACTORIAL_TABLE[ :length ]
+
+def _multipole_bal( elem, conf_key, conf=dict() ):
+    knl_length = len( elem.knl ) if elem.knl is not None else 0
+    ksl_length = len( elem.ksl ) if elem.ksl is not None else 0
+    bal_length = 2 * max( knl_length, ksl_length )
+    if bal_length < 2:
+        raise ValueError( "bal_length < 2" )
+    max_order  = ( bal_length - 2 ) // 2
+    assert max_order >= 0
+    max_order += max( conf.get( conf_key, 0 ), 0 )
+    bal = np.zeros( bal_length, dtype=np.float64 )
+    if knl_length > 0:
+        bal[ 0:2 * knl_length:2 ] = np.asarray( elem.knl, dtype=np.float64 ) / \
+            get_factorial_table( knl_length )
+    if ksl_length > 0:
+        bal[ 1:2 * ksl_length:2 ] = np.asarray( elem.ksl, dtype=np.float64 ) / \
+            get_factorial_table( ksl_length )
+    return max_order, bal
+
+# Each entry maps a pysixtrack element to a tuple
+# ( cobjects type, order for sizing or None, constructor args or None );
+# entries without constructor args are sized but not created.
+
+def _plan_drift( elem, conf=dict() ):
+    if conf.get( 'always_use_drift_exact', False ):
+        return st.st_DriftExact, None, ( elem.length, )
+    return st.st_Drift, None, ( elem.length, )
+
+def _plan_drift_exact( elem, conf=dict() ):
+    return st.st_DriftExact, None, ( elem.length, )
+
+def _plan_dipole_edge( elem, conf=dict() ):
+    return st.st_DipoleEdge, None, ( elem.h, elem.e1, elem.hgap, elem.fint )
+
+def _plan_cavity( elem, conf=dict() ):
+    return st.st_Cavity, None, ( elem.voltage, elem.frequency, elem.lag )
+
+def _plan_multipole( elem, conf=dict() ):
+    max_order, bal = _multipole_bal( elem, 'multipole_add_max_order', conf )
+    return st.st_Multipole, max_order, ( elem.length, elem.hxl, elem.hyl, bal )
+
+def _plan_limit_rect( elem, conf=dict() ):
+    return st.st_LimitRect, None, (
+        elem.min_x, elem.max_x, elem.min_y, elem.max_y )
+
+def _plan_limit_ellipse( elem, conf=dict() ):
+    return st.st_LimitEllipse, None, ( elem.a * elem.a, elem.b * elem.b )
+
+def _plan_limit_rect_ellipse( elem, conf=dict() ):
+    return st.st_LimitRectEllipse, None, (
+        elem.max_x, elem.max_y, elem.a * elem.a, elem.b * elem.b )
+
+def _plan_rf_multipole( elem, conf=dict() ):
+    knl_length = len( elem.knl ) if elem.knl is not None else 0
+    ksl_length = len( elem.ksl ) if elem.ksl is not None else 0
+    pn_length  = len( elem.pn, ) if elem.pn  is not None else 0
+    ps_length  = len( elem.ps, ) if elem.ps  is not None else 0
+    assert pn_length == knl_length
+    assert ps_length == ksl_length
+    max_order, bal = _multipole_bal( elem, 'rf_multipole_add_max_order', conf )
+    # NOTE: RFMultipoles are accounted for in the buffer size but there is no
+    #       conversion to st_RFMultipole yet
+    return st.st_RFMultipole, max_order, None
+
+def _plan_srotation( elem, conf=dict() ):
+    angle_rad = elem.angle * np.pi / np.float64( 180.0 )
+    return st.st_SRotation, None, ( angle_rad, )
+
+def _plan_xy_shift( elem, conf=dict() ):
+    return st.st_XYShift, None, ( elem.dx, elem.dy )
+
+def _plan_sc_coasting( elem, conf=dict() ):
+    return st.st_SCCoasting, None, ( elem.number_of_particles,
+        elem.circumference, elem.sigma_x, elem.sigma_y, elem.length,
+        elem.x_co, elem.y_co, elem.min_sigma_diff, elem.enabled )
+
+def _plan_sc_qgauss_profile( elem, conf=dict() ):
+    return st.st_SCQGaussProfile, None, ( elem.number_of_particles,
+        elem.bunchlength_rms, elem.sigma_x, elem.sigma_y, elem.length,
+        elem.x_co, elem.y_co, elem.min_sigma_diff, elem.q_parameter,
+        elem.enabled )
+
+ELEMENT_PLANNERS = {
+    pysix.elements.Drift: _plan_drift,
+    pysix.elements.DriftExact: _plan_drift_exact,
+    pysix.elements.DipoleEdge: _plan_dipole_edge,
+    pysix.elements.Cavity: _plan_cavity,
+    pysix.elements.Multipole: _plan_multipole,
+    pysix.elements.LimitRect: _plan_limit_rect,
+    pysix.elements.LimitEllipse: _plan_limit_ellipse,
+    pysix.elements.LimitRectEllipse: _plan_limit_rect_ellipse,
+    pysix.elements.RFMultipole: _plan_rf_multipole,
+    pysix.elements.SRotation: _plan_srotation,
+    pysix.elements.XYShift: _plan_xy_shift,
+    pysix.be_beamfields.spacecharge.SCCoasting: _plan_sc_coasting,
+    pysix.be_beamfields.spacecharge.SCQGaussProfile: _plan_sc_qgauss_profile, }
+
+def get_element_planner( elem_type ):
+    if elem_type not in ELEMENT_PLANNERS:
+        # Subclasses are converted like their nearest registered base class
+        planner = None
+        for base_type in elem_type.__mro__[ 1: ]:
+            if base_type in ELEMENT_PLANNERS:
+                planner = ELEMENT_PLANNERS[ base_type ]
+                break
+        ELEMENT_PLANNERS[ elem_type ] = planner
+    return ELEMENT_PLANNERS[ elem_type ]
+
+def plan_pysix_elements( elements, slot_size=None, conf=dict() ):
+    # Per element: the plan entry ( cobjects type, constructor args ) or None
+    # and the number of slots, objects and pointers it requires
     if slot_size is None:
         slot_size = st.CBufferView.DEFAULT_SLOT_SIZE
-    n_slots = 0
-    n_objects = 0
-    n_pointers = 0
-    for ii, elem in enumerate( line.elements ):
-        if isinstance( elem, pysix.elements.Drift ):
-            if conf.get( 'always_use_drift_exact', False ) or \
-                isinstance( elem, pysix.elements.DriftExact ):
-                n_objects += 1
-                n_slots += st.st_DriftExact.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-                n_pointers += st.st_DriftExact.COBJ_NUM_DATAPTRS
-            else:
-                n_objects += 1
-                n_slots += st.st_Drift.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-                n_pointers += st.st_Drift.COBJ_NUM_DATAPTRS
-
+    entries = []
+    sizes = np.zeros( ( len( elements ), 3 ), dtype=np.int64 )
+    slots_per_object = dict()
+    for ii, elem in enumerate( elements ):
+        planner = get_element_planner( type( elem ) )
+        if planner is None:
+            print( f"element not converted at pos = {ii}: {elem}" )
+            entries.append( None )
             continue
-        assert not isinstance( elem, pysix.elements.Drift )
-
-        if isinstance( elem, pysix.elements.DipoleEdge ):
-            n_objects  += 1
-            n_slots    += st.st_DipoleEdge.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-            n_pointers += st.st_DipoleEdge.COBJ_NUM_DATAPTRS
-        elif isinstance( elem, pysix.elements.Cavity ):
-            n_objects  += 1
-            n_slots    += st.st_Cavity.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-            n_pointers += st.st_Cavity.COBJ_NUM_DATAPTRS
-        elif isinstance( elem, pysix.elements.Multipole ):
-            knl_length = len( elem.knl ) if elem.knl is not None else 0
-            ksl_length = len( elem.ksl ) if elem.ksl is not None else 0
-            bal_length = 2 * max( knl_length, ksl_length )
-            if bal_length < 2:
-                raise ValueError( "bal_length < 2" )
-            max_order  = ( bal_length - 2 ) // 2
-            assert max_order >= 0
-            max_order  += max( conf.get( 'multipole_add_max_order', 0 ), 0 )
-            n_objects  += 1
-            n_pointers += st.st_Multipole.COBJ_NUM_DATAPTRS
-            n_slots += st.st_Multipole.COBJ_REQUIRED_NUM_SLOTS(
-                max_order, slot_size )
-        elif isinstance( elem, pysix.elements.LimitRect ):
-            n_objects += 1
-            n_pointers += st.st_LimitRect.COBJ_NUM_DATAPTRS
-            n_slots += st.st_LimitRect.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-        elif isinstance( elem, pysix.elements.LimitEllipse ):
-            n_objects += 1
-            n_pointers += st.st_LimitEllipse.COBJ_NUM_DATAPTRS
-            n_slots += st.st_LimitEllipse.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-        elif isinstance( elem, pysix.elements.LimitRectEllipse ):
-            n_objects += 1
-            n_pointers += st.st_LimitRectEllipse.COBJ_NUM_DATAPTRS
-            n_slots += st.st_LimitRectEllipse.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-        elif isinstance( elem, pysix.elements.RFMultipole ):
-            knl_length = len( elem.knl ) if elem.knl is not None else 0
-            ksl_length = len( elem.ksl ) if elem.ksl is not None else 0
-            pn_length  = len( elem.pn, ) if elem.pn  is not None else 0
-            ps_length  = len( elem.ps, ) if elem.ps  is not None else 0
-            assert pn_length == knl_length
-            assert ps_length == ksl_length
-            bal_length = 2 * max( knl_length, ksl_length )
-            if bal_length < 2:
-                raise ValueError( "bal_length < 2" )
-            max_order  = ( bal_length - 2 ) // 2
-            assert max_order >= 0
-            max_order  += max( conf.get( 'rf_multipole_add_max_order', 0 ), 0 )
-            n_objects  += 1
-            n_pointers += st.st_RFMultipole.COBJ_NUM_DATAPTRS
-            n_slots += st.st_RFMultipole.COBJ_REQUIRED_NUM_SLOTS(
-                max_order, slot_size )
-        elif isinstance( elem, pysix.elements.SRotation ):
-            n_objects += 1
-            n_pointers += st.st_SRotation.COBJ_NUM_DATAPTRS
-            n_slots += st.st_SRotation.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-        elif isinstance( elem, pysix.elements.XYShift ):
-            n_objects += 1
-            n_pointers += st.st_XYShift.COBJ_NUM_DATAPTRS
-            n_slots += st.st_XYShift.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-        elif isinstance( elem, pysix.be_beamfields.spacecharge.SCCoasting ):
-            n_objects += 1
-            n_pointers += st.st_SCCoasting.COBJ_NUM_DATAPTRS
-            n_slots += st.st_SCCoasting.COBJ_REQUIRED_NUM_SLOTS( slot_size )
-        elif isinstance( elem, pysix.be_beamfields.spacecharge.SCQGaussProfile ):
-            n_objects += 1
-            n_pointers += st.st_SCQGaussProfile.COBJ_NUM_DATAPTRS
-            n_slots += st.st_SCQGaussProfile.COBJ_REQUIRED_NUM_SLOTS( slot_size )
+        cobj_type, order, args = planner( elem, conf )
+        key = ( cobj_type, order )
+        if key not in slots_per_object:
+            if order is None:
+                slots_per_object[ key ] = cobj_type.COBJ_REQUIRED_NUM_SLOTS(
+                    slot_size )
+            else:
+                slots_per_object[ key ] = cobj_type.COBJ_REQUIRED_NUM_SLOTS(
+                    order, slot_size )
+        sizes[ ii ] = ( slots_per_object[ key ], 1,
+                        cobj_type.COBJ_NUM_DATAPTRS )
+        if args is not None:
+            entries.append( ( cobj_type, args ) )
         else:
-            print( f"element not converted at pos = {ii}: {elem}" )
-    return n_slots, n_objects, n_pointers
+            print( f"element at position {ii} in line not converted: {elem}" )
+            entries.append( None )
+    return entries, sizes
 
-def pysix_line_to_cbuffer( line, cbuffer, conf=dict() ):
-    assert isinstance( cbuffer, st.CBufferView )
+def plan_pysix_line_conversion( line, slot_size=None, conf=dict() ):
     assert isinstance( line, pysix.Line )
-    for elem in line.elements:
-        if isinstance( elem, pysix.elements.Drift ):
-            if conf.get( 'always_use_drift_exact', False ) or \
-                isinstance( elem, pysix.elements.DriftExact ):
-                cobj_elem = st.st_DriftExact( cbuffer, elem.length )
-            else:
-                cobj_elem = st.st_Drift( cbuffer, elem.length )
-            continue
+    entries, sizes = plan_pysix_elements(
+        line.elements, slot_size=slot_size, conf=conf )
+    plan = [ entry for entry in entries if entry is not None ]
+    n_slots, n_objects, n_pointers = ( int( n ) for n in sizes.sum( axis=0 ) )
+    return plan, ( n_slots, n_objects, n_pointers )
 
-        assert not isinstance( elem, pysix.elements.Drift )
-
-        if isinstance( elem, pysix.elements.DipoleEdge ):
-            cobj_elem = st.st_DipoleEdge(
-                cbuffer, elem.h, elem.e1, elem.hgap, elem.fint )
-        elif isinstance( elem, pysix.elements.Cavity ):
-            cobj_elem = st.st_Cavity(
-                cbuffer, elem.voltage, elem.frequency, elem.lag )
-        elif isinstance( elem, pysix.elements.LimitRect ):
-            cobj_elem = st.st_LimitRect(
-                cbuffer, elem.min_x, elem.max_x, elem.min_y, elem.max_y )
-        elif isinstance( elem, pysix.elements.LimitEllipse ):
-            cobj_elem = st.st_LimitEllipse(
-                cbuffer, elem.a * elem.a, elem.b * elem.b )
-        elif isinstance( elem, pysix.elements.LimitRectEllipse ):
-            cobj_elem = st.st_LimitRectEllipse( cbuffer, elem.max_x, elem.max_y,
-                elem.a * elem.a, elem.b * elem.b )
-        elif isinstance( elem, pysix.elements.Multipole ):
-            knl_length = len( elem.knl ) if elem.knl is not None else 0
-            ksl_length = len( elem.ksl ) if elem.ksl is not None else 0
-            bal_length = 2 * max( knl_length, ksl_length )
-            if bal_length < 2:
-                raise ValueError( "bal_length < 2" )
-
-            max_order  = ( bal_length - 2 ) // 2
-            assert max_order >= 0
-            max_order += max( conf.get( 'multipole_add_max_order', 0 ), 0 )
-            bal = np.zeros( bal_length, dtype=np.float64 )
-            if knl_length > 0:
-                for ii, knl_value in enumerate( elem.knl ):
-                    bal[ 2 * ii ] = knl_value / factorial( ii )
-            if ksl_length > 0:
-                for ii, ksl_value in enumerate( elem.ksl ):
-                    bal[ 2 * ii + 1 ] = ksl_value / factorial( ii )
-            cobj_elem = st.st_Multipole(
-                cbuffer, elem.length, elem.hxl, elem.hyl, bal )
-        elif isinstance( elem, pysix.elements.SRotation ):
-            angle_rad = elem.angle * np.pi / np.float64( 180.0 )
-            cobj_elem = st.st_SRotation( cbuffer, angle_rad )
-        elif isinstance( elem, pysix.elements.XYShift ):
-            cobj_elem = st.st_XYShift( cbuffer, elem.dx, elem.dy )
-        elif isinstance( elem, pysix.be_beamfields.spacecharge.SCCoasting ):
-            cobj_elem = st.st_SCCoasting( cbuffer, elem.number_of_particles,
-                elem.circumference, elem.sigma_x, elem.sigma_y, elem.length,
-                    elem.x_co, elem.y_co, elem.min_sigma_diff, elem.enabled )
-        elif isinstance( elem, pysix.be_beamfields.spacecharge.SCQGaussProfile ):
-            cobj_elem = st.st_SCQGaussProfile( cbuffer, elem.number_of_particles,
-                elem.bunchlength_rms, elem.sigma_x, elem.sigma_y, elem.length,
-                    elem.x_co, elem.y_co, elem.min_sigma_diff, elem.q_parameter,
-                        elem.enabled )
-        else:
-            print( f"element at position {ii} in line not converted: {elem}" )
+def calc_cbuffer_params_for_pysix_line( line, slot_size=None, conf=dict() ):
+    _, params = plan_pysix_line_conversion(
+        line, slot_size=slot_size, conf=conf )
+    return params
+
+def pysix_line_to_cbuffer( line, cbuffer, conf=dict(), plan=None ):
+    assert isinstance( cbuffer, st.CBufferView )
+    if plan is None:
+        plan, _ = plan_pysix_line_conversion( line, conf=conf )
+    for cobj_type, args in plan:
+        cobj_type( cbuffer, *args )
     return
 
-def pysix_particle_to_pset( in_p, pset, index, state=None, at_element=None,
-    at_turn=None, particle_id=None, conf=dict() ):
-    assert isinstance( in_p, pysix.Particles )
+def lattice_conversion_conf( conf=dict() ):
+    # The lattice objects are created without always_use_drift_exact, i.e.
+    # plain drifts stay st_Drift ( as in the shipped lattices ); the other
+    # keys, e.g. the additional multipole orders, apply
+    if not conf.get( 'always_use_drift_exact', False ):
+        return conf
+    conf = dict( conf )
+    conf[ 'always_use_drift_exact' ] = False
+    return conf
+
+def pysix_line_to_new_cbuffer( line, slot_size=None, conf=dict(),
+    plan=None, params=None ):
+    # plan and params can be passed in if they are already known, e.g. for
+    # a transformed line ( see lattice.transform_line )
+    if slot_size is None:
+        slot_size = st.CBufferView.DEFAULT_SLOT_SIZE
+    if plan is None or params is None:
+        plan, params = plan_pysix_line_conversion( line, slot_size=slot_size,
+            conf=lattice_conversion_conf( conf ) )
+    n_slots, n_objs, n_ptrs = params
+    cbuffer = st.CBuffer( n_slots, n_objs, n_ptrs, 0, slot_size )
+    pysix_line_to_cbuffer( line, cbuffer, plan=plan )
+    return cbuffer
+
+PSET_COLUMNS = ( "q0", "mass0", "beta0", "gamma0", "p0c", "x", "y", "px", "py",
+    "zeta", "delta", "chi", "qratio", "s" )
+PSET_INT_COLUMNS = ( "partid", "state", "elemid", "turn" )
+PSET_CHECK_COLUMNS = ( "rpp", "rvv", "psigma" )
+
+def pysix_particles_to_columns( particles, num_particles=None ):
+    if isinstance( particles, pysix.Particles ):
+        get_value = lambda key: getattr( particles, key, None )
+    else:
+        assert isinstance( particles, dict )
+        get_value = lambda key: particles.get( key, None )
+    if num_particles is None:
+        num_particles = int( np.size( get_value( "x" ) ) )
+    columns = dict()
+    for key in PSET_COLUMNS + PSET_CHECK_COLUMNS:
+        value = get_value( key )
+        if value is not None:
+            columns[ key ] = np.broadcast_to(
+                np.asarray( value, dtype=np.float64 ), num_particles )
+    for key in PSET_INT_COLUMNS:
+        value = get_value( key )
+        if value is not None:
+            columns[ key ] = np.broadcast_to(
+                np.asarray( value, dtype=np.int64 ), num_particles )
+    return columns
+
+def pysix_particles_to_pset( particles, pset, begin=0, num_particles=None,
+    indices=None, single_particle_buffer=None, conf=dict() ):
+    # particles is either an array-valued pysix.Particles instance or a dict
+    # of numpy columns. They are written to [ begin, begin + num_particles )
+    # or, if given, to the explicit indices. If single_particle_buffer is
+    # given, the same particles are written to the st_SingleParticle objects
+    # at these indices in the same pass. st_Particles only provides per
+    # particle setters, the columns are therefore converted to python lists
+    # once and written in a single loop
     assert isinstance( pset, st.st_Particles )
-    assert index < pset.num_particles
-    if particle_id is None:
-        if in_p.partid is not None:
-            particle_id = in_p.partid
-        else:
-            particle_id = index
-    if state is None:
-        if in_p.state is not None:
-            state = in_p.state
-        else:
-            state = 1
-    if at_element is None:
-        if in_p.elemid is not None:
-            at_element = in_p.elemid
-        else:
-            at_element = 0
-    if at_turn is None:
-        if in_p.turn is not None:
-            at_turn = in_p.turn
-        else:
-            at_turn = 0
-    pset.set_charge0( index, in_p.q0 )
-    pset.set_mass0( index, in_p.mass0 )
-    pset.set_beta0( index, in_p.beta0 )
-    pset.set_gamma0( index, in_p.gamma0 )
-    pset.set_p0c( index, in_p.p0c )
-    pset.set_x( index, in_p.x  )
-    pset.set_y( index, in_p.y )
-    pset.set_px( index, in_p.px )
-    pset.set_py( index, in_p.py )
-    pset.set_zeta( index, in_p.zeta )
+    columns = pysix_particles_to_columns( particles, num_particles )
+    num_particles = len( columns[ "x" ] )
+    for key in PSET_COLUMNS:
+        assert key in columns
 
-    EPS = np.float64( 1e-12 )
-    pset.update_delta( index, in_p.delta )
-    assert np.allclose( pset.rpp( index ), in_p.rpp, EPS, EPS )
-    assert np.allclose( pset.rvv( index ), in_p.rvv, EPS, EPS )
-    assert np.allclose( pset.psigma( index ), in_p.psigma, EPS, EPS )
-
-    pset.set_state( index, state )
-    pset.set_at_element( index, at_element )
-    pset.set_at_turn( index, at_turn )
-    pset.set_id( index, particle_id )
-    pset.set_chi( index, in_p.chi )
-    pset.set_charge_ratio( index, in_p.qratio )
-    pset.set_s( index, in_p.s )
-
-
-def pysix_particle_to_single_particle( in_p, p, state=None, at_element=None,
-    at_turn=None, particle_id=None, conf=dict() ):
-    assert isinstance( in_p, pysix.Particles )
-    assert isinstance( p, st.st_SingleParticle )
-    if particle_id is None:
-        if in_p.partid is not None:
-            particle_id = in_p.partid
-        else:
-            raise ValueError( "particle_id requires proper value" )
-    if state is None:
-        if in_p.state is not None:
-            state = in_p.state
-        else:
-            state = 1
-    if at_element is None:
-        if in_p.elemid is not None:
-            at_element = in_p.elemid
-        else:
-            at_element = 0
-    if at_turn is None:
-        if in_p.turn is not None:
-            at_turn = in_p.turn
-        else:
-            at_turn = 0
+    if indices is None:
+        assert begin + num_particles <= pset.num_particles
+        indices = range( begin, begin + num_particles )
+    else:
+        indices = np.asarray( indices, dtype=np.int64 ).tolist()
+        assert len( indices ) == num_particles
+        assert num_particles == 0 or max( indices ) < pset.num_particles
+    if "partid" in columns:
+        particle_ids = columns[ "partid" ].tolist()
+    else:
+        particle_ids = list( indices )
+    states = columns[ "state" ].tolist() if "state" in columns \
+        else [ 1 ] * num_particles
+    at_elements = columns[ "elemid" ].tolist() if "elemid" in columns \
+        else [ 0 ] * num_particles
+    at_turns = columns[ "turn" ].tolist() if "turn" in columns \
+        else [ 0 ] * num_particles
 
-    p.charge0 = in_p.q0
-    p.mass0   = in_p.mass0
-    p.beta0   = in_p.beta0
-    p.gamma0  = in_p.gamma0
-    p.p0c     = in_p.p0c
+    values = [ columns[ key ].tolist() for key in PSET_COLUMNS ]
+    rpp = np.empty( num_particles, dtype=np.float64 )
+    rvv = np.empty( num_particles, dtype=np.float64 )
+    psigma = np.empty( num_particles, dtype=np.float64 )
 
-    p.x       = in_p.x
-    p.y       = in_p.y
-    p.px      = in_p.px
-    p.py      = in_p.py
-    p.zeta    = in_p.zeta
+    if single_particle_buffer is not None:
+        assert num_particles == 0 or \
+            max( indices ) < single_particle_buffer.num_objects
+        single_rpp = np.empty( num_particles, dtype=np.float64 )
+        single_rvv = np.empty( num_particles, dtype=np.float64 )
+        single_psigma = np.empty( num_particles, dtype=np.float64 )
 
-    EPS = np.float64( 1e-12 )
-    p.update_delta( in_p.delta )
-    assert np.allclose( p.rpp, in_p.rpp, EPS, EPS )
-    assert np.allclose( p.rvv, in_p.rvv, EPS, EPS )
-    assert np.allclose( p.psigma, in_p.psigma, EPS, EPS )
-
-    p.state        = state
-    p.at_element   = at_element
-    p.at_turn      = at_turn
-    p.id           = particle_id
-    p.chi          = in_p.chi
-    p.charge_ratio = in_p.qratio
-    p.s            = in_p.s
+    for ii, index in enumerate( indices ):
+        q0, mass0, beta0, gamma0, p0c, x, y, px, py, zeta, delta, chi, \
+            qratio, s = [ column[ ii ] for column in values ]
+        if single_particle_buffer is not None:
+            p = st.st_SingleParticle.GET( single_particle_buffer, index )
+            p.charge0 = q0
+            p.mass0   = mass0
+            p.beta0   = beta0
+            p.gamma0  = gamma0
+            p.p0c     = p0c
+            p.x       = x
+            p.y       = y
+            p.px      = px
+            p.py      = py
+            p.zeta    = zeta
+            p.update_delta( delta )
+            single_rpp[ ii ] = p.rpp
+            single_rvv[ ii ] = p.rvv
+            single_psigma[ ii ] = p.psigma
+            p.state        = states[ ii ]
+            p.at_element   = at_elements[ ii ]
+            p.at_turn      = at_turns[ ii ]
+            p.id           = particle_ids[ ii ]
+            p.chi          = chi
+            p.charge_ratio = qratio
+            p.s            = s
+        pset.set_charge0( index, q0 )
+        pset.set_mass0( index, mass0 )
+        pset.set_beta0( index, beta0 )
+        pset.set_gamma0( index, gamma0 )
+        pset.set_p0c( index, p0c )
+        pset.set_x( index, x )
+        pset.set_y( index, y )
+        pset.set_px( index, px )
+        pset.set_py( index, py )
+        pset.set_zeta( index, zeta )
+        pset.update_delta( index, delta )
+        rpp[ ii ] = pset.rpp( index )
+        rvv[ ii ] = pset.rvv( index )
+        psigma[ ii ] = pset.psigma( index )
+        pset.set_state( index, states[ ii ] )
+        pset.set_at_element( index, at_elements[ ii ] )
+        pset.set_at_turn( index, at_turns[ ii ] )
+        pset.set_id( index, particle_ids[ ii ] )
+        pset.set_chi( index, chi )
+        pset.set_charge_ratio( index, qratio )
+        pset.set_s( index, s )
 
+    EPS = np.float64( 1e-12 )
+    if "rpp" in columns:
+        assert np.allclose( rpp, columns[ "rpp" ], EPS, EPS )
+    if "rvv" in columns:
+        assert np.allclose( rvv, columns[ "rvv" ], EPS, EPS )
+    if "psigma" in columns:
+        assert np.allclose( psigma, columns[ "psigma" ], EPS, EPS )
+    if single_particle_buffer is not None:
+        if "rpp" in columns:
+            assert np.allclose( single_rpp, columns[ "rpp" ], EPS, EPS )
+        if "rvv" in columns:
+            assert np.allclose( single_rvv, columns[ "rvv" ], EPS, EPS )
+        if "psigma" in columns:
+            assert np.allclose( single_psigma, columns[ "psigma" ], EPS, EPS )
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import cProfile
+import json
+import os
+import pickle
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .cache import stage_output_files
+from .columnar import load_particles
+from .columnar import ParticleBlockReader
+from .columnar import DEFAULT_BLOCK_SIZE
+from .lattice import compact_line
+from .parallel import shutdown_pool
+
+REPORT_FILE_NAME = "generation_report.json"
+REPORT_FORMAT_VERSION = 1
+
+def peak_rss_bytes( children=False ):
+    # Peak RSS over the lifetime of this process, or with children=True of
+    # the largest of its terminated and waited for child processes
+    if resource is None:
+        return None
+    max_rss = resource.getrusage( resource.RUSAGE_CHILDREN if children
+                                  else resource.RUSAGE_SELF ).ru_maxrss
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+def children_cpu_time():
+    # CPU time of the terminated and waited for child processes
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage( resource.RUSAGE_CHILDREN )
+    return usage.ru_utime + usage.ru_stime
+
+class ScenarioContext( object ):
+    def __init__( self, input_path, output_path, conf=dict() ):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.conf = conf
+        self.timings = dict()
+        self.stats = dict()
+        self._data = dict()
+        self._nested_times = []
+
+    @contextlib.contextmanager
+    def timer( self, name ):
+        # Timings are exclusive: time spent in a nested timer (e.g. lazily
+        # parsing the input from within a stage) is only accounted once.
+        # cpu_time is the CPU time of this process, children_cpu_time the one
+        # of the child processes which terminated in the meantime (i.e. the
+        # tracking workers, see stage()). The peak RSS values are lifetime
+        # peaks; peak_rss_increase_bytes is how much the timed code raised
+        # the peak of this process
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        start_children_cpu = children_cpu_time()
+        start_peak_rss = peak_rss_bytes()
+        self._nested_times.append( [ 0.0, 0.0, 0.0 ] )
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            elapsed_cpu = time.process_time() - start_cpu
+            elapsed_children_cpu = children_cpu_time() - start_children_cpu
+            nested, nested_cpu, nested_children_cpu = self._nested_times.pop()
+            self.timings[ name ] = self.timings.get( name, 0.0 ) + \
+                elapsed - nested
+            stats = self.stats.setdefault( name, dict() )
+            stats[ "wall_time" ] = self.timings[ name ]
+            stats[ "cpu_time" ] = stats.get( "cpu_time", 0.0 ) + \
+                elapsed_cpu - nested_cpu
+            stats[ "children_cpu_time" ] = \
+                stats.get( "children_cpu_time", 0.0 ) + \
+                elapsed_children_cpu - nested_children_cpu
+            stats[ "peak_rss_bytes" ] = peak_rss_bytes()
+            if start_peak_rss is not None:
+                stats[ "peak_rss_increase_bytes" ] = \
+                    stats.get( "peak_rss_increase_bytes", 0 ) + \
+                    stats[ "peak_rss_bytes" ] - start_peak_rss
+            stats[ "children_peak_rss_bytes" ] = peak_rss_bytes( children=True )
+            if len( self._nested_times ) > 0:
+                self._nested_times[ -1 ][ 0 ] += elapsed
+                self._nested_times[ -1 ][ 1 ] += elapsed_cpu
+                self._nested_times[ -1 ][ 2 ] += elapsed_children_cpu
+
+    @contextlib.contextmanager
+    def stage( self, stage, num_particles=None, num_elements=None,
+               num_turns=None ):
+        # Timer of a generation stage which additionally records the size of
+        # the stage outputs and the tracking throughput. With conf[ "profile" ]
+        # the stage is run under cProfile and the profile stored next to the
+        # outputs; the profile only covers this process, not the tracking
+        # workers. The worker pool is shut down at the end of the stage so
+        # that the workers are accounted in the children_* stats of the stage
+        name = f"stage {stage}"
+        profiler = cProfile.Profile() if self.conf.get( "profile", False ) \
+            else None
+        with self.timer( name ):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                shutdown_pool()
+        stats = self.stats[ name ]
+        bytes_written = 0
+        for file_name in stage_output_files( stage, self.conf ):
+            path = os.path.join( self.output_path, file_name )
+            if os.path.isfile( path ):
+                bytes_written += os.path.getsize( path )
+        stats[ "bytes_written" ] = bytes_written
+        if num_particles is not None:
+            stats[ "num_particles" ] = num_particles
+        if num_elements is not None:
+            stats[ "num_elements" ] = num_elements
+        if num_particles is not None and num_elements is not None and \
+            num_turns is not None:
+            stats[ "num_turns" ] = num_turns
+            work = num_particles * num_elements * num_turns
+            stats[ "particle_element_turns_per_second" ] = \
+                work / stats[ "wall_time" ] if stats[ "wall_time" ] > 0 \
+                else None
+        if profiler is not None:
+            path_profile = os.path.join(
+                self.output_path, f"profile_{stage}.prof" )
+            profiler.dump_stats( path_profile )
+            stats[ "profile" ] = os.path.basename( path_profile )
+            print( "**** -> Wrote profile of stage to:\r\n" +
+                  f"****    {path_profile}" )
+
+    def get( self, key, loader, timing_name=None ):
+        if key not in self._data:
+            with self.timer( timing_name or f"load {key}" ):
+                self._data[ key ] = loader()
+        return self._data[ key ]
+
+    def set( self, key, value ):
+        self._data[ key ] = value
+
+    def has( self, key ):
+        return key in self._data
+
+    @staticmethod
+    def data_path( path ):
+        # Prefer the columnar .npz variant of a pickle artefact if it exists
+        path_columnar = os.path.splitext( path )[ 0 ] + ".npz"
+        return path_columnar if os.path.isfile( path_columnar ) else path
+
+    def _load_data( self, path, columnar_loader ):
+        path = self.data_path( path )
+        if path.endswith( ".npz" ):
+            data = columnar_loader( path )
+        else:
+            with open( path, "rb" ) as f_in:
+                data = pickle.load( f_in )
+        print( "**** -> Read input data from:\r\n" +
+               f"****    {path}" )
+        return data
+
+    def compacted_line( self, line, barriers=() ):
+        # line after the optional compaction pass ( conf compact_lattice );
+        # the old -> new element index map is kept as lattice_index_map
+        if not self.conf.get( "compact_lattice", False ):
+            return line
+        def compact():
+            compacted, index_map = compact_line( line, barriers )
+            self.set( "lattice_index_map", index_map )
+            return compacted
+        return self.get( "compacted_line", compact, "compact lattice" )
+
+    @property
+    def lattice_index_map( self ):
+        return self._data.get( "lattice_index_map", None )
+
+    def _load_initial_particles( self ):
+        return self._load_data( os.path.join( self.output_path,
+            "pysixtrack_initial_particles.pickle" ), load_particles )
+
+    @property
+    def initial_particles( self ):
+        # The tracking stages modify the particles in place -> hand out copies
+        initial_p_pysix = self.get( "initial_particles",
+            self._load_initial_particles, "read initial particles" )
+        return [ in_p.copy() for in_p in initial_p_pysix ]
+
+    @initial_particles.setter
+    def initial_particles( self, initial_p_pysix ):
+        # Distributions larger than a block are not kept in memory; the
+        # stages read them block by block from the columnar output instead
+        if len( initial_p_pysix ) <= self.particle_block_size:
+            self.set( "initial_particles",
+                      [ in_p.copy() for in_p in initial_p_pysix ] )
+
+    @property
+    def particle_block_size( self ):
+        return self.conf.get( "particle_block_size", DEFAULT_BLOCK_SIZE )
+
+    def _initial_particles_reader( self ):
+        if self.has( "initial_particles" ):
+            return None
+        path = self.data_path( os.path.join( self.output_path,
+            "pysixtrack_initial_particles.pickle" ) )
+        if not path.endswith( ".npz" ):
+            return None
+        return ParticleBlockReader( path, self.particle_block_size )
+
+    def initial_particle_blocks( self ):
+        # Iterable over ( begin, end, particles ) blocks of the initial
+        # particles; the particles are copies and can be modified
+        reader = self._initial_particles_reader()
+        if reader is not None:
+            print( "**** -> Reading initial particles block-wise from:\r\n" +
+                   f"****    {reader.path}" )
+            return reader
+        block_size = self.particle_block_size
+        initial_p_pysix = self.initial_particles
+        return [ ( begin, min( begin + block_size, len( initial_p_pysix ) ),
+                   initial_p_pysix[ begin:begin + block_size ] )
+                 for begin in range( 0, len( initial_p_pysix ), block_size ) ]
+
+    @property
+    def num_initial_particles( self ):
+        reader = self._initial_particles_reader()
+        if reader is not None:
+            return reader.num_particles
+        return len( self.get( "initial_particles",
+            self._load_initial_particles, "read initial particles" ) )
+
+    def print_timings( self ):
+        print(  "**** Timing breakdown:" )
+        for name, wall_time in self.timings.items():
+            print( f"****    {name:<40s} : {wall_time:12.3f} s" )
+
+    def write_report( self, scenario_name=None ):
+        path_report = os.path.join( self.output_path, REPORT_FILE_NAME )
+        report = { "format_version": REPORT_FORMAT_VERSION,
+                   "scenario": scenario_name,
+                   "stats": self.stats }
+        with open( path_report, "w" ) as f_out:
+            json.dump( report, f_out, indent=2 )
+        print( "**** -> Wrote generation report to:\r\n" +
+              f"****    {path_report}" )
+        return path_report
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import numpy as np
+
+# Record layout of the SixTrack DUMP format 101, as used by sixtracktools
+from sixtracktools.sixdump import dump101_t
+
+class SixDump101Reader( object ):
+    def __init__( self, path_to_dump_file ):
+        self.filename = path_to_dump_file
+        if path_to_dump_file.endswith( ".gz" ):
+            with gzip.open( path_to_dump_file, "rb" ) as f_in:
+                self.records = np.frombuffer( f_in.read(), dtype=dump101_t )
+        else:
+            self.records = np.memmap(
+                path_to_dump_file, dtype=dump101_t, mode="r" )
+
+    @property
+    def particles( self ):
+        return self.records
+
+    def __len__( self ):
+        return len( self.records )
+
+    def num_particles_per_sequence( self, num_sequences ):
+        assert num_sequences > 0
+        assert len( self.records ) >= num_sequences
+        assert ( len( self.records ) % num_sequences ) == 0
+        return len( self.records ) // num_sequences
+
+    def sequence( self, index, num_particles ):
+        begin = index * num_particles
+        assert begin + num_particles <= len( self.records )
+        return self.records[ begin:begin + num_particles ]
+
+    def minimal_beam( self, begin=0, end=None ):
+        # Same units and derived quantities as SixDump101Abs.get_minimal_beam,
+        # evaluated column-wise on the selected range of records
+        records = self.records[ begin:end ]
+        p0c = records[ "p0c" ] * 1e6
+        energy0 = records[ "energy0" ] * 1e6
+        beta0 = p0c / energy0
+        rpp = records[ "rpp" ]
+        return {
+            "partid": records[ "partid" ].astype( np.int64 ),
+            "elemid": records[ "elemid" ].astype( np.int64 ),
+            "turn": records[ "turn" ].astype( np.int64 ),
+            "state": np.zeros( len( records ), dtype=np.int64 ),
+            "s": np.array( records[ "s" ] ),
+            "x": records[ "x" ] / 1e3,
+            "px": ( records[ "xp" ] / 1e3 ) / rpp,
+            "y": records[ "y" ] / 1e3,
+            "py": ( records[ "yp" ] / 1e3 ) / rpp,
+            "tau": ( records[ "sigma" ] / 1e3 ) / beta0,
+            "delta": np.array( records[ "delta" ] ),
+            "mass0": np.sqrt( energy0 ** 2 - p0c ** 2 ),
+            "p0c": p0c }
+
+    def sequence_beam( self, index, num_particles ):
+        begin = index * num_particles
+        assert begin + num_particles <= len( self.records )
+        return self.minimal_beam( begin, begin + num_particles )
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numbers
+import operator
+import numpy as np
+
+# Tracking is done using pysixtrack
+import pysixtrack as pysix
+
+# Aperture elements call Particles.remove_lost_particles() when tracking an
+# array-valued bunch. This re-assigns the coordinates through the property
+# setters (delta -> rvv/rpp, p0c -> px/py/delta, ...) and would therefore
+# change the surviving particles compared to tracking them one-by-one.
+# These elements are instead evaluated on a probe which only carries x and y.
+# Losses are not reported while tracking: lost particles keep their state,
+# turn, element and coordinates, see losses.loss_table
+APERTURE_ELEMENTS = (
+    pysix.elements.LimitRect,
+    pysix.elements.LimitEllipse,
+    pysix.elements.LimitRectEllipse, )
+
+PARTICLE_INT_ATTRIBUTES = ( "partid", "state", "elemid", "turn" )
+
+# until_turn tracks all active particles as a single bunch unless
+# batched_tracking = false is set
+DEFAULT_BATCHED_TRACKING = True
+
+# pysixtrack evaluates x ** n for a single particle with the pow() of the C
+# library, whereas numpy squares arrays by a multiplication and has its own
+# vectorised pow for other exponents; the results differ in the last bits.
+# While an element tracks a bunch, its columns are viewed as _ScalarPowArray
+# which evaluates ** element by element like the scalar case -> bunch and
+# particle-by-particle tracking give bit-identical results
+_scalar_pow = np.frompyfunc( operator.pow, 2, 1 )
+
+class _ScalarPowArray( np.ndarray ):
+    def __pow__( self, other ):
+        return _scalar_pow( self.view( np.ndarray ), other ).astype(
+            np.float64 ).view( _ScalarPowArray )
+
+    def __rpow__( self, other ):
+        return _scalar_pow( other, self.view( np.ndarray ) ).astype(
+            np.float64 ).view( _ScalarPowArray )
+
+def _view_columns( bunch, array_type ):
+    for key, value in bunch.__dict__.items():
+        if isinstance( value, np.ndarray ) and value.dtype == np.float64:
+            bunch.__dict__[ key ] = value.view( array_type )
+
+class _ApertureProbe( object ):
+    def __init__( self, bunch ):
+        self.x = bunch.x
+        self.y = bunch.y
+        self.state = np.ones( len( bunch.x ), dtype=np.int64 )
+
+    def remove_lost_particles( self, keep_memory=True ):
+        pass
+
+def _is_stackable( value ):
+    return isinstance( value, ( numbers.Number, np.number ) ) and \
+        not isinstance( value, ( bool, np.bool_ ) )
+
+def particles_to_bunch( particles ):
+    assert len( particles ) > 0
+    for in_p in particles:
+        assert isinstance( in_p, pysix.Particles )
+    # Stack the raw attribute values instead of using the Particles
+    # constructor -> no derived quantity (rpp, rvv, ...) is re-computed
+    bunch = particles[ 0 ].copy()
+    for key, value in particles[ 0 ].__dict__.items():
+        if _is_stackable( value ):
+            bunch.__dict__[ key ] = np.array(
+                [ in_p.__dict__[ key ] for in_p in particles ] )
+    for key in PARTICLE_INT_ATTRIBUTES:
+        bunch.__dict__[ key ] = np.array(
+            [ in_p.__dict__[ key ] for in_p in particles ], dtype=np.int64 )
+    bunch.lost_particles = []
+    return bunch
+
+def bunch_to_particle( bunch, index ):
+    out_p = bunch.copy( index=index )
+    for key in PARTICLE_INT_ATTRIBUTES:
+        out_p.__dict__[ key ] = int( out_p.__dict__[ key ] )
+    out_p.lost_particles = []
+    return out_p
+
+def track_bunch_element( elem, bunch ):
+    if isinstance( elem, APERTURE_ELEMENTS ):
+        probe = _ApertureProbe( bunch )
+        elem.track( probe )
+        is_active = probe.state == 1
+    else:
+        _view_columns( bunch, _ScalarPowArray )
+        try:
+            elem.track( bunch )
+        finally:
+            _view_columns( bunch, np.ndarray )
+        is_active = np.ones( len( bunch.x ), dtype=bool )
+
+    if isinstance( elem, pysix.elements.Drift ):
+        # NOTE: Written as negation of the comparison used by the
+        #       particle-by-particle loops so that NaNs are treated the same way
+        is_active &= ~( ( bunch.x > 1.0 ) | ( bunch.x < -1.0 ) |
+                        ( bunch.y > 1.0 ) | ( bunch.y < -1.0 ) )
+    return is_active
+
+def track_bunch_until_turn( particles, line, until_turn, start_at_element=0 ):
+    num_particles = len( particles )
+    assert num_particles > 0
+    start_at_turn = particles[ 0 ].turn
+    for in_p in particles:
+        assert in_p.turn == start_at_turn
+        assert in_p.state == 1
+
+    out_particles = [ None ] * num_particles
+    bunch = particles_to_bunch( particles )
+    bunch_index = np.arange( num_particles )
+
+    for jj in range( start_at_turn, until_turn ):
+        for kk, elem in enumerate( line ):
+            is_active = track_bunch_element( elem, bunch )
+            if not np.all( is_active ):
+                is_lost = ~is_active
+                lost = bunch.copy( index=is_lost )
+                lost.state[:] = 0
+                for ii, idx in enumerate( bunch_index[ is_lost ] ):
+                    out_particles[ idx ] = bunch_to_particle( lost, ii )
+                bunch = bunch.copy( index=is_active )
+                bunch_index = bunch_index[ is_active ]
+                if len( bunch_index ) == 0:
+                    break
+            bunch.elemid += 1
+        if len( bunch_index ) == 0:
+            break
+        bunch.turn += 1
+        bunch.elemid[:] = start_at_element
+
+    for ii, idx in enumerate( bunch_index ):
+        out_particles[ idx ] = bunch_to_particle( bunch, ii )
+    return out_particles
+
+def track_particle_until_turn( in_p, line, until_turn, start_at_element=0 ):
+    assert isinstance( in_p, pysix.Particles )
+    for jj in range( in_p.turn, until_turn ):
+        for kk, elem in enumerate( line ):
+            assert in_p.turn == jj
+            assert in_p.state == 1
+            elem.track( in_p )
+            if isinstance( elem, pysix.elements.Drift ) and \
+                in_p.state == 1 and \
+                ( in_p.x > 1.0 or in_p.x < -1.0 or
+                  in_p.y > 1.0 or in_p.y < -1.0 ):
+                in_p.state = 0
+
+            if in_p.state == 1:
+                in_p.elemid += 1
+            else:
+                break
+        if in_p.state == 1:
+            in_p.turn += 1
+            in_p.elemid = start_at_element
+        else:
+            break
+    return in_p
+
+def track_particle_elem_by_elem( in_p, line, start_at_element=0 ):
+    assert isinstance( in_p, pysix.Particles )
+    snapshots = []
+    for jj, elem in enumerate( line ):
+        assert in_p.elemid == start_at_element + jj
+        assert in_p.state == 1
+        snapshots.append( in_p.copy() )
+        elem.track( in_p )
+        if isinstance( elem, pysix.elements.Drift ) and \
+            in_p.state == 1 and \
+            ( in_p.x > 1.0 or in_p.x < -1.0 or
+              in_p.y > 1.0 or in_p.y < -1.0 ):
+            in_p.state = 0
+
+        if in_p.state == 1:
+            in_p.elemid += 1
+        else:
+            break
+    if in_p.state == 1:
+        in_p.turn += 1
+        in_p.elemid = start_at_element
+    return snapshots, in_p
+
+def track_bunch_elem_by_elem( particles, line, start_at_element=0,
+    snapshot_fn=None, begin_element=0, end_element=None ):
+    # Element-major version of track_particle_elem_by_elem: before element jj
+    # is applied, snapshot_fn( jj, bunch, bunch_index ) is called with the
+    # still active particles and their indices into particles. Only the
+    # elements [ begin_element, end_element ) are tracked; the turn is only
+    # completed if end_element is the end of the line
+    if end_element is None:
+        end_element = len( line )
+    assert 0 <= begin_element <= end_element <= len( line )
+    num_particles = len( particles )
+    assert num_particles > 0
+    for in_p in particles:
+        assert in_p.elemid == start_at_element + begin_element
+        assert in_p.state == 1
+
+    out_particles = [ None ] * num_particles
+    num_snapshots = np.zeros( num_particles, dtype=np.int64 )
+    bunch = particles_to_bunch( particles )
+    bunch_index = np.arange( num_particles )
+
+    for jj in range( begin_element, end_element ):
+        elem = line[ jj ]
+        if snapshot_fn is not None:
+            snapshot_fn( jj, bunch, bunch_index )
+        num_snapshots[ bunch_index ] += 1
+        is_active = track_bunch_element( elem, bunch )
+        if not np.all( is_active ):
+            is_lost = ~is_active
+            lost = bunch.copy( index=is_lost )
+            lost.state[:] = 0
+            for ii, idx in enumerate( bunch_index[ is_lost ] ):
+                out_particles[ idx ] = bunch_to_particle( lost, ii )
+            bunch = bunch.copy( index=is_active )
+            bunch_index = bunch_index[ is_active ]
+            if len( bunch_index ) == 0:
+                break
+        bunch.elemid += 1
+
+    if len( bunch_index ) > 0:
+        if end_element == len( line ):
+            bunch.turn += 1
+            bunch.elemid[:] = start_at_element
+        for ii, idx in enumerate( bunch_index ):
+            out_particles[ idx ] = bunch_to_particle( bunch, ii )
+    return out_particles, num_snapshots
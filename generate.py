@@ -1,24 +1,79 @@
 import argparse
 import os
+import sys
+import time
 from helpers.config import build_config
+from helpers.scheduler import run_scenarios, print_summary
 from converters.from_sixtrack import generate_data as generate_from_sixtrack
 from converters.from_pysixtrack import generate_data as generate_from_pysixtrack
+from converters.from_synthetic import generate_data as generate_from_synthetic
 
 if __name__ == '__main__':
-    conf = build_config( "./config.toml" )
+    parser = argparse.ArgumentParser(
+        description="Generate the sixtracklib testdata scenarios" )
+    parser.add_argument( "--config", default="./config.toml",
+        help="path to the config file (default: ./config.toml)" )
+    parser.add_argument( "-j", "--jobs", type=int, default=1,
+        help="number of scenarios to generate concurrently (default: 1)" )
+    parser.add_argument( "-s", "--scenario", action="append", default=None,
+        help="only generate this scenario; can be given multiple times" )
+    parser.add_argument( "-f", "--force", action="store_true",
+        help="regenerate all stages even if the cache says they are up to date" )
+    parser.add_argument( "--profile", action="store_true",
+        help="run each stage under cProfile; the profiles are stored as " +
+             "profile_<stage>.prof next to the outputs and only cover the " +
+             "main process, not the tracking workers" )
+    args = parser.parse_args()
+
+    conf = build_config( args.config )
+    if args.scenario is not None:
+        unknown = [ name for name in args.scenario if name not in conf ]
+        if len( unknown ) > 0:
+            parser.error( f"unknown scenario(s): {', '.join( unknown )}" )
+
     path_to_testdata_dir = os.path.abspath( os.path.dirname( __file__ ) )
+    tasks = []
     for name, subconf in conf.items():
+        if args.scenario is not None and name not in args.scenario:
+            continue
+        # scenarios with enabled = false are only generated on request
+        if args.scenario is None and not subconf.get( 'enabled', True ):
+            continue
         if subconf.get( 'source', None ) is None or \
             subconf.get( 'input_dir', None ) is None:
             continue
+        if args.force:
+            subconf[ 'use_regeneration_cache' ] = False
+        if args.profile:
+            subconf[ 'profile' ] = True
         input_dir = subconf[ 'input_dir' ]
         scenario_out_dir = os.path.join( path_to_testdata_dir, name )
-        scenario_in_dir  = os.path.join( scenario_out_dir, input_dir )
+        # input_dir may point to the inputs of another scenario
+        scenario_in_dir  = os.path.normpath(
+            os.path.join( scenario_out_dir, input_dir ) )
         if subconf[ 'source' ] == 'sixtrack':
-            generate_from_sixtrack(
-                name, scenario_in_dir, scenario_out_dir, conf=subconf )
+            generate_fn = generate_from_sixtrack
         elif subconf[ 'source' ] == 'pysixtrack':
-            generate_from_pysixtrack(
-                name, scenario_in_dir, scenario_out_dir, conf=subconf )
+            generate_fn = generate_from_pysixtrack
+        elif subconf[ 'source' ] == 'synthetic':
+            generate_fn = generate_from_synthetic
         else:
             raise ValueError( f"unknown source: {subconf['source']}" )
+        tasks.append( ( name, generate_fn,
+            ( name, scenario_in_dir, scenario_out_dir ),
+            { 'conf': subconf } ) )
+
+    jobs = max( args.jobs, 1 )
+    if jobs > 1 and len( tasks ) > 1:
+        # Concurrently generated scenarios share the cores instead of each
+        # starting num_workers tracking processes of its own
+        num_concurrent = min( jobs, len( tasks ) )
+        for _, _, _, kwargs in tasks:
+            kwargs[ 'conf' ][ 'num_workers' ] = max(
+                kwargs[ 'conf' ][ 'num_workers' ] // num_concurrent, 1 )
+
+    start = time.perf_counter()
+    results = run_scenarios( tasks, jobs=jobs )
+    print_summary( results, time.perf_counter() - start )
+    if any( error is not None for _, _, error in results ):
+        sys.exit( 1 )
@@ -1,3 +1,4 @@
+import os
 import toml
 import sixtracklib as st
 
@@ -31,12 +32,21 @@ def build_config( path_to_config_file=None, config_str=None ):
     if not 'make_sixtrack_sequ_by_sequ' in default_conf:
         default_conf[ 'make_sixtrack_sequ_by_sequ' ] = True
 
+    if not 'use_regeneration_cache' in default_conf:
+        default_conf[ 'use_regeneration_cache' ] = True
+
+    if not 'num_workers' in default_conf or \
+        default_conf[ 'num_workers' ] <= 0:
+        default_conf[ 'num_workers' ] = os.cpu_count() or 1
+
     if 'scenario' in temp:
         for name, subconf in temp[ 'scenario' ].items():
             conf[ name ] = {}
             if not( 'source' in subconf and 'input_dir' in subconf and
                      ( subconf[ 'source' ] == 'sixtrack' or
-                       subconf[ 'source' ] == 'pysixtrack' ) ):
+                       subconf[ 'source' ] == 'pysixtrack' or
+                       ( subconf[ 'source' ] == 'synthetic' and
+                         subconf.get( 'num_particles', 0 ) > 0 ) ) ):
                 conf[ name ].update( { 'source': None, 'input_dir': None } )
                 continue
             conf[ name ].update( default_conf )
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def _run_buffered( name, fn, args, kwargs ):
+    # Everything the scenario prints goes into its own buffer; the parent
+    # process dumps it in one piece once the scenario has finished
+    buffer = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout( buffer ):
+        try:
+            fn( *args, **kwargs )
+        except Exception:
+            error = traceback.format_exc()
+    wall_time = time.perf_counter() - start
+    return name, buffer.getvalue(), wall_time, error
+
+def _run_direct( name, fn, args, kwargs ):
+    error = None
+    start = time.perf_counter()
+    try:
+        fn( *args, **kwargs )
+    except Exception:
+        error = traceback.format_exc()
+    wall_time = time.perf_counter() - start
+    return name, None, wall_time, error
+
+def run_scenarios( tasks, jobs=1 ):
+    results = dict()
+    if jobs <= 1 or len( tasks ) <= 1:
+        for name, fn, args, kwargs in tasks:
+            name, _, wall_time, error = _run_direct( name, fn, args, kwargs )
+            if error is not None:
+                print( error )
+            results[ name ] = ( wall_time, error )
+    else:
+        with ProcessPoolExecutor( max_workers=jobs ) as pool:
+            futures = [ pool.submit( _run_buffered, name, fn, args, kwargs )
+                        for name, fn, args, kwargs in tasks ]
+            for future in as_completed( futures ):
+                name, output, wall_time, error = future.result()
+                print( output, end="", flush=True )
+                if error is not None:
+                    print( error, flush=True )
+                results[ name ] = ( wall_time, error )
+    return [ ( name, ) + results[ name ] for name, _, _, _ in tasks ]
+
+def print_summary( results, total_wall_time=None ):
+    print( "============================================================" +
+           "============================================================" +
+           "==============================" )
+    print(  "****" )
+    print(  "****       Summary :" )
+    print(  "****" )
+    for name, wall_time, error in results:
+        status = "ok" if error is None else "FAILED"
+        print( f"****    {name:<32s} : {wall_time:12.3f} s  {status}" )
+    if total_wall_time is not None:
+        print(  "****" )
+        print( f"****    {'total (wall)':<32s} : {total_wall_time:12.3f} s" )
+    print(  "****" )
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname(
+    os.path.abspath( __file__ ) ) ) )
+
+import pytest
+
+@pytest.fixture
+def fodo_elements():
+    # FODO cells with an aperture small enough to lose the outer particles,
+    # plus the element types whose tracking involves pow(), sqrt(), sin(),
+    # ... on the particle coordinates
+    pysix = pytest.importorskip( "pysixtrack" )
+    elements = []
+    for ii in range( 4 ):
+        elements += [
+            pysix.elements.Multipole( knl=[ 0.0, 0.1 if ii % 2 else -0.1 ] ),
+            pysix.elements.Drift( length=2.5 ),
+            pysix.elements.DriftExact( length=2.5 ),
+            pysix.elements.LimitEllipse( a=2e-2, b=2e-2 ) ]
+    elements += [
+        pysix.elements.DipoleEdge( h=0.01, e1=0.05, hgap=0.02, fint=0.5 ),
+        pysix.elements.XYShift( dx=1e-4, dy=-2e-4 ),
+        pysix.elements.SCCoasting( number_of_particles=1e11,
+            circumference=100.0, sigma_x=2e-3, sigma_y=1e-3, length=1.0 ),
+        pysix.elements.Cavity( voltage=1e6, frequency=1e7, lag=30.0 ),
+        pysix.elements.DriftExact( length=1.0 ) ]
+    return elements
+
+def pow_sensitive_deltas( num, max_tries=100000 ):
+    # Deltas for which ( 1 + delta ) ** 2 differs from ( 1 + delta ) *
+    # ( 1 + delta ) with this C library, i.e. for which the scalar and the
+    # array form of pysixtrack's drifts round differently. Falls back to
+    # regular deltas if pow() is correctly rounded
+    deltas = []
+    for ii in range( 1, max_tries ):
+        opd = 1.0 + 1e-6 * ii
+        if opd ** 2 != opd * opd:
+            deltas.append( 1e-6 * ii )
+            if len( deltas ) == num:
+                return deltas
+    return deltas + [ 1e-4 * ii for ii in range( num - len( deltas ) ) ]
+
+@pytest.fixture
+def make_particles():
+    pysix = pytest.importorskip( "pysixtrack" )
+    deltas = pow_sensitive_deltas( 4 )
+    def make( num_particles ):
+        particles = []
+        for ii in range( num_particles ):
+            in_p = pysix.Particles( p0c=1e9, x=2e-3 * ii, px=1e-5 * ii,
+                y=-1e-3 * ii, zeta=1e-2 * ( ii % 5 ),
+                delta=deltas[ ii % len( deltas ) ] )
+            in_p.partid = ii
+            in_p.state = 1
+            in_p.elemid = 0
+            in_p.turn = 0
+            particles.append( in_p )
+        return particles
+    return make
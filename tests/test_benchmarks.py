@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+pysix = pytest.importorskip( "pysixtrack" )
+pytest.importorskip( "sixtracklib" )
+
+from benchmarks.run import run_variant
+
+def test_run_variant( tmp_path ):
+    # Variants inject line and particles into a context without input_path
+    elements = [ pysix.elements.Drift( length=1.0 ),
+                 pysix.elements.Multipole( knl=[ 0.0, 1e-3 ] ),
+                 pysix.elements.Drift( length=1.0 ) ]
+    particles = []
+    for ii in range( 3 ):
+        in_p = pysix.Particles( p0c=1e9, x=1e-4 * ii )
+        in_p.partid = ii
+        in_p.state = 1
+        in_p.elemid = 0
+        in_p.turn = 0
+        particles.append( in_p )
+    conf = { "make_demotrack_data": False, "make_elem_by_elem_data": True,
+             "make_until_num_turn_data": True, "until_num_turns": 2,
+             "num_workers": 1, "use_regeneration_cache": False }
+    make_run = run_variant( elements, particles,
+        { "name": "p2_t2", "num_particles": 2, "num_turns": 2 }, conf )
+    timings, info = make_run( str( tmp_path ) )
+    assert info[ "num_particles" ] == 6
+    assert info[ "num_elements" ] == 3
+    assert info[ "until_num_turns" ] == 4
+    assert "stage until_turn" in timings
+    assert ( tmp_path / "cobj_particles_until_turn_4.bin" ).is_file()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+pytest.importorskip( "pysixtrack" )
+pytest.importorskip( "sixtracklib" )
+
+from converters.cache import RegenerationCache
+
+def make_cache( tmp_path, conf ):
+    input_path = tmp_path / "input"
+    if not input_path.is_dir():
+        input_path.mkdir()
+        ( input_path / "line.txt" ).write_text( "line" )
+    output_path = tmp_path / "output"
+    output_path.mkdir( exist_ok=True )
+    return RegenerationCache( str( input_path ), str( output_path ), conf )
+
+def test_stage_key( tmp_path ):
+    conf = { "until_num_turns": 10, "make_elem_by_elem_data": True,
+             "num_workers": 4 }
+    key = make_cache( tmp_path, conf ).stage_key( "until_turn" )
+    assert key == make_cache( tmp_path, dict( conf ) ).stage_key(
+        "until_turn" )
+
+    # Settings which don't change the output don't change the key
+    for name, value in ( ( "num_workers", 1 ), ( "batched_tracking", False ),
+                         ( "until_turn_checkpoint_interval", 5 ) ):
+        other = dict( conf, **{ name: value } )
+        assert key == make_cache( tmp_path, other ).stage_key( "until_turn" )
+
+    # Stage selection only applies to the stages it selects
+    other = dict( conf, until_num_turns=20 )
+    assert key != make_cache( tmp_path, other ).stage_key( "until_turn" )
+    assert make_cache( tmp_path, conf ).stage_key( "lattice" ) == \
+        make_cache( tmp_path, other ).stage_key( "lattice" )
+
+    other = dict( conf, always_use_drift_exact=True )
+    assert key != make_cache( tmp_path, other ).stage_key( "until_turn" )
+
+def test_stage_key_depends_on_inputs_and_versions( tmp_path ):
+    cache = make_cache( tmp_path, {} )
+    key = cache.stage_key( "lattice" )
+    cache.versions = dict( cache.versions, pysixtrack="0.0.0" )
+    assert key != cache.stage_key( "lattice" )
+    ( tmp_path / "input" / "line.txt" ).write_text( "changed line" )
+    assert key != make_cache( tmp_path, {} ).stage_key( "lattice" )
+
+def test_is_up_to_date( tmp_path ):
+    cache = make_cache( tmp_path, {} )
+    assert not cache.is_up_to_date( "lattice" )
+    ( tmp_path / "output" / "cobj_lattice.bin" ).write_bytes( b"" )
+    cache.update( "lattice" )
+    assert make_cache( tmp_path, {} ).is_up_to_date( "lattice" )
+    assert not make_cache( tmp_path, { "always_use_drift_exact": True }
+                         ).is_up_to_date( "lattice" )
+    ( tmp_path / "output" / "cobj_lattice.bin" ).unlink()
+    assert not make_cache( tmp_path, {} ).is_up_to_date( "lattice" )
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from converters.cbuffer_file import NormalisedCBufferWriter
+
+BASE_ADDR = 4096
+HEADER_LEN = 8
+
+def make_cbuffer( objects ):
+    # Normalised cbuffer of objects, each given as a list of data arrays; an
+    # object consists of one pointer per array followed by the arrays
+    slots = []
+    object_entries = []
+    pointers = []
+    slots_addr = BASE_ADDR + ( HEADER_LEN + 2 ) * 8
+    for arrays in objects:
+        begin = len( slots )
+        slots.extend( [ 0 ] * len( arrays ) )
+        for kk, values in enumerate( arrays ):
+            slots[ begin + kk ] = slots_addr + len( slots ) * 8
+            pointers.append( slots_addr + ( begin + kk ) * 8 )
+            slots.extend( values )
+        object_entries.extend(
+            [ slots_addr + begin * 8, 7, ( len( slots ) - begin ) * 8 ] )
+    words = []
+    section_addrs = []
+    addr = BASE_ADDR + HEADER_LEN * 8
+    for entries, num_entries in ( ( slots, len( slots ) ),
+        ( object_entries, len( objects ) ), ( pointers, len( pointers ) ),
+        ( [], 0 ) ):
+        section_addrs.append( addr )
+        words.extend( [ ( len( entries ) + 2 ) * 8, num_entries ] + entries )
+        addr += ( len( entries ) + 2 ) * 8
+    header = [ BASE_ADDR, addr - BASE_ADDR, HEADER_LEN * 8 ] + \
+        section_addrs + [ 0 ]
+    return np.array( header + words, dtype=np.int64 )
+
+def test_writer_matches_single_cbuffer( tmp_path ):
+    objects = [ [ [ ii, ii + 1, ii + 2 ], [ 10 * ii ] * 3 ] for ii in range( 7 ) ]
+    expected = make_cbuffer( objects )
+
+    path = str( tmp_path / "merged.bin" )
+    chunk_path = str( tmp_path / "chunk.bin" )
+    with NormalisedCBufferWriter( path ) as writer:
+        writer.append( make_cbuffer( objects[ :3 ] ) )
+        make_cbuffer( objects[ 3:4 ] ).tofile( chunk_path )
+        writer.append_file( chunk_path )
+        writer.append( make_cbuffer( objects[ 4: ] ) )
+    assert np.array_equal( np.fromfile( path, dtype=np.int64 ), expected )
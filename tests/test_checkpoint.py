@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+pytest.importorskip( "pysixtrack" )
+
+from converters.checkpoint import until_turn_milestones
+from converters.checkpoint import checkpoint_key
+from converters.checkpoint import TrackingCheckpoint
+from converters.checkpoint import track_until_turn_checkpointed
+from converters.checkpoint import track_until_turn_in_blocks
+from converters.tracking import track_bunch_until_turn
+
+@pytest.mark.parametrize( "until_num_turns, milestones", [
+    ( 100, [ 100 ] ),
+    ( 0, [] ),
+    ( [ 100, 1, 10, 10 ], [ 1, 10, 100 ] ),
+    ( [ 0, 5 ], [ 5 ] ),
+    ( { "stride": 10, "until": 30 }, [ 10, 20, 30 ] ),
+    ( { "stride": 10, "until": 25 }, [ 10, 20, 25 ] ),
+    ( { "stride": 10, "until": 5 }, [ 5 ] ) ] )
+def test_until_turn_milestones( until_num_turns, milestones ):
+    assert until_turn_milestones( until_num_turns ) == milestones
+
+def test_checkpoint_key( fodo_elements, make_particles ):
+    key = checkpoint_key( make_particles( 4 ), fodo_elements,
+                          { "pysixtrack": "0.0.6" } )
+    assert key == checkpoint_key( make_particles( 4 ), fodo_elements,
+                                  { "pysixtrack": "0.0.6" } )
+    assert key != checkpoint_key( make_particles( 4 ), fodo_elements,
+                                  { "pysixtrack": "0.0.7" } )
+    assert key != checkpoint_key( make_particles( 5 ), fodo_elements,
+                                  { "pysixtrack": "0.0.6" } )
+    assert key != checkpoint_key( make_particles( 4 ), fodo_elements[ 1: ],
+                                  { "pysixtrack": "0.0.6" } )
+
+def test_checkpointed_tracking_resumes( tmp_path, fodo_elements,
+    make_particles ):
+    track_fn = lambda particles, until_turn: track_bunch_until_turn(
+        particles, fodo_elements, until_turn )
+    expected = track_until_turn_checkpointed(
+        make_particles( 8 ), [ 2, 6 ], track_fn )
+
+    key = checkpoint_key( make_particles( 8 ), fodo_elements )
+    checkpoint = TrackingCheckpoint( str( tmp_path ), key, interval=1 )
+    track_until_turn_checkpointed( make_particles( 8 ), 3, track_fn,
+                                   checkpoint=checkpoint )
+    # Only the state at the final milestone is kept
+    assert checkpoint.turns() == [ 3 ]
+    assert checkpoint.load( [ 6 ] )[ "turn" ] == 3
+    assert checkpoint.load( [ 2 ] ) is None
+    # Milestone 2 has not been written, the checkpoint can't be used
+    assert checkpoint.load( [ 2, 6 ] ) is None
+    # Another key doesn't resume from the checkpoint
+    assert TrackingCheckpoint( str( tmp_path ), "other" ).load( [ 6 ] ) is None
+
+    milestones = []
+    checkpoint = TrackingCheckpoint( str( tmp_path ), key, interval=1 )
+    tracked = track_until_turn_checkpointed( make_particles( 8 ), [ 3, 4, 6 ],
+        track_fn, checkpoint=checkpoint,
+        milestone_fn=lambda turn, particles: milestones.append( turn ) )
+    # Resumed from turn 3, milestone 3 has been written by the first run
+    assert milestones == [ 4, 6 ]
+    assert checkpoint.turns() == [ 3, 6 ]
+    for in_p, ref_p in zip( tracked, expected ):
+        assert ( in_p.x, in_p.px, in_p.state, in_p.turn ) == \
+               ( ref_p.x, ref_p.px, ref_p.state, ref_p.turn )
+
+    # Extending the run resumes from turn 6 and skips the written milestones
+    milestones = []
+    checkpoint = TrackingCheckpoint( str( tmp_path ), key )
+    track_until_turn_checkpointed( make_particles( 8 ), [ 3, 4, 6, 8 ],
+        track_fn, checkpoint=checkpoint,
+        milestone_fn=lambda turn, particles: milestones.append( turn ) )
+    assert milestones == [ 8 ]
+    # ... unless their output files are missing
+    milestones = []
+    checkpoint = TrackingCheckpoint( str( tmp_path ), key )
+    track_until_turn_checkpointed( make_particles( 8 ), [ 4, 8 ],
+        track_fn, checkpoint=checkpoint,
+        milestone_fn=lambda turn, particles: milestones.append( turn ),
+        milestone_written=lambda turn: turn != 4 )
+    assert milestones == [ 4, 8 ]
+
+def test_block_tracking_resumes( tmp_path, fodo_elements, make_particles ):
+    track_fn = lambda particles, until_turn: track_bunch_until_turn(
+        particles, fodo_elements, until_turn )
+    expected = track_until_turn_checkpointed(
+        make_particles( 8 ), [ 2, 6 ], track_fn )
+
+    def blocks():
+        particles = make_particles( 8 )
+        for begin in range( 0, 8, 3 ):
+            yield begin, min( begin + 3, 8 ), particles[ begin:begin + 3 ]
+
+    def run( until_turn ):
+        tracked = dict()
+        def block_fn( turn, begin, end, particles ):
+            tracked.setdefault( turn, [ None ] * 8 )[ begin:end ] = particles
+        key = checkpoint_key( make_particles( 8 ), fodo_elements )
+        checkpoint = TrackingCheckpoint( str( tmp_path ), key, interval=1 )
+        track_until_turn_in_blocks( blocks(), until_turn, track_fn, block_fn,
+            checkpoint=checkpoint, scratch_path=str( tmp_path ) )
+        return tracked, checkpoint
+
+    tracked, checkpoint = run( [ 2, 4 ] )
+    assert sorted( tracked ) == [ 2, 4 ]
+    assert checkpoint.turns() == [ 4 ]
+    tracked, checkpoint = run( [ 2, 4, 6 ] )
+    # The final milestone of a run is always passed on to block_fn
+    assert sorted( tracked ) == [ 6 ]
+    assert checkpoint.turns() == [ 4, 6 ]
+    for in_p, ref_p in zip( tracked[ 6 ], expected ):
+        assert ( in_p.x, in_p.px, in_p.state, in_p.turn ) == \
+               ( ref_p.x, ref_p.px, ref_p.state, ref_p.turn )
+    tracked, checkpoint = run( [ 2, 4, 6 ] )
+    assert sorted( tracked ) == [ 6 ]
+
+def test_tracking_progress_per_turn( fodo_elements, make_particles ):
+    until_turns = []
+    def track_fn( particles, until_turn ):
+        until_turns.append( until_turn )
+        return track_bunch_until_turn( particles, fodo_elements, until_turn )
+    expected = track_bunch_until_turn( make_particles( 8 ), fodo_elements, 5 )
+    # Without a progress interval, every turn is tracked and reported on its
+    # own, independent of the ( missing ) checkpoint
+    tracked = track_until_turn_checkpointed( make_particles( 8 ), 5, track_fn,
+                                             progress_interval=0.0 )
+    assert until_turns == [ 1, 2, 3, 4, 5 ]
+    for in_p, ref_p in zip( tracked, expected ):
+        assert ( in_p.x, in_p.px, in_p.state, in_p.turn ) == \
+               ( ref_p.x, ref_p.px, ref_p.state, ref_p.turn )
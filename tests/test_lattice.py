@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+pysix = pytest.importorskip( "pysixtrack" )
+pytest.importorskip( "sixtracklib" )
+
+from converters.lattice import compact_elements
+from converters.lattice import compact_line
+from converters.lattice import lattice_transform_indices
+from converters.lattice import transform_line
+from converters.pysixtrack_to_cobjects import plan_pysix_line_conversion
+from converters.tracking import track_bunch_until_turn
+
+def drift( length ):
+    return pysix.elements.Drift( length=length )
+
+def test_compact_elements():
+    elements = [ drift( 1.0 ), drift( 2.0 ),
+                 pysix.elements.Multipole( knl=[ 0.0 ] ),
+                 drift( 3.0 ), pysix.elements.Multipole( knl=[ 0.0, 0.1 ] ),
+                 pysix.elements.SRotation( angle=0.0 ), drift( 4.0 ),
+                 drift( 5.0 ), pysix.elements.XYShift( dx=0.0, dy=0.0 ) ]
+    compacted, index_map = compact_elements( elements )
+    assert [ type( elem ).__name__ for elem in compacted ] == \
+        [ "Drift", "Multipole", "Drift" ]
+    assert [ elem.length for elem in compacted[ ::2 ] ] == [ 6.0, 9.0 ]
+    assert index_map.tolist() == [ 0, 0, 0, 0, 1, 2, 2, 2, 3 ]
+
+    # A barrier keeps the drift starting there observable
+    compacted, index_map = compact_elements( elements, barriers=[ 7 ] )
+    assert [ elem.length for elem in compacted if
+             isinstance( elem, pysix.elements.Drift ) ] == [ 6.0, 4.0, 5.0 ]
+    assert index_map.tolist() == [ 0, 0, 0, 0, 1, 2, 2, 3, 4 ]
+
+def test_compact_line_tracks_the_same( fodo_elements, make_particles ):
+    elements = []
+    for elem in fodo_elements:
+        elements += [ elem, pysix.elements.SRotation( angle=0.0 ) ]
+        if isinstance( elem, pysix.elements.Drift ):
+            elements += [ drift( 0.5 ) ]
+    line = pysix.Line( elements=elements,
+        element_names=[ f"e{ii}" for ii in range( len( elements ) ) ] )
+    compacted, index_map = compact_line( line )
+    assert len( compacted.elements ) < len( line.elements )
+    assert len( index_map ) == len( line.elements )
+    assert compacted.element_names[ 0 ] == "e0"
+    expected = track_bunch_until_turn( make_particles( 8 ), elements, 3 )
+    tracked = track_bunch_until_turn(
+        make_particles( 8 ), compacted.elements, 3 )
+    for in_p, ref_p in zip( tracked, expected ):
+        assert in_p.state == ref_p.state
+        assert in_p.turn == ref_p.turn
+        assert np.allclose( [ in_p.x, in_p.px, in_p.y, in_p.py ],
+            [ ref_p.x, ref_p.px, ref_p.y, ref_p.py ], rtol=1e-12, atol=1e-15 )
+
+def test_lattice_transform_indices( fodo_elements ):
+    indices = lattice_transform_indices( fodo_elements,
+        { "begin": 1, "end": 10, "thin_drifts": 2 } )
+    # Drifts ( exact or not ) at 1, 2, 5, 6, 9 -> every second one is kept
+    assert indices.tolist() == [ 1, 3, 4, 5, 7, 8, 9 ]
+    with pytest.raises( ValueError ):
+        lattice_transform_indices( fodo_elements, { "end": 100 } )
+    with pytest.raises( ValueError ):
+        lattice_transform_indices( fodo_elements, { "tiles": 2 } )
+
+def test_transform_line_sizes( fodo_elements ):
+    line = pysix.Line( elements=fodo_elements,
+        element_names=[ f"e{ii}" for ii in range( len( fodo_elements ) ) ] )
+    transform = { "begin": 1, "end": 10, "thin_drifts": 2, "tile": 3 }
+    transformed, plan, params = transform_line( line, transform )
+    assert len( transformed.elements ) == 3 * 7
+    assert transformed.element_names[ 7 ] == "e1..1"
+    # The sizes derived from a single tile equal those of a full plan
+    expected_plan, expected_params = plan_pysix_line_conversion( transformed )
+    assert params == expected_params
+    assert [ cobj_type for cobj_type, _ in plan ] == \
+        [ cobj_type for cobj_type, _ in expected_plan ]
+    # always_use_drift_exact does not change the created lattice objects
+    _, drift_exact_plan, drift_exact_params = transform_line( line, transform,
+        conf={ "always_use_drift_exact": True } )
+    assert drift_exact_params == params
+    assert [ cobj_type for cobj_type, _ in drift_exact_plan ] == \
+        [ cobj_type for cobj_type, _ in plan ]
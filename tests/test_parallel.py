@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from converters.parallel import split_into_slices
+
+@pytest.mark.parametrize( "num_particles, num_slices, max_slice_size", [
+    ( 10, 3, None ), ( 10, 1, None ), ( 2, 8, None ), ( 0, 4, None ),
+    ( 100, 2, 7 ), ( 7, 4, 7 ) ] )
+def test_split_into_slices( num_particles, num_slices, max_slice_size ):
+    slices = split_into_slices( num_particles, num_slices, max_slice_size )
+    # Consecutive, covering [ 0, num_particles ) and as even as possible
+    assert slices[ 0 ][ 0 ] == 0
+    assert slices[ -1 ][ 1 ] == num_particles
+    for ( _, end ), ( begin, _ ) in zip( slices[ :-1 ], slices[ 1: ] ):
+        assert end == begin
+    sizes = [ end - begin for begin, end in slices ]
+    assert max( sizes ) - min( sizes ) <= 1
+    if num_particles > 0:
+        assert min( sizes ) > 0
+        assert len( slices ) == max( min( num_slices, num_particles ),
+            -( -num_particles // ( max_slice_size or num_particles ) ) )
+    if max_slice_size is not None:
+        assert max( sizes ) <= max_slice_size
+
+def test_split_into_slices_sizes():
+    assert split_into_slices( 10, 3 ) == [ ( 0, 4 ), ( 4, 7 ), ( 7, 10 ) ]
+    assert split_into_slices( 10, 2, max_slice_size=4 ) == \
+        [ ( 0, 4 ), ( 4, 7 ), ( 7, 10 ) ]
+    assert split_into_slices( 0, 4 ) == [ ( 0, 0 ) ]
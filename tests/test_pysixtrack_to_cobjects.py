@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+pytest.importorskip( "pysixtrack" )
+st = pytest.importorskip( "sixtracklib" )
+
+from converters.cobjects import create_particle_set_cbuffer
+from converters.pysixtrack_to_cobjects import pysix_particles_to_pset
+from converters.tracking import particles_to_bunch
+from converters.tracking import track_bunch_until_turn
+
+# st_Particles field -> pysix.Particles attribute
+PSET_FIELDS = { "x": "x", "px": "px", "y": "y", "py": "py", "zeta": "zeta",
+    "delta": "delta", "chi": "chi", "charge_ratio": "qratio",
+    "charge0": "q0", "mass0": "mass0", "beta0": "beta0", "gamma0": "gamma0",
+    "p0c": "p0c", "s": "s", "state": "state", "at_element": "elemid",
+    "at_turn": "turn", "id": "partid" }
+# computed from delta by st_Particles.update_delta
+PSET_DELTA_FIELDS = ( "rpp", "rvv", "psigma" )
+
+def pset_column( pset, field ):
+    return np.array( [ getattr( pset, field )( ii )
+                       for ii in range( pset.num_particles ) ] )
+
+def assert_pset_matches( pset, particles ):
+    assert pset.num_particles == len( particles )
+    for field, key in PSET_FIELDS.items():
+        expected = np.array( [ getattr( in_p, key ) for in_p in particles ] )
+        assert np.array_equal( pset_column( pset, field ), expected ), field
+    EPS = np.float64( 1e-12 )
+    for field in PSET_DELTA_FIELDS:
+        expected = np.array( [ getattr( in_p, field ) for in_p in particles ] )
+        assert np.allclose( pset_column( pset, field ), expected, EPS, EPS ), \
+            field
+
+def test_bulk_pset_matches_particles( fodo_elements, make_particles ):
+    # Tracked particles, some of them lost, so that state, element and turn
+    # differ between the particles
+    particles = track_bunch_until_turn( make_particles( 12 ), fodo_elements, 3 )
+    assert len( set( in_p.state for in_p in particles ) ) > 1
+
+    pset_buffer = create_particle_set_cbuffer( 1, 12 )
+    pset = st.st_Particles.GET( pset_buffer, 0 )
+    pysix_particles_to_pset( particles_to_bunch( particles ), pset )
+    assert_pset_matches( pset, particles )
+
+    # Blocks written at an offset and to explicit indices
+    pset_buffer = create_particle_set_cbuffer( 1, 12 )
+    pset = st.st_Particles.GET( pset_buffer, 0 )
+    pysix_particles_to_pset( particles_to_bunch( particles[ 4: ] ), pset,
+                             begin=4 )
+    pysix_particles_to_pset( particles_to_bunch( particles[ 3::-1 ] ), pset,
+                             indices=[ 3, 2, 1, 0 ] )
+    assert_pset_matches( pset, particles )
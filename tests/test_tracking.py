@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+pytest.importorskip( "pysixtrack" )
+
+from converters.tracking import track_bunch_until_turn
+from converters.tracking import track_particle_until_turn
+from converters.tracking import track_bunch_elem_by_elem
+from converters.tracking import track_particle_elem_by_elem
+from converters.parallel import track_until_turn_parallel
+from converters.parallel import track_elem_by_elem_parallel
+from converters import parallel
+
+ATTRIBUTES = ( "x", "px", "y", "py", "zeta", "delta", "rpp", "rvv", "s",
+               "partid", "state", "elemid", "turn" )
+
+def assert_same_particles( particles, expected ):
+    assert len( particles ) == len( expected )
+    for in_p, ref_p in zip( particles, expected ):
+        for key in ATTRIBUTES:
+            assert getattr( in_p, key ) == getattr( ref_p, key ), key
+
+def reference_until_turn( particles, line, until_turn ):
+    return [ track_particle_until_turn( in_p, line, until_turn )
+             for in_p in particles ]
+
+def test_bunch_until_turn_matches_per_particle( fodo_elements, make_particles ):
+    expected = reference_until_turn( make_particles( 16 ), fodo_elements, 5 )
+    assert any( in_p.state == 0 for in_p in expected )
+    assert any( in_p.state == 1 for in_p in expected )
+    tracked = track_bunch_until_turn( make_particles( 16 ), fodo_elements, 5 )
+    assert_same_particles( tracked, expected )
+
+def reference_elem_by_elem( particles, line ):
+    snapshots = []
+    out_particles = []
+    for in_p in particles:
+        particle_snapshots, out_p = track_particle_elem_by_elem( in_p, line )
+        snapshots.append( particle_snapshots )
+        out_particles.append( out_p )
+    return snapshots, out_particles
+
+def test_bunch_elem_by_elem_matches_per_particle(
+    fodo_elements, make_particles ):
+    snapshots, expected = reference_elem_by_elem(
+        make_particles( 16 ), fodo_elements )
+    tracked_snapshots = [ [] for _ in range( 16 ) ]
+    def store_snapshot( jj, bunch, bunch_index ):
+        for ii, idx in enumerate( bunch_index ):
+            assert len( tracked_snapshots[ idx ] ) == jj
+            tracked_snapshots[ idx ].append( bunch.copy( index=ii ) )
+    tracked, num_snapshots = track_bunch_elem_by_elem( make_particles( 16 ),
+        fodo_elements, snapshot_fn=store_snapshot )
+    assert_same_particles( tracked, expected )
+    assert num_snapshots.tolist() == [ len( s ) for s in snapshots ]
+    for tracked_p, expected_p in zip( tracked_snapshots, snapshots ):
+        assert_same_particles( tracked_p, expected_p )
+
+def test_bunch_elem_by_elem_in_element_chunks(
+    fodo_elements, make_particles ):
+    expected, expected_num_snapshots = track_bunch_elem_by_elem(
+        make_particles( 16 ), fodo_elements )
+    particles = make_particles( 16 )
+    num_snapshots = np.zeros( 16, dtype=np.int64 )
+    for begin_element in range( 0, len( fodo_elements ), 4 ):
+        active = [ ii for ii, in_p in enumerate( particles )
+                   if in_p.state == 1 ]
+        tracked, chunk_num_snapshots = track_bunch_elem_by_elem(
+            [ particles[ ii ] for ii in active ], fodo_elements,
+            begin_element=begin_element, end_element=min(
+                begin_element + 4, len( fodo_elements ) ) )
+        for ii, in_p in zip( active, tracked ):
+            particles[ ii ] = in_p
+        num_snapshots[ active ] += chunk_num_snapshots
+    assert_same_particles( particles, expected )
+    assert num_snapshots.tolist() == expected_num_snapshots.tolist()
+
+# The parallel paths give the same particles as the serial ones
+
+@pytest.mark.parametrize( "batched", [ True, False ] )
+def test_parallel_until_turn_matches_per_particle(
+    fodo_elements, make_particles, batched ):
+    expected = reference_until_turn( make_particles( 16 ), fodo_elements, 5 )
+    tracked = track_until_turn_parallel(
+        make_particles( 16 ), fodo_elements, 5,
+        num_workers=2, batched=batched )
+    assert_same_particles( tracked, expected )
+
+def test_parallel_elem_by_elem_matches_bunch( fodo_elements, make_particles ):
+    expected, expected_num_snapshots = track_bunch_elem_by_elem(
+        make_particles( 16 ), fodo_elements )
+    tracked = [ None ] * 16
+    num_snapshots = [ None ] * 16
+    for begin, end, ( _, out_particles, slice_num_snapshots ) in \
+        track_elem_by_elem_parallel( make_particles( 16 ), fodo_elements,
+            num_workers=2, max_slice_size=3 ):
+        tracked[ begin:end ] = out_particles
+        num_snapshots[ begin:end ] = slice_num_snapshots.tolist()
+    assert_same_particles( tracked, expected )
+    assert num_snapshots == expected_num_snapshots.tolist()
+
+def test_parallel_reuses_pool( fodo_elements, make_particles ):
+    expected = reference_until_turn( make_particles( 8 ), fodo_elements, 4 )
+    track_until_turn_parallel(
+        make_particles( 8 ), fodo_elements, 2, num_workers=2 )
+    pool = parallel._pool
+    assert pool is not None
+    # Same line ( as a copy ) -> the pool is kept
+    tracked = track_until_turn_parallel(
+        make_particles( 8 ), list( fodo_elements ), 4, num_workers=2 )
+    assert parallel._pool is pool
+    assert_same_particles( tracked, expected )
+    # A single slice is tracked in this process
+    tracked = track_until_turn_parallel(
+        make_particles( 1 ), fodo_elements[ 1: ], 2, num_workers=2 )
+    assert parallel._pool is pool
+    track_until_turn_parallel(
+        make_particles( 4 ), fodo_elements[ 1: ], 2, num_workers=2 )
+    assert parallel._pool is not pool
+    parallel.shutdown_pool()
+
+def test_stage_accounts_workers( tmp_path, fodo_elements, make_particles ):
+    pytest.importorskip( "resource" )
+    scenario = pytest.importorskip( "converters.scenario" )
+    ctx = scenario.ScenarioContext( str( tmp_path ), str( tmp_path ) )
+    with ctx.stage( "until_turn" ):
+        track_until_turn_parallel(
+            make_particles( 8 ), fodo_elements, 200, num_workers=2 )
+    # The pool is shut down with the stage, the usage of the workers is
+    # accounted to the stage
+    assert parallel._pool is None
+    stats = ctx.stats[ "stage until_turn" ]
+    assert stats[ "children_cpu_time" ] > 0.0
+    assert stats[ "children_peak_rss_bytes" ] > 0
+    assert 0 <= stats[ "peak_rss_increase_bytes" ] <= stats[ "peak_rss_bytes" ]
+
+def test_elem_by_elem_drift_exact_matches_per_particle( make_particles ):
+    # Exact drifts square 1 + delta; with deltas for which pow() and a
+    # multiplication round differently every snapshot has to agree
+    pysix = pytest.importorskip( "pysixtrack" )
+    line = [ pysix.elements.DriftExact( length=0.5 * ( ii + 1 ) )
+             for ii in range( 8 ) ]
+    snapshots, expected = reference_elem_by_elem( make_particles( 8 ), line )
+    tracked_snapshots = [ [] for _ in range( 8 ) ]
+    def store_snapshot( jj, bunch, bunch_index ):
+        for ii, idx in enumerate( bunch_index ):
+            tracked_snapshots[ idx ].append( bunch.copy( index=ii ) )
+    tracked, _ = track_bunch_elem_by_elem( make_particles( 8 ), line,
+                                           snapshot_fn=store_snapshot )
+    assert_same_particles( tracked, expected )
+    for tracked_p, expected_p in zip( tracked_snapshots, snapshots ):
+        assert_same_particles( tracked_p, expected_p )